@@ -14,3 +14,31 @@ def connect_db():
         print("DB connected")
     except Exception as e:
         print("Error connecting to DB:", e)
+
+def ensure_indexes():
+    """
+    Create the indexes declared in models.types up front instead of on each
+    collection's first use. Indexes that already exist are left alone.
+
+    Raises RuntimeError if any index could not be created: code relies on the
+    unique ones (e.g. item_number for the bulk item upsert), so the app must
+    not start without them. A unique index usually fails because of existing
+    duplicates; `python scripts/dedupe_records.py` merges them.
+    """
+    from mongoengine import Document
+    from models import types
+
+    failures = []
+    for document in vars(types).values():
+        if isinstance(document, type) and issubclass(document, Document) and not document._meta.get('abstract'):
+            try:
+                document.ensure_indexes()
+            except Exception as e:
+                print(f"Error ensuring indexes for {document.__name__}:", e)
+                failures.append(f"{document.__name__}: {e}")
+    if failures:
+        raise RuntimeError(
+            "Could not create DB indexes (run scripts/dedupe_records.py if a unique index "
+            "failed on duplicate keys): " + "; ".join(failures)
+        )
+    print("DB indexes ensured")
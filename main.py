@@ -1,9 +1,11 @@
 from fastapi import FastAPI # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from config.db import connect_db
+from config.db import connect_db, ensure_indexes
 from routes import router
+from utils.pagination import NEXT_CURSOR_HEADER
 from scripts.listen_gmail import start_gmail_listener_thread
 from pipeline.loader_pipeline import start_truck_loader_thread
+from pipeline.sources import start_maildir_watcher_thread
 
 # Create FastAPI app
 app = FastAPI(title="Movomint API",
@@ -21,6 +23,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor of the next page on paginated list endpoints
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Include all routes from routes.py
@@ -28,9 +32,12 @@ app.include_router(router)
 
 @app.on_event("startup")
 def startup_event():
+    ensure_indexes()
     print("Starting pipeline and Gmail listener...")
     start_truck_loader_thread()
     start_gmail_listener_thread()
+    # Local maildir ingestion, only when INGEST_MAILDIR is set
+    start_maildir_watcher_thread()
     print("Background services started.")
 
 # Run with: uvicorn main:app --reload
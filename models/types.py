@@ -1,6 +1,7 @@
 from typing import Required
 from mongoengine import Document, EmbeddedDocument, fields, connect
 import datetime
+import os
 import random
 import string
 
@@ -11,6 +12,12 @@ class Account(Document):
     name = fields.StringField(required=True)
     company_code = fields.StringField(required=True, unique=True)
 
+    meta = {
+        'indexes': [
+            'email',
+        ]
+    }
+
 
 # ===== Member =====
 class Member(Document):
@@ -23,6 +30,14 @@ class Member(Document):
     role = fields.StringField(required=True, choices=("admin", "manager", "member"), default="member")
     notification_preferences = fields.DictField(default=dict)
 
+    meta = {
+        'indexes': [
+            ('email', 'account'),
+            # Member lists, paged by _id
+            ('account', 'id'),
+        ]
+    }
+
 
 # ===== Invitation =====
 class Invitation(Document):
@@ -36,6 +51,14 @@ class Invitation(Document):
     status = fields.StringField(choices=("pending", "accepted", "expired"), default="pending")
     invited_by = fields.ReferenceField(Member, required=True)
 
+    meta = {
+        'indexes': [
+            ('email', 'account', 'status'),
+            # Pending invitations, paged by _id
+            ('account', 'status', 'id'),
+        ]
+    }
+
     @staticmethod
     def generate_token():
         return ''.join(random.choices(string.ascii_letters + string.digits, k=32))
@@ -56,16 +79,29 @@ class Customer(Document):
     name = fields.StringField()
     email_domain = fields.StringField(required=True)
 
+    meta = {
+        'indexes': [
+            # One customer per domain, which find_or_create_customer upserts on;
+            # customers added by hand may leave the domain blank
+            {'fields': ('account', 'email_domain'), 'unique': True,
+             'partialFilterExpression': {'email_domain': {'$gt': ''}}},
+            # Customer lists, paged by _id
+            ('account', 'id'),
+        ]
+    }
+
 
 # ===== Item =====
 class Item(Document):
-    item_number = fields.StringField(required=True)
+    item_number = fields.StringField(required=True, unique=True)
     height = fields.FloatField(required=True)
     width = fields.FloatField(required=True)
     length = fields.FloatField(required=True)
     special_instructions = fields.StringField(required=True)
     description = fields.StringField()
     units_per_pallet = fields.IntField(required=True)
+    # "inferred" when read from the description at ingest, "confirmed" once set by a user
+    dimensions_confidence = fields.StringField(choices=("inferred", "confirmed"), null=True)
 
 
 # ===== OrderBatch =====
@@ -88,12 +124,132 @@ class OrderBatch(Document):
 class Order(Document):
     date_created = fields.DateTimeField(default=datetime.datetime.utcnow, required=True)
     customer = fields.ReferenceField(Customer, required=True)
+    order_number = fields.StringField()
+    customer_po = fields.StringField()
     order_item_ids = fields.ListField(fields.ReferenceField(OrderBatch), required=True)
     order_date = fields.DateField(required=True)
     shipment_times = fields.ListField(fields.StringField(), required=True)
     status = fields.StringField(choices=("incomplete", "processing", "done"))
     loading_instructions = fields.ListField(fields.StringField(), null=True, default=None)
 
+    meta = {
+        'indexes': [
+            # A customer's orders, paged by _id; also serves $match on customer
+            ('customer', 'id'),
+        ]
+    }
+
+
+# ===== PipelineJob =====
+class PipelineJob(Document):
+    kind = fields.StringField(required=True, choices=("email", "state"))
+    payload = fields.DictField(default=dict)
+    # Attachments live in GridFS; a CSV can be larger than the 16 MB document limit
+    csv_attachment = fields.FileField(collection_name="pipeline_attachments")
+    pdf_attachment = fields.FileField(collection_name="pipeline_attachments")
+    # Inline attachments of jobs queued before the move to GridFS
+    csv_file = fields.BinaryField()
+    pdf_file = fields.BinaryField()
+    status = fields.StringField(required=True, choices=("queued", "leased", "done", "failed"), default="queued")
+    attempts = fields.IntField(default=0)
+    lease_owner = fields.StringField()
+    lease_expires_at = fields.DateTimeField()
+    order_ids = fields.ListField(fields.StringField())
+    last_error = fields.StringField()
+    created_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+    updated_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+    # Set only when the job is done or parked as failed, so the TTL index never expires live jobs
+    finished_at = fields.DateTimeField()
+
+    meta = {
+        'collection': 'pipeline_jobs',
+        'indexes': [
+            ('status', 'created_at'),
+            ('status', 'lease_expires_at'),
+            {'fields': ['finished_at'], 'expireAfterSeconds': int(os.getenv("PIPELINE_JOB_TTL_SECONDS", str(30 * 24 * 3600)))},
+        ]
+    }
+
+    def to_email_data(self):
+        def as_bytes(attachment, inline):
+            if attachment:
+                return attachment.read()
+            return bytes(inline) if inline is not None else None
+
+        return {
+            **self.payload,
+            "csv_file": as_bytes(self.csv_attachment, self.csv_file),
+            "pdf_file": as_bytes(self.pdf_attachment, self.pdf_file),
+        }
+
+    def delete_attachments(self):
+        for attachment in (self.csv_attachment, self.pdf_attachment):
+            if attachment:
+                attachment.delete()
+
+
+# ===== LLMCacheEntry =====
+class LLMCacheEntry(Document):
+    key = fields.StringField(required=True, unique=True)
+    template_version = fields.StringField(required=True)
+    model = fields.StringField(required=True)
+    input_sha256 = fields.StringField(required=True)
+    response = fields.StringField(required=True)
+    hits = fields.IntField(default=0)
+    created_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+    last_used_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'llm_cache',
+        'indexes': [
+            {'fields': ['created_at'], 'expireAfterSeconds': int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))},
+            'last_used_at',
+        ]
+    }
+
+
+
+# ===== GmailCheckpoint =====
+class GmailCheckpoint(Document):
+    # Last Gmail historyId whose messages have all been handed to the pipeline
+    mailbox = fields.StringField(required=True, unique=True)
+    history_id = fields.LongField(required=True)
+    updated_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {'collection': 'gmail_checkpoints'}
+
+
+# ===== ProcessedMessage =====
+class ProcessedMessage(Document):
+    # Idempotency key of an inbound message, e.g. "gmail:<message id>"
+    key = fields.StringField(required=True, unique=True)
+    job_id = fields.StringField()
+    processed_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'processed_messages',
+        'indexes': [
+            {'fields': ['processed_at'], 'expireAfterSeconds': int(os.getenv("DEDUPE_TTL_SECONDS", str(30 * 24 * 3600)))},
+        ]
+    }
+
+
+# ===== DeadLetter =====
+class DeadLetter(Document):
+    # Inbound message that keeps failing, keyed like ProcessedMessage
+    key = fields.StringField(required=True, unique=True)
+    attempts = fields.IntField(default=0)
+    status = fields.StringField(required=True, choices=("retrying", "dead"), default="retrying")
+    last_error = fields.StringField()
+    first_failed_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+    updated_at = fields.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'dead_letters',
+        'indexes': [
+            ('status', 'updated_at'),
+        ]
+    }
 
 class Notification(Document):
     account = fields.ReferenceField(Account, required=True)
@@ -109,7 +265,8 @@ class Notification(Document):
     meta = {
         'collection': 'notifications',
         'indexes': [
-            ('account', 'member', '-created_at'),
+            # _id breaks created_at ties for cursor pagination
+            ('account', 'member', '-created_at', '-id'),
             ('account', 'member', 'is_read'),
         ]
     }
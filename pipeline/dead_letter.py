@@ -0,0 +1,62 @@
+import os
+import datetime
+import threading
+from models.types import DeadLetter
+
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+
+
+class DeadLetterStore:
+    """
+    Counts failed attempts per inbound message and gives up on it after
+    `max_attempts`.
+
+    Keys are the same idempotency keys as the dedupe store. Every failure is
+    recorded in the `dead_letters` collection; once a message reaches the cap its
+    record is marked "dead" and the caller stops retrying it, so one email that
+    can never be parsed or queued does not block the rest of the mailbox. To
+    replay a dead message, delete its dead letter and its processed_messages key.
+    """
+
+    def __init__(self, max_attempts: int = INGEST_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._failing = set()
+        self._lock = threading.Lock()
+
+    def record_failure(self, key: str, error: Exception) -> bool:
+        """Count a failed attempt. Returns True once the message is dead and should not be retried."""
+        now = datetime.datetime.utcnow()
+        try:
+            entry = DeadLetter.objects(key=key).modify( # type: ignore
+                upsert=True,
+                new=True,
+                inc__attempts=1,
+                set__last_error=f"{type(error).__name__}: {error}",
+                set__updated_at=now,
+                set_on_insert__first_failed_at=now,
+                set_on_insert__status="retrying",
+            )
+        except Exception as e:
+            # Without a count we cannot tell; keep retrying rather than drop the message
+            print(f"Dead letter write failed for {key}: {e}")
+            return False
+
+        with self._lock:
+            self._failing.add(key)
+        if entry.attempts < self.max_attempts:
+            return False
+        if entry.status != "dead":
+            DeadLetter.objects(key=key).update_one(set__status="dead") # type: ignore
+        return True
+
+    def clear(self, key: str):
+        """Forget earlier failures of a message that has now gone through."""
+        with self._lock:
+            if key not in self._failing:
+                # Nothing recorded by this process; skip the round trip
+                return
+            self._failing.discard(key)
+        try:
+            DeadLetter.objects(key=key, status="retrying").delete() # type: ignore
+        except Exception as e:
+            print(f"Dead letter cleanup failed for {key}: {e}")
@@ -0,0 +1,76 @@
+import os
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Optional
+from mongoengine.errors import NotUniqueError
+from models.types import ProcessedMessage
+
+DEDUPE_CACHE_SIZE = int(os.getenv("DEDUPE_CACHE_SIZE", "10000"))
+
+
+class DedupeStore:
+    """
+    Remembers which inbound messages have already been handled.
+
+    Keys are idempotency keys such as "gmail:<message id>". A bounded in-memory
+    LRU answers repeat lookups without a round trip; misses fall through to the
+    `processed_messages` collection, which survives restarts and forgets keys
+    after DEDUPE_TTL_SECONDS through a TTL index. Store errors are logged and
+    treated as "not seen", so a Mongo hiccup can cause a duplicate but never a
+    dropped message.
+    """
+
+    def __init__(self, max_entries: int = DEDUPE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "store_hits": 0, "misses": 0, "errors": 0}
+
+    def _remember(self, key: str):
+        # Caller holds self._lock
+        self._recent[key] = True
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+    def seen(self, key: str) -> bool:
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return True
+
+        try:
+            found = ProcessedMessage.objects(key=key).only("id").first() is not None # type: ignore
+        except Exception as e:
+            print(f"Dedupe lookup failed for {key}: {e}")
+            with self._lock:
+                self.stats["errors"] += 1
+            return False
+
+        with self._lock:
+            if found:
+                self._remember(key)
+            self.stats["store_hits" if found else "misses"] += 1
+        return found
+
+    def mark(self, key: str, job_id: Optional[str] = None):
+        try:
+            ProcessedMessage(key=key, job_id=job_id, processed_at=datetime.datetime.utcnow()).save(force_insert=True)
+        except NotUniqueError:
+            pass
+        except Exception as e:
+            print(f"Dedupe write failed for {key}: {e}")
+            with self._lock:
+                self.stats["errors"] += 1
+        with self._lock:
+            self._remember(key)
+
+    def clear_memory(self):
+        with self._lock:
+            self._recent.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {**self.stats, "in_memory": len(self._recent)}
@@ -0,0 +1,261 @@
+import os
+import queue
+import socket
+import datetime
+import threading
+import traceback
+from typing import Callable, List, Optional
+from mongoengine.queryset.visitor import Q
+from models.types import PipelineJob
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "2"))
+PIPELINE_LEASE_SECONDS = int(os.getenv("PIPELINE_LEASE_SECONDS", "300"))
+PIPELINE_MAX_ATTEMPTS = int(os.getenv("PIPELINE_MAX_ATTEMPTS", "3"))
+PIPELINE_POLL_SECONDS = float(os.getenv("PIPELINE_POLL_SECONDS", "5"))
+
+JOB_STATUSES = ("queued", "leased", "done", "failed")
+
+
+class JobQueue:
+    """
+    Durable queue of pipeline jobs.
+
+    Every job is written to the `pipeline_jobs` collection before it is handed
+    to a worker, so two emails arriving back to back both get processed and a
+    crash mid-run does not lose the order. Job ids are also pushed onto an
+    in-memory queue so workers in this process pick them up immediately; the
+    collection is polled only when the in-memory queue is empty, which is how
+    jobs left over from a restart or an expired lease are recovered.
+
+    Delivery is at-least-once: a worker leases a job for `lease_seconds` and
+    another worker may take it over once the lease expires. While a handler
+    runs, a heartbeat extends the lease every `lease_seconds / 3`, so only a
+    worker that died (or stalled past the lease) loses its job. Handlers must
+    still tolerate running twice; see record_orders.
+    """
+
+    def __init__(
+        self,
+        lease_seconds: int = PIPELINE_LEASE_SECONDS,
+        max_attempts: int = PIPELINE_MAX_ATTEMPTS,
+        poll_seconds: float = PIPELINE_POLL_SECONDS,
+    ):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self._local = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Counted by this process since it started; "failed" in metrics() is the jobs parked in the collection
+        self.stats = {"enqueued_total": 0, "completed_total": 0, "retried_total": 0, "failed_total": 0}
+
+    # ----- Producers -----
+    def enqueue_email(self, email_data: dict) -> str:
+        payload = {k: v for k, v in email_data.items() if k not in ("csv_file", "pdf_file")}
+        job = PipelineJob(kind="email", payload=payload)
+        # Attachments go to GridFS and the job keeps only their ids
+        if email_data.get("csv_file"):
+            job.csv_attachment.put(email_data["csv_file"], content_type="text/csv")
+        if email_data.get("pdf_file"):
+            job.pdf_attachment.put(email_data["pdf_file"], content_type="application/pdf")
+        try:
+            return self._enqueue(job)
+        except Exception:
+            job.delete_attachments()
+            raise
+
+    def enqueue_state(self, order_id: str) -> str:
+        return self._enqueue(PipelineJob(kind="state", payload={"order_id": order_id}))
+
+    def _enqueue(self, job: PipelineJob) -> str:
+        job.save()
+        self._local.put(job.id)
+        with self._lock:
+            self.stats["enqueued_total"] += 1
+        return str(job.id)
+
+    # ----- Consumers -----
+    def _claimable(self):
+        now = datetime.datetime.utcnow()
+        return Q(status="queued") | Q(status="leased", lease_expires_at__lt=now)
+
+    def _lease(self, queryset, worker_id: str) -> Optional[PipelineJob]:
+        now = datetime.datetime.utcnow()
+        return queryset.modify(
+            new=True,
+            set__status="leased",
+            set__lease_owner=worker_id,
+            set__lease_expires_at=now + datetime.timedelta(seconds=self.lease_seconds),
+            set__updated_at=now,
+            inc__attempts=1,
+        )
+
+    def claim(self, worker_id: str, timeout: Optional[float] = None) -> Optional[PipelineJob]:
+        """
+        Lease the next job for `worker_id`, or return None if there is nothing to do.
+
+        Ids from the in-memory queue are tried first. Another worker (possibly in
+        another process) may already have leased that job, in which case the
+        atomic `modify` simply matches nothing and we fall through to the collection.
+        """
+        wait = self.poll_seconds if timeout is None else timeout
+        try:
+            job_id = self._local.get(timeout=wait)
+        except queue.Empty:
+            job_id = None
+
+        if job_id is not None:
+            job = self._lease(PipelineJob.objects(Q(id=job_id) & self._claimable()), worker_id)  # type: ignore
+            if job:
+                return job
+
+        return self._lease(PipelineJob.objects(self._claimable()).order_by("created_at"), worker_id)  # type: ignore
+
+    def extend_lease(self, job: PipelineJob) -> bool:
+        """Push the lease of a running job forward. False if the worker no longer holds it."""
+        now = datetime.datetime.utcnow()
+        return bool(PipelineJob.objects(id=job.id, lease_owner=job.lease_owner, status="leased").update_one(  # type: ignore
+            set__lease_expires_at=now + datetime.timedelta(seconds=self.lease_seconds),
+            set__updated_at=now,
+        ))
+
+    def record_orders(self, job: PipelineJob, order_ids: List[str]):
+        """
+        Store the orders an email job has created as soon as they exist, so a
+        redelivery of the job (expired lease or retry) plans them instead of
+        creating them again.
+        """
+        job.order_ids = list(order_ids)
+        PipelineJob.objects(id=job.id, lease_owner=job.lease_owner).update_one(  # type: ignore
+            set__order_ids=job.order_ids,
+            set__updated_at=datetime.datetime.utcnow(),
+        )
+
+    def _heartbeat(self, job: PipelineJob, done: threading.Event):
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                if not self.extend_lease(job):
+                    print(f"Lost the lease on job {job.id}; another worker may run it")
+                    return
+            except Exception as e:
+                print(f"Error extending lease on job {job.id}: {e}")
+
+    def _release_attachments(self, job: PipelineJob):
+        # The job is finished for good; its attachments are not read again
+        try:
+            job.delete_attachments()
+        except Exception as e:
+            print(f"Error deleting attachments of job {job.id}: {e}")
+
+    def complete(self, job: PipelineJob, order_ids: Optional[List[str]] = None):
+        now = datetime.datetime.utcnow()
+        updated = PipelineJob.objects(id=job.id, lease_owner=job.lease_owner).update_one(  # type: ignore
+            set__status="done",
+            set__order_ids=order_ids or [],
+            set__updated_at=now,
+            set__finished_at=now,
+            unset__lease_expires_at=True,
+            unset__csv_attachment=True,
+            unset__pdf_attachment=True,
+        )
+        # A worker that lost its lease leaves the attachments to the new owner
+        if updated:
+            self._release_attachments(job)
+        with self._lock:
+            self.stats["completed_total"] += 1
+
+    def fail(self, job: PipelineJob, error: Exception):
+        """
+        Return the job to the queue, or park it as failed once it is out of
+        attempts. A parked job keeps its error but not its attachments; the
+        email itself is still in the mailbox if it needs replaying.
+        """
+        exhausted = job.attempts >= self.max_attempts
+        now = datetime.datetime.utcnow()
+        updates = {"set__finished_at": now, "unset__csv_attachment": True, "unset__pdf_attachment": True} if exhausted else {}
+        updated = PipelineJob.objects(id=job.id, lease_owner=job.lease_owner).update_one(  # type: ignore
+            set__status="failed" if exhausted else "queued",
+            set__last_error=str(error),
+            set__updated_at=now,
+            unset__lease_expires_at=True,
+            **updates,
+        )
+        if updated and exhausted:
+            self._release_attachments(job)
+        with self._lock:
+            self.stats["failed_total" if exhausted else "retried_total"] += 1
+        if not exhausted:
+            self._local.put(job.id)
+
+    # ----- Workers -----
+    def _worker_loop(self, worker_id: str, handler: Callable[[PipelineJob], List[str]]):
+        while not self._stop.is_set():
+            try:
+                job = self.claim(worker_id)
+            except Exception as e:
+                print(f"[{worker_id}] Error claiming job: {e}")
+                self._stop.wait(self.poll_seconds)
+                continue
+
+            if job is None:
+                continue
+
+            print(f"[{worker_id}] Running {job.kind} job {job.id} (attempt {job.attempts})")
+            done = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+            heartbeat.start()
+            try:
+                order_ids = handler(job)
+                self.complete(job, order_ids)
+                print(f"[{worker_id}] Job {job.id} done for order(s) {order_ids}")
+            except Exception as e:
+                print(f"[{worker_id}] Pipeline error on job {job.id}: {e}")
+                traceback.print_exc()
+                self.fail(job, e)
+            finally:
+                done.set()
+                heartbeat.join()
+
+    def start_workers(self, handler: Callable[[PipelineJob], List[str]], count: int = PIPELINE_WORKERS):
+        """Start `count` daemon workers. Calling this again while workers are alive is a no-op."""
+        with self._lock:
+            if any(t.is_alive() for t in self._workers):
+                return
+            self._stop.clear()
+            host = socket.gethostname()
+            self._workers = [
+                threading.Thread(
+                    target=self._worker_loop,
+                    args=(f"{host}:{os.getpid()}:worker-{i}", handler),
+                    daemon=True,
+                )
+                for i in range(count)
+            ]
+            for t in self._workers:
+                t.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        for t in self._workers:
+            t.join(timeout)
+
+    # ----- Metrics -----
+    def metrics(self) -> dict:
+        counts = {status: 0 for status in JOB_STATUSES}
+        for row in PipelineJob.objects.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):  # type: ignore
+            counts[row["_id"]] = row["count"]
+
+        with self._lock:
+            stats = dict(self.stats)
+            workers_alive = sum(t.is_alive() for t in self._workers)
+
+        return {
+            "depth": counts["queued"],
+            "in_flight": counts["leased"],
+            "done": counts["done"],
+            "failed": counts["failed"],
+            "in_memory": self._local.qsize(),
+            "workers": workers_alive,
+            **stats,
+        }
@@ -1,66 +1,54 @@
 import sys
 import os
 import threading
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
-from models.types import Order
+from models.types import Order, PipelineJob
 from scripts.truck_loader.ingestion import create_customer_receipt
 from scripts.truck_loader.services import find_items_without_dimensions_from_order
+from scripts.truck_loader.pdf_text import warm_pdf_pool
+from pipeline.job_queue import PIPELINE_WORKERS
 import shared_state
 
-pipeline_trigger_event = threading.Event()
-shared_state.pipeline_trigger_event = pipeline_trigger_event  # inject shared event
-
-def start_truck_loader_thread():
-    def pipeline_loop():
-        while True:
-            pipeline_trigger_event.wait()
-            pipeline_trigger_event.clear()
-
-            try:
-                order_id = shared_state.order_id_holder["id"]
-                print("Triggered: Running pipeline...")
-                if order_id:
-                    run_pipeline_on_state(order_id)
-                else:
-                    order_id = run_pipline_on_email(shared_state.email_data)
-
-                # send_email(order_id)
-                print("Loader response done for ", order_id)
-                print("Pipeline completed.")
-            except Exception as e:
-                print(f"Pipeline error: {e}")
-
-    threading.Thread(target=pipeline_loop, daemon=True).start()
-
-def run_pipline_on_email(email_data):
-    # Initialize all of the objects 
-    customer_order_reciept = create_customer_receipt(email_data)
+ORDER_PLAN_WORKERS = int(os.getenv("PIPELINE_ORDER_PLAN_WORKERS", "4"))
 
-    customer_domain = customer_order_reciept["customer_email_domain"]
-    order_id = customer_order_reciept["order_id"]
+def start_truck_loader_thread(workers: int = PIPELINE_WORKERS):
+    # Spawn the PDF worker processes in the background so startup isn't blocked
+    threading.Thread(target=warm_pdf_pool, daemon=True).start()
+    shared_state.job_queue.start_workers(run_job, workers)
 
-    # Compare against to DB/master sheet and identify new items
-    missing_items = find_items_without_dimensions_from_order(order_id)
+def run_job(job: PipelineJob) -> List[str]:
+    print("Triggered: Running pipeline...")
+    if job.kind == "state":
+        return [run_pipeline_on_state(job.payload["order_id"])]
 
-    if not missing_items:
-        # Pass all requirements to the truck loader
-        response = ["img1", "img2", "img3", "img4"]
+    if job.order_ids:
+        # Redelivered after the orders were created: only plan them
+        print(f"Job {job.id} already created order(s) {list(job.order_ids)}; planning only.")
+        return plan_orders(list(job.order_ids))
 
-        Order.objects(id=order_id).update_one(
-            set__loading_instructions=response,
-            set__status="done"
-        )
+    order_ids = create_orders_from_email(job.to_email_data())
+    shared_state.job_queue.record_orders(job, order_ids)
+    return plan_orders(order_ids)
 
-        return order_id
+def create_orders_from_email(email_data) -> List[str]:
+    # Initialize all of the objects; one Order per order number in the email
+    customer_order_reciept = create_customer_receipt(email_data)
+    return customer_order_reciept["order_ids"]
 
-    Order.objects(id=order_id).update_one(set__status="incomplete")
+def plan_orders(order_ids: List[str]) -> List[str]:
+    # Plan each order independently so a large order doesn't hold up the others
+    if len(order_ids) <= 1:
+        return [run_pipeline_on_state(order_id) for order_id in order_ids]
 
-    return order_id
+    with ThreadPoolExecutor(max_workers=min(ORDER_PLAN_WORKERS, len(order_ids))) as pool:
+        return list(pool.map(run_pipeline_on_state, order_ids))
 
 
 def run_pipeline_on_state(order_id):
-    # check for missing items; should be none now
+    # Compare against to DB/master sheet and identify new items
     missing_items = find_items_without_dimensions_from_order(order_id)
 
     if not missing_items:
@@ -77,4 +65,3 @@ def run_pipeline_on_state(order_id):
     Order.objects(id=order_id).update_one(set__status="incomplete")
 
     return order_id
-
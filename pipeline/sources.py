@@ -0,0 +1,304 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from email.header import decode_header, make_header
+from email.parser import BytesParser
+from typing import Callable, Iterable, List, Optional, Tuple
+import shared_state
+
+# Only these attachments are read; matched by extension or MIME type
+ORDER_ATTACHMENT_TYPES = {
+    'csv': ('text/csv', 'application/csv'),
+    'pdf': ('application/pdf',),
+}
+# Messages fetched in parallel by ingest()
+INGEST_FETCH_WORKERS = int(os.getenv('INGEST_FETCH_WORKERS', '4'))
+# Seconds between scans of a watched maildir
+MAILDIR_POLL_SECONDS = float(os.getenv('MAILDIR_POLL_SECONDS', '5'))
+
+
+def attachment_kind(filename, mime_type):
+    """'csv' or 'pdf' for attachments the pipeline reads, None for anything else."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    for kind, mime_types in ORDER_ATTACHMENT_TYPES.items():
+        if extension == f'.{kind}' or mime_type in mime_types:
+            return kind
+    return None
+
+
+def handle_parsed_email(email_data, enqueue=None):
+    """Queue an email for the truck loader pipeline. Returns the job id, or None if it was skipped."""
+    if not (email_data.get("csv_file") or email_data.get("pdf_file")):
+        print("Skipping email: No CSV or PDF attachments.")
+        return None
+
+    job_id = (enqueue or shared_state.job_queue.enqueue_email)(email_data)
+    print(f"Email with attachment queued as job {job_id}.")
+    return job_id
+
+
+def print_email_summary(email_data):
+    # ✅ Print metadata
+    print(f"\nNew Email - Subject: {email_data['subject']}")
+    print(f"From: {email_data['from']}")
+    print(f"To: {email_data['to']}")
+    print(f"Date: {email_data['date']}")
+
+    # ✅ Print body preview
+    if email_data['email_body']:
+        preview = email_data['email_body'][:200] + ('...' if len(email_data['email_body']) > 200 else '')
+        print(f"Body Preview:\n{preview}\n")
+    else:
+        print("⚠ No body found.")
+
+    # ✅ Print attachments
+    if email_data.get('csv_file'):
+        print(f"✔ Found CSV attachment ({len(email_data['csv_file'])} bytes)")
+    if email_data.get('pdf_file'):
+        print(f"✔ Found PDF attachment ({len(email_data['pdf_file'])} bytes)")
+    if not (email_data.get('csv_file') or email_data.get('pdf_file')):
+        print("⚠ No CSV or PDF attachments found.")
+
+
+def _header(message, name):
+    value = message.get(name)
+    return str(make_header(decode_header(value))) if value else ''
+
+
+def parse_rfc822(raw: bytes) -> dict:
+    """
+    Build the pipeline's email_data dict from a raw RFC 822 message.
+
+    Uses the compat32 parser and decodes only the four headers we keep; the
+    default policy parses every header of every part into objects, which
+    costs more than the rest of ingestion put together.
+    """
+    message = BytesParser().parsebytes(raw)
+    body = []
+    files = {}
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        filename = part.get_filename()
+        disposition = part.get_content_disposition()
+        kind = attachment_kind(filename, part.get_content_type())
+        if kind and (filename or disposition == 'attachment'):
+            files.setdefault(kind, part.get_payload(decode=True))
+        elif part.get_content_type() == 'text/plain' and disposition != 'attachment':
+            charset = part.get_content_charset() or 'utf-8'
+            try:
+                body.append(part.get_payload(decode=True).decode(charset, errors='replace'))
+            except LookupError:
+                body.append(part.get_payload(decode=True).decode('utf-8', errors='replace'))
+
+    return {
+        "csv_file": files.get('csv'),
+        "pdf_file": files.get('pdf'),
+        "subject": _header(message, 'subject'),
+        "from": _header(message, 'from'),
+        "to": _header(message, 'to'),
+        "date": _header(message, 'date'),
+        "email_body": ''.join(body).strip()
+    }
+
+
+class EmailSource(ABC):
+    """
+    Where order emails come from.
+
+    A source names its messages with opaque refs: poll() returns refs that are
+    ready to be ingested, fetch(ref) returns the email_data dict the pipeline
+    queues (or None if the message no longer exists), and done(ref) is called
+    once a message has been queued (or skipped) so the source can stop offering
+    it. Push-driven sources such as Gmail are handed their refs by the listener
+    and keep the default poll().
+    """
+
+    name = "source"
+
+    def key(self, ref) -> str:
+        """Idempotency key for the dedupe store."""
+        return f"{self.name}:{ref}"
+
+    def poll(self) -> List[str]:
+        return []
+
+    @abstractmethod
+    def fetch(self, ref) -> Optional[dict]:
+        ...
+
+    def done(self, ref):
+        pass
+
+
+class MaildirSource(EmailSource):
+    """
+    A local maildir, e.g. one fed by an IMAP sync tool or by copying archived
+    .eml files into new/. Refs are file names in new/; handled messages are
+    moved to cur/ as a mail client would.
+    """
+
+    name = "maildir"
+
+    def __init__(self, path: str):
+        self.path = path
+        for subdir in ('tmp', 'new', 'cur'):
+            os.makedirs(os.path.join(path, subdir), exist_ok=True)
+
+    def key(self, ref) -> str:
+        # The unique part of the name; flags after ':' may change
+        return f"{self.name}:{ref.split(':', 1)[0]}"
+
+    def poll(self) -> List[str]:
+        return sorted(name for name in os.listdir(os.path.join(self.path, 'new')) if not name.startswith('.'))
+
+    def fetch(self, ref) -> dict:
+        with open(os.path.join(self.path, 'new', ref), 'rb') as f:
+            return parse_rfc822(f.read())
+
+    def done(self, ref):
+        seen = ref if ':' in ref else ref + ':2,'
+        os.replace(os.path.join(self.path, 'new', ref), os.path.join(self.path, 'cur', seen))
+
+
+class ReplaySource(EmailSource):
+    """
+    Replays a fixed set of emails, for tests and throughput benchmarks. Items
+    are raw RFC 822 bytes or ready-made email_data dicts; refs are list indexes.
+    """
+
+    name = "replay"
+
+    def __init__(self, emails: Iterable):
+        self.emails = list(emails)
+        self._pending = list(range(len(self.emails)))
+
+    @classmethod
+    def from_directory(cls, path: str) -> "ReplaySource":
+        """Load every .eml file in `path`, in name order."""
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith('.eml'))
+        emails = []
+        for name in names:
+            with open(os.path.join(path, name), 'rb') as f:
+                emails.append(f.read())
+        return cls(emails)
+
+    def poll(self) -> List[int]:
+        pending, self._pending = self._pending, []
+        return pending
+
+    def fetch(self, ref) -> dict:
+        email = self.emails[ref]
+        return parse_rfc822(email) if isinstance(email, (bytes, bytearray)) else dict(email)
+
+
+def ingest(
+    source: EmailSource,
+    refs: Iterable,
+    dedupe=None,
+    enqueue: Optional[Callable[[dict], str]] = None,
+    workers: int = INGEST_FETCH_WORKERS,
+    dead_letters=None,
+) -> List[Tuple[object, Optional[str], Optional[Exception]]]:
+    """
+    Fetch and queue the messages `refs` from `source`.
+
+    Messages are fetched `workers` at a time and queued in the order given;
+    fetching in chunks bounds how many emails' attachments are held in memory
+    during a burst. Refs already in `dedupe` are skipped (and marked done), as
+    are messages the source reports as gone. A failed message does not stop the
+    others and is not marked done, unless `dead_letters` says it has failed too
+    many times: it is then marked done and in `dedupe`, and reported without an
+    error so it no longer holds anything back.
+
+    Returns:
+        list of (ref, job_id, error) in input order for the refs not skipped;
+        job_id is None for emails without order attachments.
+    """
+    pending = []
+    for ref in refs:
+        if dedupe and dedupe.seen(source.key(ref)):
+            print(f"{source.name} message {ref} already processed, skipping.")
+            source.done(ref)
+        else:
+            pending.append(ref)
+
+    def fetch(ref):
+        try:
+            print(f"Processing {source.name} message {ref}")
+            return source.fetch(ref), None
+        except Exception as e:
+            return None, e
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for offset in range(0, len(pending), workers):
+            chunk = pending[offset:offset + workers]
+            for ref, (email_data, error) in zip(chunk, pool.map(fetch, chunk)):
+                job_id = None
+                key = source.key(ref)
+                try:
+                    if error:
+                        raise error
+
+                    if email_data is None:
+                        print(f"{source.name} message {ref} no longer exists, skipping.")
+                    else:
+                        job_id = handle_parsed_email(email_data, enqueue)
+                    if dedupe:
+                        dedupe.mark(key, job_id)
+                    source.done(ref)
+                    if dead_letters:
+                        dead_letters.clear(key)
+                    if email_data is not None:
+                        print_email_summary(email_data)
+                except Exception as e:
+                    print(f"Error processing {source.name} message {ref}: {e}")
+                    traceback.print_exception(e)
+                    error = e
+                    if dead_letters and dead_letters.record_failure(key, e):
+                        print(f"Giving up on {source.name} message {ref}; recorded as a dead letter.")
+                        if dedupe:
+                            dedupe.mark(key)
+                        try:
+                            source.done(ref)
+                        except Exception as done_error:
+                            print(f"Error retiring {source.name} message {ref}: {done_error}")
+                        error = None
+                results.append((ref, job_id, error))
+    return results
+
+
+def watch_source(source: EmailSource, stop: threading.Event, dedupe=None, interval: float = MAILDIR_POLL_SECONDS,
+                 dead_letters=None):
+    """Poll `source` every `interval` seconds and ingest whatever it offers until `stop` is set."""
+    while not stop.is_set():
+        try:
+            refs = source.poll()
+            if refs:
+                results = ingest(source, refs, dedupe=dedupe, dead_letters=dead_letters)
+                failed = sum(1 for _, _, error in results if error)
+                print(f"{source.name}: {len(results) - failed} message(s) ingested, {failed} failed")
+        except Exception as e:
+            print(f"Error polling {source.name}: {e}")
+            traceback.print_exc()
+        stop.wait(interval)
+
+
+def start_maildir_watcher_thread(path: Optional[str] = None):
+    """Ingest from the maildir at `path` (default: the INGEST_MAILDIR setting) in a daemon thread."""
+    from pipeline.dedupe import DedupeStore
+    from pipeline.dead_letter import DeadLetterStore
+
+    path = path or os.getenv('INGEST_MAILDIR')
+    if not path:
+        return None
+    stop = threading.Event()
+    source = MaildirSource(path)
+    thread = threading.Thread(target=watch_source, args=(source, stop, DedupeStore()),
+                              kwargs={"dead_letters": DeadLetterStore()}, daemon=True)
+    thread.start()
+    print(f"Watching maildir {path}")
+    return stop
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from models.types import Account, Member
 from utils.dependencies import get_current_user
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate, set_next_cursor
 from pydantic import BaseModel
 from typing import List, Optional
 
@@ -75,8 +76,17 @@ def update_company_settings(settings: CompanySettings, current_user: Member = De
 
 # Get all members
 @router.get("/members")
-def get_members(current_user: Member = Depends(get_current_user)):
-    members = Member.objects(account=current_user.account.id)
+def get_members(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Member = Depends(get_current_user)
+):
+    members, next_cursor = paginate(
+        Member.objects(account=current_user.account.id).only("id", "name", "email", "phone", "role", "date_created"),
+        cursor, limit
+    )
+    set_next_cursor(response, next_cursor)
     return [
         {
             "id": str(member.id),
@@ -1,8 +1,11 @@
-from models.types import Account, Member, Customer, Order, Item
+from models.types import Account, Member, Customer, Order, OrderBatch, Item
 from utils.dependencies import get_current_user
-from fastapi import APIRouter, Depends, HTTPException, Body
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate, set_next_cursor
+from mongoengine.errors import NotUniqueError
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class CreateCustomerRequest(BaseModel):
     name: str
@@ -13,10 +16,44 @@ class UpdateCustomerRequest(BaseModel):
 
 router = APIRouter()
 
+ORDER_LIST_FIELDS = ("id", "order_item_ids", "order_date", "shipment_times", "status", "loading_instructions")
+ORDER_ITEM_FIELDS = ("id", "item_number", "description", "units_per_pallet", "height", "width", "length")
+
+def load_order_batches(orders):
+    """
+    Load the batches and items referenced by raw `orders` documents with one
+    query each, instead of dereferencing every batch and item on its own.
+
+    Returns:
+        (batches, items): raw documents keyed by ObjectId.
+    """
+    batch_ids = {batch_id for order in orders for batch_id in order.get("order_item_ids", [])}
+    if not batch_ids:
+        return {}, {}
+    batches = {
+        b["_id"]: b
+        for b in OrderBatch.objects(id__in=list(batch_ids)).only("id", "item_id", "number_pallets").as_pymongo()  # type: ignore
+    }
+
+    item_ids = {b["item_id"] for b in batches.values() if b.get("item_id")}
+    items = {
+        i["_id"]: i
+        for i in Item.objects(id__in=list(item_ids)).only(*ORDER_ITEM_FIELDS).as_pymongo()  # type: ignore
+    } if item_ids else {}
+    return batches, items
+
 @router.get("/")
-def get_customers_on_account(current_user: Member = Depends(get_current_user)):
+def get_customers_on_account(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Member = Depends(get_current_user)
+):
     account = current_user.account  # Extract account from member
-    customers = Customer.objects(account=account)  # type: ignore
+    customers, next_cursor = paginate(
+        Customer.objects(account=account).only("id", "name", "email_domain"), cursor, limit  # type: ignore
+    )
+    set_next_cursor(response, next_cursor)
 
     return [{"id": str(c.id), "name": c.name, "email_domain": c.email_domain} for c in customers]
 
@@ -34,37 +71,52 @@ def get_customer(id: str, current_user: Member = Depends(get_current_user)):
     }
 
 @router.get("/{id}/orders")
-def get_orders_from_customer(id: str, current_user: Member = Depends(get_current_user)):
+def get_orders_from_customer(
+    id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Member = Depends(get_current_user)
+):
     account = current_user.account
     customer = Customer.objects(id=id, account=account).first()  # type: ignore
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
 
-    orders = Order.objects(customer=customer)  # type: ignore
+    orders, next_cursor = paginate(
+        Order.objects(customer=customer).only(*ORDER_LIST_FIELDS).as_pymongo(), cursor, limit  # type: ignore
+    )
+    set_next_cursor(response, next_cursor)
+    batches, items = load_order_batches(orders)
+
+    def serialize_batch(batch_id):
+        batch = batches.get(batch_id)
+        if batch is None:
+            return None
+        item = items.get(batch.get("item_id"))
+        return {
+            "order_batch_id": str(batch_id),
+            "number_pallets": batch.get("number_pallets"),
+            "item": {
+                "item_id": str(item["_id"]),
+                "item_number": item.get("item_number"),
+                "description": item.get("description"),
+                "units_per_pallet": item.get("units_per_pallet"),
+                "height": item.get("height"),
+                "width": item.get("width"),
+                "length": item.get("length")
+            } if item else None
+        }
 
     def serialize_order(order):
         return {
-            "id": str(order.pk),
-            "order_batches": [
-                {
-                    "order_batch_id": str(ob.id),
-                    "number_pallets": ob.number_pallets,
-                    "item": {
-                        "item_id": str(ob.item_id.id),
-                        "item_number": ob.item_id.item_number,
-                        "description": ob.item_id.description,
-                        "units_per_pallet": ob.item_id.units_per_pallet,
-                        "height": ob.item_id.height,
-                        "width": ob.item_id.width,
-                        "length": ob.item_id.length
-                    } if ob.item_id else None
-                }
-                for ob in order.order_item_ids
-            ],
-            "order_date": order.order_date.isoformat(),
-            "shipment_times": order.shipment_times,
-            "status": order.status,
-            "loading_instructions": order.loading_instructions or []
+            "id": str(order["_id"]),
+            # Batches that no longer exist are dropped, as dereferencing did
+            "order_batches": [b for b in map(serialize_batch, order.get("order_item_ids", [])) if b],
+            "order_date": order["order_date"].date().isoformat(),
+            "shipment_times": order.get("shipment_times", []),
+            "status": order.get("status"),
+            "loading_instructions": order.get("loading_instructions") or []
         }
 
     return [serialize_order(order) for order in orders]
@@ -77,30 +129,43 @@ def get_unique_items_for_customer(id: str, current_user: Member = Depends(get_cu
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
 
-    orders = Order.objects(customer=customer)  # type: ignore
-
-    unique_items = {}
-    for order in orders:
-        for ob in order.order_item_ids:
-            item = ob.item_id
-            if item and str(item.id) not in unique_items:
-                unique_items[str(item.id)] = {
-                    "item_id": str(item.id),
-                    "item_number": item.item_number,
-                    "description": item.description,
-                    "units_per_pallet": item.units_per_pallet,
-                }
-
-    return list(unique_items.values())
+    # Distinct batches, then distinct items, then the item documents; the
+    # $match uses the Order.customer index and both lookups hit _id
+    pipeline = [
+        {"$match": {"customer": customer.id}},
+        {"$unwind": "$order_item_ids"},
+        {"$group": {"_id": "$order_item_ids"}},
+        {"$lookup": {"from": OrderBatch._get_collection_name(), "localField": "_id", "foreignField": "_id", "as": "batch"}},
+        {"$unwind": "$batch"},
+        {"$group": {"_id": "$batch.item_id"}},
+        {"$lookup": {"from": Item._get_collection_name(), "localField": "_id", "foreignField": "_id", "as": "item"}},
+        {"$unwind": "$item"},
+        {"$project": {"item_number": "$item.item_number", "description": "$item.description",
+                      "units_per_pallet": "$item.units_per_pallet"}},
+        {"$sort": {"item_number": 1}},
+    ]
+
+    return [
+        {
+            "item_id": str(item["_id"]),
+            "item_number": item.get("item_number"),
+            "description": item.get("description"),
+            "units_per_pallet": item.get("units_per_pallet"),
+        }
+        for item in Order.objects.aggregate(pipeline)  # type: ignore
+    ]
 
 @router.post("/")
 def create_customer(customer_data: CreateCustomerRequest, current_user: Member = Depends(get_current_user)):
     account = current_user.account
-    customer = Customer(
-        name=customer_data.name,
-        email_domain=customer_data.email_domain,
-        account=account
-    ).save()
+    try:
+        customer = Customer(
+            name=customer_data.name,
+            email_domain=customer_data.email_domain,
+            account=account
+        ).save()
+    except NotUniqueError:
+        raise HTTPException(status_code=400, detail="Customer with this email domain already exists")
 
     return {
         "id": str(customer.id),
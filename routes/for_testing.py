@@ -1,9 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends
 from models.request_bodies import TriggerRequest
-from threading import Event
 from models.types import Member, Customer, Order, OrderBatch, Item
-from shared_state import pipeline_trigger_event, email_data
 from utils.dependencies import get_current_user
+from scripts.truck_loader.llm_cache import llm_cache
+from scripts.truck_loader.shipment_times import shipment_time_path_metrics
 from datetime import datetime
 from bson import ObjectId
 import shared_state
@@ -27,17 +27,26 @@ async def trigger_pipeline(
         "email_body": email_body
     }
 
-    shared_state.email_data = email_data
-    shared_state.order_id_holder["id"] = None
-    shared_state.pipeline_trigger_event.set()
+    job_id = shared_state.job_queue.enqueue_email(email_data)
 
-    return {"status": "Pipeline triggered"}
+    return {"status": "Pipeline triggered", "job_id": job_id}
 
 
 @router.post("/pipeline-trigger")
 def email_trigger(payload: TriggerRequest):
-    pipeline_trigger_event = Event()
-    return {"status": "Email event triggered", "order_id": payload.order_id}
+    job_id = shared_state.job_queue.enqueue_state(payload.order_id)
+    return {"status": "Email event triggered", "order_id": payload.order_id, "job_id": job_id}
+
+@router.get("/queue-metrics")
+def queue_metrics():
+    return shared_state.job_queue.metrics()
+
+@router.get("/ingest-metrics")
+def ingest_metrics():
+    return {
+        "llm_cache": llm_cache.metrics(),
+        "shipment_time_paths": shipment_time_path_metrics(),
+    }
 
 @router.post("/create-test-order")
 def create_test_order(current_user: Member = Depends(get_current_user)):
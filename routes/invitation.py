@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from models.types import Account, Member, Invitation
 from models.request_bodies import SendInvitation, ResendInvitation, DeleteInvitation
 from utils.dependencies import get_current_user
-from typing import List
+from utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, paginate, set_next_cursor
+from typing import List, Optional
 import datetime
 import urllib.parse
 
@@ -100,25 +101,38 @@ def send_invitation(
     }
 
 @router.get("/invitations")
-def get_pending_invitations(current_user: Member = Depends(get_current_user)):
-    """Get all pending invitations for the current account"""
-    
-    invitations = Invitation.objects(
-        account=current_user.account,
-        status="pending",
-        expires_at__gte=datetime.datetime.utcnow()
+def get_pending_invitations(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Member = Depends(get_current_user)
+):
+    """Get pending invitations for the current account, a page at a time"""
+    
+    invitations, next_cursor = paginate(
+        Invitation.objects(
+            account=current_user.account,
+            status="pending",
+            expires_at__gte=datetime.datetime.utcnow()
+        ).only("id", "email", "role", "message", "date_created", "expires_at", "status", "invited_by").as_pymongo(),
+        cursor, limit
     )
+    set_next_cursor(response, next_cursor)
+
+    # One lookup for the inviters' names instead of a dereference per invitation
+    inviter_ids = list({invitation["invited_by"] for invitation in invitations if invitation.get("invited_by")})
+    inviters = dict(Member.objects(id__in=inviter_ids).scalar("id", "name")) if inviter_ids else {}
     
     return [
         {
-            "id": str(invitation.id),
-            "email": invitation.email,
-            "role": invitation.role,
-            "message": invitation.message,
-            "date_created": invitation.date_created.isoformat(),
-            "expires_at": invitation.expires_at.isoformat(),
-            "status": invitation.status,
-            "invited_by": invitation.invited_by.name if invitation.invited_by else "Unknown"
+            "id": str(invitation["_id"]),
+            "email": invitation["email"],
+            "role": invitation.get("role"),
+            "message": invitation.get("message"),
+            "date_created": invitation["date_created"].isoformat(),
+            "expires_at": invitation["expires_at"].isoformat(),
+            "status": invitation.get("status"),
+            "invited_by": inviters.get(invitation.get("invited_by"), "Unknown")
         }
         for invitation in invitations
     ]
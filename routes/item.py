@@ -19,6 +19,7 @@ def update_item_dimensions(item_id: str, payload: UpdateDimensionsRequest):
     item.height = payload.height
     item.width = payload.width
     item.length = payload.length
+    item.dimensions_confidence = "confirmed"
     item.save()
     print(f"Saved item {item_id}: height={item.height}, width={item.width}, length={item.length}")
 
@@ -27,5 +28,6 @@ def update_item_dimensions(item_id: str, payload: UpdateDimensionsRequest):
         "item_number": item.item_number,
         "height": item.height,
         "width": item.width,
-        "length": item.length
+        "length": item.length,
+        "dimensions_confidence": item.dimensions_confidence
     }
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
@@ -6,6 +6,7 @@ from bson import ObjectId
 
 from models.types import Notification, Member
 from utils.dependencies import get_current_user
+from utils.pagination import paginate, set_next_cursor
 
 router = APIRouter()
 
@@ -32,21 +33,32 @@ class MarkReadRequest(BaseModel):
 
 @router.get("/notifications", response_model=List[NotificationResponse])
 def get_notifications(
-    limit: int = Query(default=50, le=100),
-    offset: int = Query(default=0, ge=0),
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    offset: int = Query(default=0, ge=0, deprecated=True),
     unread_only: bool = Query(default=False),
     current_user: Member = Depends(get_current_user)
 ):
-    """Get notifications for the current user"""
+    """
+    Get notifications for the current user, newest first.
+
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one.
+    `offset` still works for older clients but costs more the deeper it goes.
+    """
     query = {"account": current_user.account, "member": current_user.id}
     
     if unread_only:
         query["is_read"] = False
     
-    notifications = (Notification.objects(**query)
-                   .order_by('-created_at')
-                   .skip(offset)
-                   .limit(limit))
+    queryset = Notification.objects(**query).only(
+        "id", "title", "description", "type", "is_read", "created_at", "read_at", "metadata"
+    )
+    if offset and not cursor:
+        notifications = queryset.order_by('-created_at').skip(offset).limit(limit)
+    else:
+        notifications, next_cursor = paginate(queryset, cursor, limit, field="created_at", descending=True)
+        set_next_cursor(response, next_cursor)
     
     return [
         NotificationResponse(
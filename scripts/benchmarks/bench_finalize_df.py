@@ -0,0 +1,70 @@
+"""
+Benchmark finalize_df on a large consolidated order.
+
+Builds an N-line order by repeating data/example_order.csv with unique item
+numbers, then times finalize_df against the previous row-by-row implementation.
+
+Run with: python scripts/benchmarks/bench_finalize_df.py [--rows 10000]
+"""
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader.ingestion import finalize_df
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+
+def legacy_finalize_df(df, special_instructions, units_per_pallet):
+    # Previous implementation, minus the per-row prints
+    for instr in special_instructions:
+        item_id = instr["item_id"]
+        if item_id in df['Item'].values:
+            df.loc[df['Item'] == item_id, 'Special_Instructions'] = instr["instruction"]
+
+    for entry in units_per_pallet:
+        item_id = entry["item_id"]
+        if item_id in df['Item'].astype(str).values:
+            df.loc[df['Item'].astype(str) == item_id, 'Units_Per_Pallet'] = entry["units_per_pallet"]
+
+    return df
+
+
+def build_order(rows: int):
+    base = pd.read_csv(os.path.join(DATA_DIR, "example_order.csv"), dtype={'Item': str})
+    df = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).head(rows)
+    df['Item'] = [f"{10000000 + i}" for i in range(rows)]
+
+    items = df['Item'].tolist()
+    special_instructions = [
+        {"item_id": item_id, "instruction": f"Do not double stack {item_id}"}
+        for item_id in items[::10]
+    ]
+    units_per_pallet = [{"item_id": item_id, "units_per_pallet": 100 + i % 50} for i, item_id in enumerate(items)]
+    return df, special_instructions, units_per_pallet
+
+
+def time_it(fn, df, special_instructions, units_per_pallet):
+    start = time.perf_counter()
+    result = fn(df.copy(), special_instructions, units_per_pallet)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    df, special_instructions, units_per_pallet = build_order(args.rows)
+    print(f"{args.rows} lines, {len(special_instructions)} instructions, {len(units_per_pallet)} pallet entries")
+
+    new_time, new_df = time_it(finalize_df, df, special_instructions, units_per_pallet)
+    old_time, old_df = time_it(legacy_finalize_df, df, special_instructions, units_per_pallet)
+
+    pd.testing.assert_frame_equal(new_df, old_df, check_dtype=False)
+    print(f"legacy loop:  {old_time:8.3f}s")
+    print(f"vectorized:   {new_time:8.3f}s  ({old_time / new_time:.0f}x faster)")
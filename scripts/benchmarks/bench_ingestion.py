@@ -0,0 +1,95 @@
+"""
+Replay order emails through the ingestion path and report throughput.
+
+Builds N copies of an order email carrying data/example_order.csv and
+data/example_order.pdf (or loads archived .eml files with --eml-dir), then
+ingests them from an in-memory replay source and from a temporary maildir.
+By default jobs go to an in-memory sink, which measures parsing and fetching
+alone; --queue enqueues into the real job queue using MONGO_URI/MONGO_DB_NAME.
+
+Run with: python scripts/benchmarks/bench_ingestion.py [--emails 2000] [--workers 4]
+"""
+import argparse
+import io
+import mailbox
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from email.message import EmailMessage
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from pipeline.sources import MaildirSource, ReplaySource, ingest
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+
+def build_emails(count):
+    with open(os.path.join(DATA_DIR, "example_order.csv"), "rb") as f:
+        csv_bytes = f.read()
+    with open(os.path.join(DATA_DIR, "example_order.pdf"), "rb") as f:
+        pdf_bytes = f.read()
+
+    emails = []
+    for n in range(count):
+        message = EmailMessage()
+        message["Subject"] = f"Shorr order {n}"
+        message["From"] = "orders@shorr.com"
+        message["To"] = "loads@movomint.com"
+        message["Date"] = "Mon, 18 Nov 2024 10:11:00 -0500"
+        message.set_content("Please schedule pickup for 7am.")
+        message.add_attachment(csv_bytes, maintype="text", subtype="csv", filename="order.csv")
+        message.add_attachment(pdf_bytes, maintype="application", subtype="pdf", filename="order.pdf")
+        emails.append(message.as_bytes())
+    return emails
+
+
+def run(source, refs, workers, enqueue):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        results = ingest(source, refs, enqueue=enqueue, workers=workers)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for _, _, error in results if error)
+    return len(results), failed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--eml-dir", help="replay archived .eml files instead of generated ones")
+    parser.add_argument("--queue", action="store_true", help="enqueue into the real job queue")
+    args = parser.parse_args()
+
+    if args.queue:
+        from config.db import connect_db
+        import shared_state
+        connect_db()
+        enqueue = shared_state.job_queue.enqueue_email
+    else:
+        enqueue = lambda email_data: "sink"
+
+    emails = ReplaySource.from_directory(args.eml_dir).emails if args.eml_dir else build_emails(args.emails)
+    size = sum(map(len, emails)) / len(emails) / 1024
+    print(f"{len(emails)} emails, {size:.0f} KiB each, sink={'job queue' if args.queue else 'memory'}")
+
+    for workers in sorted({1, args.workers}):
+        source = ReplaySource(emails)
+        count, failed, elapsed = run(source, source.poll(), workers, enqueue)
+        print(f"replay   workers={workers:<3} {count / elapsed:8.0f} emails/s  ({elapsed:.2f}s, {failed} failed)")
+
+    for workers in sorted({1, args.workers}):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "inbox")
+            inbox = mailbox.Maildir(path, create=True)
+            for raw in emails:
+                inbox.add(mailbox.MaildirMessage(raw))
+            source = MaildirSource(path)
+            count, failed, elapsed = run(source, source.poll(), workers, enqueue)
+            print(f"maildir  workers={workers:<3} {count / elapsed:8.0f} emails/s  ({elapsed:.2f}s, {failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
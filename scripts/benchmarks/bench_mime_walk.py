@@ -0,0 +1,112 @@
+"""
+Benchmark body, header and attachment extraction on large multipart messages.
+
+Builds a Gmail API payload with many nested text parts and attachment parts,
+then times walk_message against the previous implementation (a recursive
+text walk concatenating with +=, a separate header dict and a separate
+attachment walk).
+
+Run with: python scripts/benchmarks/bench_mime_walk.py [--parts 500] [--part-kib 8]
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.listen_gmail import attachment_kind, walk_message
+
+
+def legacy_plain_text(payload):
+    def get_text_from_parts(parts):
+        text = ''
+        for part in parts:
+            if part.get('mimeType') == 'text/plain':
+                data = part['body'].get('data')
+                if data:
+                    text += base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
+            elif part.get('mimeType', '').startswith('multipart/'):
+                if 'parts' in part:
+                    text += get_text_from_parts(part['parts'])
+        return text
+    return get_text_from_parts(payload['parts']).strip()
+
+
+def legacy_attachment_parts(payload):
+    unnamed = 0
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        filename = (part.get('filename') or '').strip()
+        mime_type = part.get('mimeType', 'application/octet-stream')
+        body = part.get('body', {})
+        if 'attachmentId' in body or (body.get('data') and (filename or mime_type.startswith('application/'))):
+            if not filename and mime_type.startswith('application/'):
+                unnamed += 1
+                filename = f"attachment_{unnamed}.{mime_type.split('/')[-1]}"
+            if filename:
+                yield {'filename': filename, 'mime_type': mime_type, 'kind': attachment_kind(filename, mime_type),
+                       'attachment_id': body.get('attachmentId'), 'inline_data': body.get('data'),
+                       'size': body.get('size', 0)}
+        stack.extend(reversed(part.get('parts', [])))
+
+
+def legacy(payload):
+    headers = {h['name'].lower(): h['value'] for h in payload.get('headers', [])}
+    return {
+        'subject': headers.get('subject', ''),
+        'from': headers.get('from', ''),
+        'to': headers.get('to', ''),
+        'date': headers.get('date', ''),
+        'body': legacy_plain_text(payload),
+        'attachments': list(legacy_attachment_parts(payload)),
+    }
+
+
+def build_payload(parts, part_kib):
+    chunk = ("Item 10020345 qty 12 pallets, pickup 7am dock 4. " * (part_kib * 20 + 1))[:part_kib * 1024 or 64]
+    data = base64.urlsafe_b64encode(chunk.encode()).decode()
+    children = []
+    for n in range(parts):
+        children.append({"mimeType": "multipart/alternative", "parts": [
+            {"mimeType": "text/plain", "filename": "", "body": {"data": data}},
+            {"mimeType": "text/html", "filename": "", "body": {"data": data}},
+        ]})
+        if n % 10 == 0:
+            children.append({"mimeType": "application/pdf", "filename": f"ack{n}.pdf",
+                             "body": {"attachmentId": f"att{n}", "size": 50000}})
+    headers = [{"name": f"X-Header-{n}", "value": "x" * 60} for n in range(40)]
+    headers += [{"name": "Subject", "value": "Order"}, {"name": "From", "value": "orders@shorr.com"}]
+    return {"mimeType": "multipart/mixed", "headers": headers, "parts": children}
+
+
+def timed(fn, payload, repeats):
+    # Best of `repeats`; decoding dominates and run-to-run noise is large
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parts", type=int, default=500)
+    parser.add_argument("--part-kib", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    for parts, part_kib in sorted({(10, args.part_kib), (100, args.part_kib), (args.parts, args.part_kib), (args.parts, 0)}):
+        payload = build_payload(parts, part_kib)
+        old, old_time = timed(legacy, payload, args.repeats)
+        new, new_time = timed(walk_message, payload, args.repeats)
+        assert old == new
+        print(f"{parts:5} text parts x {part_kib} KiB: {old_time * 1000:8.2f}ms -> {new_time * 1000:.2f}ms "
+              f"({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark OrderBatch creation in create_customer_receipt.
+
+Compares DB round-trips and wall time of create_order_from_df against the
+previous per-row lookup/save implementation for 50- and 500-line orders.
+Needs a MongoDB instance; it writes to a throwaway database and drops it.
+
+Run with: python scripts/benchmarks/bench_order_batches.py [--host mongodb://localhost:27017]
+"""
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import Account, Customer, Item, Order, OrderBatch
+from scripts.truck_loader.ingestion import create_order_from_df
+from utils.query_counter import QueryCounter
+
+BENCH_DB = "bench_order_batches"
+
+
+def legacy_create_order(final_df, customer, date_ordered, shipment_times):
+    # Previous implementation of step 6/7 of create_customer_receipt
+    order_items = []
+    for _, row in final_df.iterrows():
+        order_quantity = int(row.get("Qty_Ord", 0))
+        units_per_pallet = int(row.get("Units_Per_Pallet", 1))
+
+        item = Item.objects(item_number=row["Item"]).first()
+        if not item:
+            continue
+
+        order_item = OrderBatch(item_id=item.id, number_pallets=0)
+        order_item.set_pallets(order_quantity, units_per_pallet)
+        order_item.save()
+        order_items.append(order_item)
+
+    order = Order(
+        customer=customer,
+        order_item_ids=order_items,
+        order_date=pd.to_datetime(date_ordered),
+        shipment_times=shipment_times,
+        status="processing",
+        loading_instructions=None
+    )
+    order.save()
+    return order
+
+
+def seed(lines: int):
+    item_numbers = [f"{20000000 + i}" for i in range(lines)]
+    Item.objects.insert([
+        Item(item_number=n, height=1.0, width=1.0, length=1.0, special_instructions="", units_per_pallet=100)
+        for n in item_numbers
+    ], load_bulk=False)
+    return pd.DataFrame({
+        "Item": item_numbers,
+        "Qty_Ord": [250] * lines,
+        "Units_Per_Pallet": [100] * lines,
+    })
+
+
+def measure(fn, counter, df, customer):
+    counter.reset()
+    start = time.perf_counter()
+    fn(df, customer, "11/18/24", ["7am"])
+    return counter.total, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    args = parser.parse_args()
+
+    counter = QueryCounter()
+    disconnect()
+    connect(BENCH_DB, host=args.host, uuidRepresentation="standard", event_listeners=[counter])
+
+    try:
+        account = Account(email="bench@example.com", name="Bench", company_code="BENCH").save()
+        customer = Customer(account=account, email_domain="bench.com").save()
+
+        print(f"{'lines':>6} {'legacy trips':>13} {'bulk trips':>11} {'legacy s':>9} {'bulk s':>8}")
+        for lines in (50, 500):
+            Item.drop_collection()
+            df = seed(lines)
+            legacy_trips, legacy_time = measure(legacy_create_order, counter, df, customer)
+            bulk_trips, bulk_time = measure(create_order_from_df, counter, df, customer)
+            print(f"{lines:>6} {legacy_trips:>13} {bulk_trips:>11} {legacy_time:>9.3f} {bulk_time:>8.3f}")
+    finally:
+        for doc in (Account, Customer, Item, Order, OrderBatch):
+            doc.drop_collection()
+        disconnect()
@@ -0,0 +1,113 @@
+"""
+Benchmark the PDF acknowledgment extractors on a many-page document.
+
+Builds an N-page PDF by repeating the pages of data/example_order.pdf, then
+times the ack date and units-per-pallet extractors against the previous
+implementation (eager extraction of every page, per-line re.match/re.search
+with string patterns). The regex scan alone is also timed on already
+extracted text.
+
+Run with: python scripts/benchmarks/bench_pdf_extract.py [--pages 40]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from io import BytesIO
+import pypdfium2 as pdfium
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader.pdf_text import PdfDocument
+from scripts.truck_loader.ingestion import extract_date_ordered_from_pdf, extract_units_per_pallet_from_pdf
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+
+def legacy_date_ordered(pages):
+    for text in pages:
+        lines = text.splitlines()
+        for i, line in enumerate(lines):
+            if "Ack Date" in line and i + 2 < len(lines):
+                match = re.search(r"(\d{2}/\d{2}/\d{2})", lines[i + 2])
+                if match:
+                    return match.group(0)
+    return "unknown"
+
+
+def legacy_units_per_pallet(pages):
+    results = []
+    current_item_id = None
+    for text in pages:
+        for line in text.splitlines():
+            item_match = re.match(r"^\d+\s+(\d{8})\s+\d{2}/\d{2}/\d{2}", line)
+            if item_match:
+                current_item_id = item_match.group(1)
+                continue
+            if current_item_id:
+                pallet_match = re.search(r"(\d+)\s*(?:cs|EA|RL)?/pallet", line, re.IGNORECASE)
+                if pallet_match:
+                    results.append({"item_id": current_item_id, "units_per_pallet": int(pallet_match.group(1))})
+                    current_item_id = None
+    return results
+
+
+def build_pdf(pages: int) -> bytes:
+    source = pdfium.PdfDocument(os.path.join(DATA_DIR, "example_order.pdf"))
+    scaled = pdfium.PdfDocument.new()
+    while len(scaled) < pages:
+        count = min(len(source), pages - len(scaled))
+        scaled.import_pages(source, list(range(count)))
+    buffer = BytesIO()
+    scaled.save(buffer)
+    return buffer.getvalue()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--scan-repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    pdf_bytes = build_pdf(args.pages)
+    print(f"{args.pages}-page PDF, {len(pdf_bytes) / 1024:.0f} KiB")
+
+    # Previous behaviour: extract every page up front, then scan
+    def legacy(pdf):
+        pages = PdfDocument.from_bytes(pdf).pages
+        return legacy_date_ordered(pages), legacy_units_per_pallet(pages)
+
+    def date_only(pdf):
+        return extract_date_ordered_from_pdf(PdfDocument.from_bytes(pdf))
+
+    def current(pdf):
+        document = PdfDocument.from_bytes(pdf)
+        return extract_date_ordered_from_pdf(document), extract_units_per_pallet_from_pdf(document)
+
+    (old_date, old_units), legacy_time = timed(legacy, pdf_bytes)
+    new_date, date_time = timed(date_only, pdf_bytes)
+    (_, new_units), current_time = timed(current, pdf_bytes)
+    assert (old_date, old_units) == (new_date, new_units)
+
+    print(f"ack date, eager extraction:    {legacy_time:8.3f}s")
+    print(f"ack date, lazy early exit:     {date_time:8.3f}s")
+    print(f"date + units, both versions:   {legacy_time:8.3f}s -> {current_time:.3f}s ({len(new_units)} items)")
+
+    # Regex scan alone on already extracted text
+    pages = PdfDocument.from_bytes(pdf_bytes).pages
+    document = PdfDocument(pages)
+    _, legacy_scan = timed(lambda: [legacy_units_per_pallet(pages) for _ in range(args.scan_repeats)])
+    _, current_scan = timed(lambda: [extract_units_per_pallet_from_pdf(document) for _ in range(args.scan_repeats)])
+    print(f"units scan x{args.scan_repeats}:              {legacy_scan:8.3f}s -> {current_scan:.3f}s "
+          f"({legacy_scan / current_scan:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
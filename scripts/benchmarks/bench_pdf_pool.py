@@ -0,0 +1,62 @@
+"""
+Measure how much PDF extraction stalls other threads of the API process.
+
+A ticker thread sleeps 1ms in a loop and records how late each wake-up is,
+standing in for the event loop serving requests. The ticker runs while an
+N-page PDF is extracted in-process and then through the PDF worker pool.
+
+Run with: python scripts/benchmarks/bench_pdf_pool.py [--pages 40]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader import pdf_text
+from bench_pdf_extract import build_pdf
+
+
+def measure_stalls(fn):
+    delays = []
+    done = threading.Event()
+
+    def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            time.sleep(0.001)
+            delays.append(time.perf_counter() - start - 0.001)
+
+    thread = threading.Thread(target=ticker)
+    thread.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    done.set()
+    thread.join()
+
+    delays.sort()
+    p99 = delays[int(len(delays) * 0.99)]
+    return elapsed, p99, delays[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    args = parser.parse_args()
+
+    pdf_bytes = build_pdf(args.pages)
+    pdf_text.warm_pdf_pool()
+
+    for label, use_pool in (("in-process", False), ("worker pool", True)):
+        pdf_text.PDF_PROCESS_POOL = use_pool
+        elapsed, p99, worst = measure_stalls(lambda: pdf_text.extract_page_text(pdf_bytes))
+        print(f"{label:12} extract {elapsed:6.2f}s   ticker delay p99 {p99 * 1000:7.2f}ms   max {worst * 1000:7.2f}ms")
+
+    pdf_text.shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import sys
+
+# Add the parent directory to Python path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongoengine.connection import get_db
+from models.types import Customer, Item, Order, OrderBatch
+
+
+def collection(document):
+    # Raw collection: Document.objects would try to build the unique index and fail on the duplicates
+    return get_db()[document._get_collection_name()]
+
+
+def duplicate_groups(document, *key_fields, match=None):
+    """Ids of the documents sharing each duplicated key, one list per key."""
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$group": {"_id": {f: f"${f}" for f in key_fields}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    return [group["ids"] for group in collection(document).aggregate(pipeline, allowDiskUse=True)]
+
+
+def drop_index_unless_unique(document, name):
+    """Drop index `name` if it exists without the unique option, so ensure_indexes can recreate it as unique."""
+    index = collection(document).index_information().get(name)
+    if index and not index.get("unique"):
+        collection(document).drop_index(name)
+        print(f"Dropped non-unique index {name} on {document._get_collection_name()}")
+
+
+def dedupe_items():
+    """
+    Merge items sharing an item_number so the unique item_number index can be
+    built. The item to keep is the one with confirmed dimensions, then any
+    dimensions at all, then the oldest; order batches pointing at the others
+    are moved onto it before they are deleted.
+
+    Returns:
+        int: number of items removed.
+    """
+    removed = 0
+    for ids in duplicate_groups(Item, "item_number"):
+        items = sorted(collection(Item).find({"_id": {"$in": ids}}), key=lambda item: (
+            item.get("dimensions_confidence") != "confirmed",
+            not (item.get("length") and item.get("width") and item.get("height")),
+            item["_id"],
+        ))
+        keep, duplicates = items[0], [item["_id"] for item in items[1:]]
+
+        moved = collection(OrderBatch).update_many({"item_id": {"$in": duplicates}}, {"$set": {"item_id": keep["_id"]}})
+        collection(Item).delete_many({"_id": {"$in": duplicates}})
+        removed += len(duplicates)
+        print(f"Item {keep['item_number']}: kept {keep['_id']}, removed {len(duplicates)}, "
+              f"moved {moved.modified_count} order batch(es)")
+    return removed
+
+
+def dedupe_customers():
+    """
+    Merge an account's customers sharing an email domain (concurrent ingests
+    of a new domain used to create one each) so the unique (account,
+    email_domain) index can be built. The oldest customer is kept and orders
+    of the others are moved onto it. Blank domains are left alone.
+
+    Returns:
+        int: number of customers removed.
+    """
+    # Declared without unique before; the unique one cannot be built alongside it
+    drop_index_unless_unique(Customer, "account_1_email_domain_1")
+
+    removed = 0
+    for ids in duplicate_groups(Customer, "account", "email_domain", match={"email_domain": {"$gt": ""}}):
+        customers = sorted(collection(Customer).find({"_id": {"$in": ids}}), key=lambda customer: customer["_id"])
+        keep, duplicates = customers[0], [customer["_id"] for customer in customers[1:]]
+        name = keep.get("name") or next((c["name"] for c in customers if c.get("name")), None)
+        if name != keep.get("name"):
+            collection(Customer).update_one({"_id": keep["_id"]}, {"$set": {"name": name}})
+
+        moved = collection(Order).update_many({"customer": {"$in": duplicates}}, {"$set": {"customer": keep["_id"]}})
+        collection(Customer).delete_many({"_id": {"$in": duplicates}})
+        removed += len(duplicates)
+        print(f"Customer {keep['email_domain']}: kept {keep['_id']}, removed {len(duplicates)}, "
+              f"moved {moved.modified_count} order(s)")
+    return removed
+
+
+def dedupe_records():
+    """Run every dedupe step; safe to run again once the data is clean."""
+    print(f"Removed {dedupe_items()} duplicate item(s)")
+    print(f"Removed {dedupe_customers()} duplicate customer(s)")
+
+
+if __name__ == "__main__":
+    from config.db import connect_db, ensure_indexes
+
+    connect_db()
+    dedupe_records()
+    ensure_indexes()
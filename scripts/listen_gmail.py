@@ -1,18 +1,30 @@
 import os
 import json
 import base64
+import datetime
 import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 
+import httplib2
+import google_auth_httplib2
 from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from googleapiclient.errors import HttpError
 from email import policy
 from email.parser import BytesParser
 from dotenv import load_dotenv
-import shared_state
+from models.types import GmailCheckpoint
+from pipeline.dedupe import DedupeStore
+from pipeline.dead_letter import DeadLetterStore
+from pipeline.sources import EmailSource, attachment_kind, ingest
 
 # Load environment
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -28,12 +40,39 @@ TOKEN_FILE = os.path.join(os.path.dirname(__file__), '..', 'token.json')
 # Scopes for Gmail API
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Refresh the OAuth token this long before it expires instead of on a 401
+GMAIL_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv('GMAIL_TOKEN_REFRESH_MARGIN_SECONDS', '300'))
+
+GMAIL_ATTACHMENT_WORKERS = int(os.getenv('GMAIL_ATTACHMENT_WORKERS', '4'))
+
+# Pub/Sub flow control: notifications held unacked at once, and the callback pool
+PUBSUB_MAX_MESSAGES = int(os.getenv('PUBSUB_MAX_MESSAGES', '10'))
+PUBSUB_MAX_BYTES = int(os.getenv('PUBSUB_MAX_BYTES', str(1024 * 1024)))
+PUBSUB_CALLBACK_WORKERS = int(os.getenv('PUBSUB_CALLBACK_WORKERS', '4'))
+# Gmail messages fetched in parallel while draining a history batch
+GMAIL_FETCH_WORKERS = int(os.getenv('GMAIL_FETCH_WORKERS', '4'))
+
+# Gmail's alias for the authorized mailbox
+GMAIL_USER_ID = 'me'
+# Inbox messages re-listed when the checkpoint is too old for history().list
+GMAIL_RESYNC_MAX_MESSAGES = int(os.getenv('GMAIL_RESYNC_MAX_MESSAGES', '50'))
+
 # Global variables to track state
-last_processed_history_id = None
-processed_message_ids = set()
+message_dedupe = DedupeStore()
+message_dead_letters = DeadLetterStore()
+_history_lock = threading.Lock()
+# Shared by every message so each download thread keeps its Gmail connection open between messages
+_attachment_pool = ThreadPoolExecutor(max_workers=GMAIL_ATTACHMENT_WORKERS, thread_name_prefix='gmail-attachment')
+
+def gmail_message_key(msg_id):
+    return f"gmail:{msg_id}"
 
 # --- Gmail Service using OAuth 2.0 token
-def get_gmail_service():
+def save_gmail_credentials(creds):
+    with open(TOKEN_FILE, 'w') as token:
+        token.write(creds.to_json())
+
+def load_gmail_credentials():
     creds = None
     # The file token.json stores the user's access and refresh tokens
     if os.path.exists(TOKEN_FILE):
@@ -47,105 +86,143 @@ def get_gmail_service():
             flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
             creds = flow.run_local_server(port=0)
         # Save the credentials for the next run
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
-    
-    return build('gmail', 'v1', credentials=creds)
+        save_gmail_credentials(creds)
 
-def get_email_body(payload, preferred_type='text/plain'):
+    return creds
+
+class GmailClient:
     """
-    Extract the email body from the message payload.
-    
-    Args:
-        payload: The Gmail API message payload
-        preferred_type: The preferred MIME type ('text/plain' or 'text/html')
-    
+    One long-lived, thread-safe Gmail API client.
+
+    The discovery document is the copy bundled with google-api-python-client
+    (static_discovery) and the service object is built once. httplib2 is not
+    thread-safe, so every request runs on its calling thread's own authorized
+    connection, which is kept open and reused by that thread.
+
+    The OAuth token is refreshed GMAIL_TOKEN_REFRESH_MARGIN_SECONDS before it
+    expires, and reconnect() drops every connection after a transport error so
+    the next request opens a fresh one.
+    """
+
+    def __init__(self, load_credentials=load_gmail_credentials, save_credentials=save_gmail_credentials,
+                 refresh_margin_seconds=GMAIL_TOKEN_REFRESH_MARGIN_SECONDS):
+        self._load_credentials = load_credentials
+        self._save_credentials = save_credentials
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin_seconds)
+        self._creds = None
+        self._service = None
+        self._generation = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _credentials(self):
+        # Caller holds self._lock
+        if self._creds is None:
+            self._creds = self._load_credentials()
+
+        expiry = self._creds.expiry
+        expiring = expiry is not None and expiry - datetime.datetime.utcnow() < self.refresh_margin
+        if (expiring or not self._creds.valid) and self._creds.refresh_token:
+            print("Refreshing Gmail access token.")
+            self._creds.refresh(Request())
+            self._save_credentials(self._creds)
+        return self._creds
+
+    def http(self):
+        """This thread's authorized connection, opened on first use."""
+        with self._lock:
+            creds = self._credentials()
+            generation = self._generation
+
+        local = self._local
+        if getattr(local, 'http', None) is None or local.generation != generation:
+            local.http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+            local.generation = generation
+        return local.http
+
+    def _build_request(self, _http, *args, **kwargs):
+        return HttpRequest(self.http(), *args, **kwargs)
+
+    def service(self):
+        """The shared Gmail service, with the token refreshed if it is about to expire."""
+        with self._lock:
+            creds = self._credentials()
+            if self._service is None:
+                self._service = build(
+                    'gmail', 'v1',
+                    http=google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http()),
+                    requestBuilder=self._build_request,
+                    static_discovery=True,
+                    cache_discovery=False
+                )
+            return self._service
+
+    def reconnect(self):
+        with self._lock:
+            self._generation += 1
+        print("Gmail connections reset; they will reopen on the next request.")
+
+gmail_client = GmailClient()
+
+# Headers kept from each message, keyed by their lowercased name
+EMAIL_METADATA_HEADERS = ('subject', 'from', 'to', 'date')
+
+def walk_message(payload):
+    """
+    Walk a message payload (single-part or nested multipart) once.
+
+    Text parts are base64-decoded exactly once and joined at the end rather
+    than concatenated as they are found. Attachment parts are described but
+    not downloaded; see get_attachments.
+
+    The body is the text/plain parts reachable through multipart containers
+    only, so a forwarded message/rfc822 part does not add its text. Attachment
+    parts without a filename are included when their type is application/*,
+    under a generated name such as attachment_1.pdf.
+
     Returns:
-        String containing the email body or None if not found
+        dict with 'subject', 'from', 'to', 'date', 'body' and 'attachments'
+        (descriptors in document order).
     """
-    body = {}
-    
-    # Helper function to extract body parts recursively
-    def extract_parts(part, indent=0):
-        if part.get('mimeType') in ['text/plain', 'text/html']:
-            body_data = part.get('body', {}).get('data')
-            if body_data:
-                mime_type = part.get('mimeType')
-                if mime_type not in body:
-                    body[mime_type] = []
-                body[mime_type].append(base64.urlsafe_b64decode(body_data).decode('utf-8', errors='replace'))
-        
-        # Process any nested parts
-        if 'parts' in part:
-            for p in part['parts']:
-                extract_parts(p, indent + 1)
-    
-    # Start extraction process with the payload
-    if payload.get('mimeType') in ['text/plain', 'text/html']:
-        body_data = payload.get('body', {}).get('data')
-        if body_data:
-            mime_type = payload.get('mimeType')
-            body[mime_type] = [base64.urlsafe_b64decode(body_data).decode('utf-8', errors='replace')]
-    
-    # Process parts if available
-    if 'parts' in payload:
-        for part in payload['parts']:
-            extract_parts(part)
-    
-    # Return the preferred type if available, or fall back to the other type
-    if preferred_type in body and body[preferred_type]:
-        return '\n'.join(body[preferred_type])
-    elif 'text/plain' in body and body['text/plain']:
-        return '\n'.join(body['text/plain'])
-    elif 'text/html' in body and body['text/html']:
-        return '\n'.join(body['text/html'])
-    
-    return None
-
-def extract_plain_text(message):
-    """Extract plain text body from a message."""
-    def get_text_from_parts(parts):
-        text = ''
-        for part in parts:
-            if part.get('mimeType') == 'text/plain':
-                data = part['body'].get('data')
-                if data:
-                    decoded_text = base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
-                    text += decoded_text
-            elif part.get('mimeType', '').startswith('multipart/'):
-                if 'parts' in part:
-                    text += get_text_from_parts(part['parts'])
-        return text
-
-    if 'parts' in message['payload']:
-        return get_text_from_parts(message['payload']['parts']).strip()
-    else:
-        # Single part message
-        if message['payload'].get('mimeType') == 'text/plain':
-            data = message['payload']['body'].get('data')
-            if data:
-                return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace').strip()
-    
-    return ''
+    message = dict.fromkeys(EMAIL_METADATA_HEADERS, '')
+    for header in payload.get('headers', []):
+        name = header['name'].lower()
+        if name in message:
+            message[name] = header['value']
 
-def extract_email_metadata(message):
-    headers = {header['name'].lower(): header['value'] for header in message['payload'].get('headers', [])}
-    
-    subject = headers.get('subject', '')
-    sender = headers.get('from', '')
-    recipient = headers.get('to', '')
-    date = headers.get('date', '')
-    
-    body = extract_plain_text(message)
-    
-    return {
-        'subject': subject,
-        'from': sender,
-        'to': recipient,
-        'date': date,
-        'body': body
-    }
+    text = []
+    attachments = []
+    unnamed = 0
+    stack = [(payload, True)]
+    while stack:
+        part, in_body = stack.pop()
+        filename = (part.get('filename') or '').strip()
+        mime_type = part.get('mimeType', 'application/octet-stream')
+        body = part.get('body', {})
+
+        if 'attachmentId' in body or (body.get('data') and (filename or mime_type.startswith('application/'))):
+            if not filename and mime_type.startswith('application/'):
+                unnamed += 1
+                filename = f"attachment_{unnamed}.{mime_type.split('/')[-1]}"
+            if filename:
+                attachments.append({
+                    'filename': filename,
+                    'mime_type': mime_type,
+                    'kind': attachment_kind(filename, mime_type),
+                    'attachment_id': body.get('attachmentId'),
+                    'inline_data': body.get('data'),
+                    'size': body.get('size', 0)
+                })
+        elif in_body and mime_type == 'text/plain' and body.get('data'):
+            text.append(base64.urlsafe_b64decode(body['data']).decode('utf-8', errors='replace'))
 
+        # Depth-first, in document order
+        if 'parts' in part:
+            stack.extend(zip(reversed(part['parts']), repeat(in_body and mime_type.startswith('multipart/'))))
+
+    message['body'] = ''.join(text).strip()
+    message['attachments'] = attachments
+    return message
 
 def process_message(service, msg_id):
     """
@@ -161,133 +238,79 @@ def process_message(service, msg_id):
 
     message = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
     
-    attachments = get_attachments(service, 'me', message)
-    email_metadata = extract_email_metadata(message)
+    parsed = walk_message(message['payload'])
+    attachments = get_attachments(service, 'me', message, parsed['attachments'])
     
     email_data = {
-        "csv_file": next((a['data'] for a in attachments if a['filename'].lower().endswith('.csv')), None),
-        "pdf_file": next((a['data'] for a in attachments if a['filename'].lower().endswith('.pdf')), None),
-        "subject": email_metadata['subject'],
-        "from": email_metadata['from'],
-        "to": email_metadata['to'],
-        "date": email_metadata['date'],
-        "email_body": email_metadata['body']
+        "csv_file": next((a['data'] for a in attachments if a['kind'] == 'csv'), None),
+        "pdf_file": next((a['data'] for a in attachments if a['kind'] == 'pdf'), None),
+        "subject": parsed['subject'],
+        "from": parsed['from'],
+        "to": parsed['to'],
+        "date": parsed['date'],
+        "email_body": parsed['body']
     }
     
     return email_data
 
-def get_attachments(service, user_id, message):
+def get_attachments(service, user_id, message, parts=None):
     """
-    Get all attachments from the message
+    Get the CSV and PDF attachments from the message
     
+    Attachment parts are collected from the payload first (or taken from
+    `parts`, the descriptors from walk_message); anything that is
+    not a CSV or PDF is skipped before it is downloaded, and the remaining
+    attachments are fetched concurrently on the shared download pool
+    (GMAIL_ATTACHMENT_WORKERS threads).
+
     Args:
         service: Gmail API service instance
         user_id: User ID ('me' for the authenticated user)
         message: The full message object
+        parts: Attachment descriptors already collected by walk_message
     
     Returns:
-        List of dicts containing attachment details
+        List of dicts containing attachment details, in message order
     """
-    attachments = []
-    
-    def process_parts(parts, parent_mime_type=None):
-        for part in parts:
-            filename = part.get('filename')
-            mime_type = part.get('mimeType', 'application/octet-stream')
-            
-            # Handle attachments with filenames
-            if filename and filename.strip():
-                body = part.get('body', {})
-                if 'attachmentId' in body:
-                    attachment_id = body['attachmentId']
-                    try:
-                        attachment = service.users().messages().attachments().get(
-                            userId=user_id, 
-                            messageId=message['id'], 
-                            id=attachment_id
-                        ).execute()
-                        
-                        data = base64.urlsafe_b64decode(attachment['data'])
-                        
-                        attachments.append({
-                            'filename': filename,
-                            'size': len(data),
-                            'mime_type': mime_type,
-                            'data': data
-                        })
-                        print(f"Processed attachment: {filename} ({mime_type})")
-                    except Exception as e:
-                        print(f"Error getting attachment {filename}: {e}")
-            
-            # Handle multipart message structures that might contain attachments
-            elif mime_type.startswith('multipart/'):
-                if 'parts' in part:
-                    process_parts(part['parts'], mime_type)
-            
-            # Handle inline attachments that might not have filenames
-            elif 'application/' in mime_type and not filename:
-                # Generate a filename based on content type if none exists
-                file_ext = mime_type.split('/')[-1]
-                generated_filename = f"attachment_{len(attachments)+1}.{file_ext}"
-                
-                body = part.get('body', {})
-                if 'attachmentId' in body:
-                    attachment_id = body['attachmentId']
-                    try:
-                        attachment = service.users().messages().attachments().get(
-                            userId=user_id, 
-                            messageId=message['id'], 
-                            id=attachment_id
-                        ).execute()
-                        
-                        data = base64.urlsafe_b64decode(attachment['data'])
-                        
-                        attachments.append({
-                            'filename': generated_filename,
-                            'size': len(data),
-                            'mime_type': mime_type,
-                            'data': data
-                        })
-                        print(f"Processed unnamed attachment as: {generated_filename} ({mime_type})")
-                    except Exception as e:
-                        print(f"Error getting unnamed attachment: {e}")
-            
-            # Process any additional nested parts
-            if 'parts' in part:
-                process_parts(part['parts'], mime_type)
-    
-    # Process the payload
-    if 'parts' in message['payload']:
-        process_parts(message['payload']['parts'], message['payload'].get('mimeType'))
+    if parts is None:
+        parts = walk_message(message['payload'])['attachments']
+
+    wanted = []
+    for part in parts:
+        if part['kind']:
+            wanted.append(part)
+        else:
+            print(f"Skipping attachment {part['filename']} ({part['mime_type']}, {part['size']} bytes)")
+
+    def download(part):
+        try:
+            data = part['inline_data']
+            if part['attachment_id']:
+                data = service.users().messages().attachments().get(
+                    userId=user_id, 
+                    messageId=message['id'], 
+                    id=part['attachment_id']
+                ).execute()['data']
+            data = base64.urlsafe_b64decode(data)
+        except Exception as e:
+            print(f"Error getting attachment {part['filename']}: {e}")
+            return None
+
+        print(f"Processed attachment: {part['filename']} ({part['mime_type']})")
+        return {
+            'filename': part['filename'],
+            'size': len(data),
+            'mime_type': part['mime_type'],
+            'kind': part['kind'],
+            'data': data
+        }
+
+    if len(wanted) > 1:
+        downloaded = list(_attachment_pool.map(download, wanted))
     else:
-        # Handle single-part messages that might be attachments
-        part = message['payload']
-        filename = part.get('filename')
-        mime_type = part.get('mimeType', 'application/octet-stream')
-        
-        if filename and filename.strip():
-            body = part.get('body', {})
-            if 'attachmentId' in body:
-                attachment_id = body['attachmentId']
-                try:
-                    attachment = service.users().messages().attachments().get(
-                        userId=user_id, 
-                        messageId=message['id'], 
-                        id=attachment_id
-                    ).execute()
-                    
-                    data = base64.urlsafe_b64decode(attachment['data'])
-                    
-                    attachments.append({
-                        'filename': filename,
-                        'size': len(data),
-                        'mime_type': mime_type,
-                        'data': data
-                    })
-                    print(f"Processed single-part attachment: {filename} ({mime_type})")
-                except Exception as e:
-                    print(f"Error getting single-part attachment {filename}: {e}")
-    
+        downloaded = [download(part) for part in wanted]
+    attachments = [a for a in downloaded if a]
+
     # Debug output
     if attachments:
         print(f"Found {len(attachments)} attachments in message {message['id']}")
@@ -304,134 +327,230 @@ def get_attachments(service, user_id, message):
     
     return attachments
 
-def handle_parsed_email(email_data):
-    if not (email_data.get("csv_file") or email_data.get("pdf_file")):
-        print("Skipping email: No CSV or PDF attachments.")
-        return
+class GmailSource(EmailSource):
+    """The authorized Gmail mailbox; refs are Gmail message ids handed over by the Pub/Sub listener."""
+
+    name = "gmail"
 
-    shared_state.email_data = email_data
-    shared_state.order_id_holder["id"] = None
-    shared_state.pipeline_trigger_event.set()
-    print("Email with attachment processed.")
+    def __init__(self, service):
+        self.service = service
+
+    def fetch(self, ref):
+        try:
+            return process_message(self.service, ref)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # Deleted between its messagesAdded record and this fetch; it will never come back
+            return None
+
+# --- History checkpoint
+def load_history_checkpoint(mailbox=GMAIL_USER_ID):
+    checkpoint = GmailCheckpoint.objects(mailbox=mailbox).first() # type: ignore
+    return checkpoint.history_id if checkpoint else None
+
+def save_history_checkpoint(history_id, mailbox=GMAIL_USER_ID):
+    # $max so the checkpoint never moves backwards
+    GmailCheckpoint.objects(mailbox=mailbox).update_one( # type: ignore
+        upsert=True,
+        max__history_id=int(history_id),
+        set__updated_at=datetime.datetime.utcnow()
+    )
+
+def list_new_messages(service, start_history_id):
+    """
+    List the messages added to the inbox after `start_history_id`.
+
+    Follows history().list through every page.
+
+    Returns:
+        tuple: ([(history_id, message_id), ...] oldest first, latest mailbox historyId)
+    """
+    added = []
+    seen = set()
+    latest_history_id = int(start_history_id)
+    request = {
+        'userId': GMAIL_USER_ID,
+        'startHistoryId': str(start_history_id),
+        'historyTypes': ['messageAdded'],
+        'labelId': 'INBOX'
+    }
+
+    while True:
+        response = service.users().history().list(**request).execute()
+
+        for record in response.get('history', []):
+            for message_added in record.get('messagesAdded', []):
+                msg_id = message_added['message']['id']
+                if msg_id not in seen:
+                    seen.add(msg_id)
+                    added.append((int(record['id']), msg_id))
+
+        latest_history_id = max(latest_history_id, int(response.get('historyId', latest_history_id)))
+        if not response.get('nextPageToken'):
+            break
+        request['pageToken'] = response['nextPageToken']
+
+    return added, latest_history_id
+
+def list_recent_messages(service, history_id):
+    """Fallback for an expired checkpoint: the latest inbox messages, oldest first."""
+    results = service.users().messages().list(
+        userId=GMAIL_USER_ID,
+        labelIds=['INBOX'],
+        maxResults=GMAIL_RESYNC_MAX_MESSAGES
+    ).execute()
+    return [(int(history_id), m['id']) for m in reversed(results.get('messages', []))]
 
 def process_gmail_event(service, new_history_id):
-    global last_processed_history_id
+    """
+    Queue every message added to the inbox since the stored checkpoint.
 
-    try:
-        # Get the most recent email in INBOX
-        results = service.users().messages().list(
-            userId='me',
-            labelIds=['INBOX'],
-            maxResults=1
-        ).execute()
-        
-        messages = results.get('messages', [])
-        if not messages:
-            print("No recent messages found in inbox.")
-            return
-        
-        msg_id = messages[0]['id']
-        if msg_id in processed_message_ids:
-            print(f"Message {msg_id} already processed, skipping.")
-            return
-        
-        processed_message_ids.add(msg_id)
-        
-        print(f"Processing latest message with ID: {msg_id}")
-        email_data = process_message(service, msg_id)
+    Notifications can be coalesced or arrive out of order, so the messages come
+    from history().list(startHistoryId=checkpoint) rather than from the
+    notification itself. The checkpoint lives in Mongo and only advances past a
+    message once it has been queued, so a restart or a failed message resumes
+    from the first unhandled message instead of rescanning or dropping mail.
+    Messages deleted before they could be fetched are skipped, and a message
+    that fails INGEST_MAX_ATTEMPTS times is recorded as a dead letter and
+    skipped, so neither holds the checkpoint back. Errors listing the history
+    propagate and leave the checkpoint unchanged.
 
-        # Handle the parsed email data (trigger downstream pipeline, etc.)
-        handle_parsed_email(email_data)
+    Returns:
+        dict: {"queued": messages queued, "failed": messages left for a retry}
+    """
+    with _history_lock:
+        start_history_id = load_history_checkpoint()
+        if start_history_id is None:
+            # First run: nothing earlier to catch up on
+            save_history_checkpoint(new_history_id)
+            print(f"Starting with history ID: {new_history_id}")
+            return {"queued": 0, "failed": 0}
 
-        # ✅ Print metadata
-        print(f"\nNew Email - Subject: {email_data['subject']}")
-        print(f"From: {email_data['from']}")
-        print(f"To: {email_data['to']}")
-        print(f"Date: {email_data['date']}")
-        
-        # ✅ Print body preview
-        if email_data['email_body']:
-            preview = email_data['email_body'][:200] + ('...' if len(email_data['email_body']) > 200 else '')
-            print(f"Body Preview:\n{preview}\n")
-        else:
-            print("⚠ No body found.")
+        try:
+            added, checkpoint = list_new_messages(service, start_history_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            print(f"History ID {start_history_id} has expired; re-listing the latest inbox messages.")
+            added = list_recent_messages(service, start_history_id)
+            checkpoint = int(new_history_id)
 
-        # ✅ Print attachments
-        attachments_found = []
-        if email_data.get('csv_file'):
-            attachments_found.append('CSV')
-            print(f"✔ Found CSV attachment ({len(email_data['csv_file'])} bytes)")
-        if email_data.get('pdf_file'):
-            attachments_found.append('PDF')
-            print(f"✔ Found PDF attachment ({len(email_data['pdf_file'])} bytes)")
+        print(f"{len(added)} new message(s) since history ID {start_history_id}")
 
-        if not attachments_found:
-            print("⚠ No CSV or PDF attachments found.")
+        history_ids = dict((msg_id, history_id) for history_id, msg_id in added)
+        results = ingest(GmailSource(service), [msg_id for _, msg_id in added],
+                         dedupe=message_dedupe, workers=GMAIL_FETCH_WORKERS, dead_letters=message_dead_letters)
+        queued = sum(1 for _, job_id, _ in results if job_id)
+        failed = 0
+        for msg_id, _, error in results:
+            if error:
+                failed += 1
+                # Pick this message up again on the next notification
+                checkpoint = min(checkpoint, history_ids[msg_id] - 1)
 
         # ✅ Update last processed history ID
-        last_processed_history_id = new_history_id
-        print(f"Updated last processed historyId: {new_history_id}")
-    
+        save_history_checkpoint(checkpoint)
+        print(f"Updated last processed historyId: {checkpoint}")
+        return {"queued": queued, "failed": failed}
+
+# --- Pub/Sub Listener using Service Account
+def get_shared_gmail_service():
+    # One client for the life of the listener; see GmailClient
+    try:
+        return gmail_client.service()
     except Exception as e:
-        print(f"Error processing latest message: {e}")
-        import traceback
+        print(f"Error creating Gmail service: {e}")
         traceback.print_exc()
+        return None
+
+def handle_pubsub_message(message, get_service=get_shared_gmail_service):
+    """
+    Pub/Sub callback for Gmail push notifications.
+
+    The notification is acked only once every message it covers has been
+    durably queued (or was already handled, deleted or dead-lettered). If
+    listing the history or any message fails it is nacked instead, so Pub/Sub
+    redelivers it and the checkpoint, which stops before the failed message,
+    is retried.
+    """
+    print(f"\nPub/Sub message received:\n{message.data.decode()}")
+
+    # Pub/Sub delivers at least once; a redelivery costs one cache lookup
+    notification_key = f"pubsub:{message.message_id}"
+    if message_dedupe.seen(notification_key):
+        print(f"Pub/Sub message {message.message_id} already handled, skipping.")
+        message.ack()
+        return
+
+    try:
+        history_id = json.loads(message.data.decode()).get('historyId')
+    except (ValueError, AttributeError) as e:
+        print(f"Dropping malformed Pub/Sub message: {e}")
+        message.ack()
+        return
+    if not history_id:
+        print("No historyId in message.")
+        message.ack()
+        return
+
+    try:
+        gmail_service = get_service()
+        if not gmail_service:
+            print("Failed to create Gmail service, leaving message for redelivery")
+            message.nack()
+            return
+        result = process_gmail_event(gmail_service, history_id)
+    except Exception as e:
+        print(f"Error processing message: {e}")
+        traceback.print_exc()
+        if not isinstance(e, HttpError):
+            # Likely a dropped or timed-out connection
+            gmail_client.reconnect()
+        message.nack()
+        return
+
+    if result["failed"]:
+        print(f"{result['failed']} message(s) failed; leaving notification for redelivery")
+        message.nack()
+        return
+
+    message_dedupe.mark(notification_key)
+    message.ack()
+
+def subscribe_with_flow_control(subscriber, subscription_path, callback=handle_pubsub_message):
+    """
+    Start a streaming pull with bounded outstanding messages (PUBSUB_MAX_MESSAGES,
+    PUBSUB_MAX_BYTES) and a dedicated callback pool (PUBSUB_CALLBACK_WORKERS).
+    Unacked messages count against the limits, so a burst waits in Pub/Sub
+    rather than in this process's memory.
+    """
+    flow_control = pubsub_v1.types.FlowControl(max_messages=PUBSUB_MAX_MESSAGES, max_bytes=PUBSUB_MAX_BYTES)
+    executor = ThreadPoolExecutor(max_workers=PUBSUB_CALLBACK_WORKERS, thread_name_prefix='pubsub-callback')
+    return subscriber.subscribe(
+        subscription_path,
+        callback=callback,
+        flow_control=flow_control,
+        scheduler=ThreadScheduler(executor=executor)
+    )
 
-# --- Pub/Sub Listener using Service Account
 def start_pubsub_listener():
     credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE)
     subscriber = pubsub_v1.SubscriberClient(credentials=credentials)
     subscription_path = f'projects/{PROJECT_ID}/subscriptions/{SUBSCRIPTION_NAME}'
-    
-    # Reconnect with each new message to avoid SSL timeout issues
-    def get_fresh_gmail_service():
-        try:
-            return get_gmail_service()
-        except Exception as e:
-            print(f"Error creating Gmail service: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
 
-    # Initialize (but we'll refresh with each message)
-    gmail_service = get_fresh_gmail_service()
+    gmail_service = get_shared_gmail_service()
     if gmail_service:
-        # Get initial history ID to start from
+        # Catch up on anything that arrived since the stored checkpoint, or
+        # start from the current history ID on the very first run
         try:
             profile = gmail_service.users().getProfile(userId='me').execute()
-            global last_processed_history_id
-            last_processed_history_id = profile.get('historyId')
-            print(f"Starting with history ID: {last_processed_history_id}")
+            process_gmail_event(gmail_service, profile.get('historyId'))
         except Exception as e:
             print(f"Error getting profile: {e}")
-            last_processed_history_id = None
-
-    def callback(message):
-        try:
-            print(f"\nPub/Sub message received:\n{message.data.decode()}")
-            payload = json.loads(message.data.decode())
-            
-            # Get a fresh Gmail service for each message to avoid timeout issues
-            gmail_service = get_fresh_gmail_service()
-            if not gmail_service:
-                print("Failed to create Gmail service, skipping message processing")
-                message.ack()
-                return
-                
-            history_id = payload.get('historyId')
-            if history_id:
-                process_gmail_event(gmail_service, history_id)
-            else:
-                print("No historyId in message.")
-        except Exception as e:
-            print(f"Error processing message: {e}")
-            import traceback
-            traceback.print_exc()
-        finally:
-            message.ack()
 
     print(f"Listening to Pub/Sub subscription: {subscription_path}")
-    streaming_pull_future = subscriber.subscribe(subscription_path, callback=callback)
+    streaming_pull_future = subscribe_with_flow_control(subscriber, subscription_path)
     
     # Keep the main thread alive
     try:
@@ -0,0 +1,54 @@
+import os
+import re
+from fractions import Fraction
+from functools import lru_cache
+from typing import Optional, Tuple
+
+DIMENSION_CACHE_SIZE = int(os.getenv("DIMENSION_CACHE_SIZE", "4096"))
+
+# One measurement in inches: "9", "3-5/8", "11.5", "5/8"
+_NUMBER = r"(\d+(?:\.\d+)?(?:[- ]\d+/\d+)?|\d+/\d+)"
+
+# Three measurements such as "9x6-1/4x3-5/8" or "28 x 18 x 16". A trailing unit
+# other than inches ("8x10x3000ft", "70mmx...") means it is not a carton size.
+DIMENSION_PATTERN = re.compile(
+    r"(?<![\w/.\-])" + _NUMBER + r"\s*x\s*" + _NUMBER + r"\s*x\s*" + _NUMBER + r"(?:\s*(?:in\b|\"))?(?![\w/.\-])",
+    re.IGNORECASE,
+)
+
+
+def _to_inches(value: str) -> float:
+    whole, _, fraction = value.replace(" ", "-").partition("-")
+    if "/" in whole:
+        return float(Fraction(whole))
+    return float(whole) + (float(Fraction(fraction)) if fraction else 0.0)
+
+
+def parse_dimensions(description: str) -> Optional[Tuple[float, float, float]]:
+    """
+    Read carton dimensions out of an item description.
+
+    Descriptions list the inside dimensions as length x width x depth, e.g.
+    "020 9x6-1/4x3-5/8 RSC 32B Kraft" -> (9.0, 6.25, 3.625).
+
+    Returns:
+        tuple: (length, width, height) in inches, or None when the description
+        does not contain exactly one unambiguous set of dimensions.
+    """
+    if not description:
+        return None
+
+    matches = DIMENSION_PATTERN.findall(description)
+    if len(matches) != 1:
+        return None
+
+    dims = tuple(_to_inches(value) for value in matches[0])
+    if not all(d > 0 for d in dims):
+        return None
+    return dims  # type: ignore
+
+
+@lru_cache(maxsize=DIMENSION_CACHE_SIZE)
+def infer_dimensions(item_number: str, description: str) -> Optional[Tuple[float, float, float]]:
+    """Per-SKU memo of parse_dimensions; a changed description is parsed again."""
+    return parse_dimensions(description)
@@ -3,15 +3,59 @@ import logging
 warnings.filterwarnings("ignore", category=UserWarning, module="pdfminer")
 logging.getLogger("pdfminer").setLevel(logging.CRITICAL)
 import re
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
+import datetime
 from io import BytesIO
 import pandas as pd
-from dotenv import load_dotenv
-from openai import OpenAI
-import pdfplumber
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from mongoengine.errors import NotUniqueError
 from models.types import Account, Customer, Order, OrderBatch, Item
+from scripts.truck_loader.stages import Stage, run_stages
+from scripts.truck_loader.pdf_text import load_pdf_document
+from scripts.truck_loader.llm_cache import cached_completion
+from scripts.truck_loader.shipment_times import extract_shipment_times, record_shipment_time_path
+from scripts.truck_loader.dimensions import infer_dimensions
+from scripts.truck_loader.master_data import master_index
+
+# Per-stage timeouts (seconds) for create_customer_receipt; PDF pages are extracted
+# lazily, so the PDF timeout applies to every stage that reads the document
+PDF_STAGE_TIMEOUT = float(os.getenv("INGEST_PDF_TIMEOUT_SECONDS", "60"))
+LLM_STAGE_TIMEOUT = float(os.getenv("INGEST_LLM_TIMEOUT_SECONDS", "90"))
+
+# Order CSVs at least this large are ingested in streaming mode (see iter_csv_chunks)
+INGEST_STREAMING_THRESHOLD_BYTES = int(os.getenv("INGEST_STREAMING_THRESHOLD_BYTES", str(5 * 1024 * 1024)))
+CSV_CHUNK_ROWS = int(os.getenv("INGEST_CSV_CHUNK_ROWS", "5000"))
+
+# One email can carry several orders; each Order__ (or Customer_PO) becomes its own Order
+ORDER_GROUP_COLUMNS = ("Order__", "Customer_PO")
+ORDER_SPLIT_WORKERS = int(os.getenv("INGEST_ORDER_SPLIT_WORKERS", "4"))
+
+# The only CSV columns ingestion uses
+ORDER_CSV_DTYPES = {
+    "Order__": str,
+    "Customer_PO": str,
+    "Item": str,
+    "Description": str,
+    "Qty_Ord": "float64",
+    "Units_Per_Pallet": "float64",
+    "SpecialInstructions": str,
+}
+
+# PDF acknowledgment patterns, compiled once
+DOMAIN_PATTERN = re.compile(r"\b(?:www\.)?([a-z0-9\-]+\.[a-z]{2,})\b", re.IGNORECASE)
+# "Ack Date" header line, the line after it, then the date on the line below that
+ACK_DATE_PATTERN = re.compile(r"Ack Date[^\n]*\n[^\n]*\n[^\n]*?(\d{2}/\d{2}/\d{2})")
+# Item line ("1 10202638 11/18/24 ...") and the "2400/pallet" quantity that follows it
+ITEM_LINE_PATTERN = re.compile(r"^\d+\s+(\d{8})\s+\d{2}/\d{2}/\d{2}")
+PER_PALLET_PATTERN = re.compile(r"(\d+)\s*(?:cs|EA|RL)?/pallet", re.IGNORECASE)
+
+# Bump these whenever a prompt changes so cached LLM responses are not reused
+SPECIAL_INSTRUCTIONS_PROMPT_VERSION = "special-instructions-v1"
+SHIPMENT_TIMES_PROMPT_VERSION = "shipment-times-v1"
 
 
 def parse_csv(csv_bytes: bytes) -> pd.DataFrame:
@@ -19,38 +63,52 @@ def parse_csv(csv_bytes: bytes) -> pd.DataFrame:
         raise TypeError("Expected CSV data as bytes")
     if not csv_bytes:
         raise ValueError("Empty CSV content provided")
-    return pd.read_csv(BytesIO(csv_bytes), dtype={'Item': str})
+    # Identifiers as text, like iter_csv_chunks: a numeric PO would read as "7007342108.0"
+    return pd.read_csv(BytesIO(csv_bytes), dtype={'Item': str, 'Order__': str, 'Customer_PO': str})
+
+def iter_csv_chunks(csv_bytes: bytes, chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream an order CSV in chunks of `chunksize` rows.
+
+    Only the columns in ORDER_CSV_DTYPES are read (with fixed dtypes), so memory
+    stays flat regardless of how many lines or extra columns the file has.
+    """
+    if not isinstance(csv_bytes, (bytes, bytearray)):
+        raise TypeError("Expected CSV data as bytes")
+    if not csv_bytes:
+        raise ValueError("Empty CSV content provided")
+    yield from pd.read_csv(
+        BytesIO(csv_bytes),
+        usecols=lambda column: column in ORDER_CSV_DTYPES,
+        dtype=ORDER_CSV_DTYPES,
+        chunksize=chunksize,
+    )
 
 def extract_domain_from_pdf(pdf_bytes):
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        first_page_text = pdf.pages[0].extract_text()
-        match = re.search(r"\b(?:www\.)?([a-z0-9\-]+\.[a-z]{2,})\b", first_page_text, re.IGNORECASE)
-        if match:
-            return match.group(1).lower()
+    first_page_text = load_pdf_document(pdf_bytes).first_page
+    match = DOMAIN_PATTERN.search(first_page_text)
+    if match:
+        return match.group(1).lower()
     return "unknown"
 
 def extract_date_ordered_from_pdf(pdf_bytes):
     """
     Extracts the order acknowledgment date from the PDF.
 
+    Pages are scanned in order and the search stops at the first match, so
+    later pages are never extracted when the date is on the first one.
+
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_bytes (bytes | PdfDocument): Raw PDF bytes or an already loaded document.
 
     Returns:
         str: The date in MM/DD/YY format, or 'unknown' if not found.
     """
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-
-            # Look for the line "Ack Date" and capture the date on the next line
-            lines = text.splitlines()
-            for i, line in enumerate(lines):
-                if "Ack Date" in line and i + 2 < len(lines):
-                    next_line = lines[i + 2]
-                    match = re.search(r"(\d{2}/\d{2}/\d{2})", next_line)
-                    if match:
-                        return match.group(0)
+    for text in load_pdf_document(pdf_bytes).iter_pages():
+        # Look for the line "Ack Date" and capture the date two lines below
+        match = ACK_DATE_PATTERN.search(text)
+        if match:
+            return match.group(1)
 
     return "unknown"
 
@@ -63,43 +121,35 @@ def extract_units_per_pallet_from_pdf(pdf_bytes):
     results = []
     current_item_id = None
 
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            lines = page.extract_text().splitlines()
-
-            for line in lines:
-                # Step 1: Detect item line (starts with digit, then 8-digit ID)
-                item_match = re.match(r"^\d+\s+(\d{8})\s+\d{2}/\d{2}/\d{2}", line)
-                if item_match:
-                    current_item_id = item_match.group(1)
-                    continue
-
-                # Step 2: Look for "###/pallet" pattern near current item
-                if current_item_id:
-                    pallet_match = re.search(r"(\d+)\s*(?:cs|EA|RL)?/pallet", line, re.IGNORECASE)
-                    if pallet_match:
-                        units = int(pallet_match.group(1))
-                        results.append({
-                            "item_id": current_item_id,
-                            "units_per_pallet": units
-                        })
-                        current_item_id = None  # Reset after capture
+    for text in load_pdf_document(pdf_bytes).iter_pages():
+        for line in text.splitlines():
+            # Step 1: Detect item line (starts with digit, then 8-digit ID)
+            item_match = ITEM_LINE_PATTERN.match(line)
+            if item_match:
+                current_item_id = item_match.group(1)
+                continue
+
+            # Step 2: Look for "###/pallet" pattern near current item; the
+            # substring check skips the regex on the vast majority of lines
+            if current_item_id and "/pallet" in line.lower():
+                pallet_match = PER_PALLET_PATTERN.search(line)
+                if pallet_match:
+                    results.append({
+                        "item_id": current_item_id,
+                        "units_per_pallet": int(pallet_match.group(1))
+                    })
+                    current_item_id = None  # Reset after capture
 
     return results
 
 def extract_special_instructions(parsed_text: str):
     """
     Uses OpenAI API to extract special handling instructions per item from PDF text.
+    Responses are cached by input text, so resends of the same PDF skip the API call.
     
     Returns:
         list of dicts: Each dict has 'item_id' and 'instruction'.
     """
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found. Set it in your .env file.")
-
     prompt = f"""You are given the raw extracted text from a PDF that contains shipping and handling details.
 
                 Extract all **special handling instructions** related to specific items.
@@ -127,43 +177,37 @@ def extract_special_instructions(parsed_text: str):
                 {parsed_text}
                 """
 
-    client = OpenAI(api_key=api_key)
-
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
+    def parse_response(response_text):
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse OpenAI response: {response_text}") from e
 
-    response_text = response.choices[0].message.content
-    try:
-        return json.loads(response_text)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse OpenAI response: {response_text}") from e
+    return cached_completion(SPECIAL_INSTRUCTIONS_PROMPT_VERSION, prompt, parsed_text, parse=parse_response)
 
 def parse_pdf_for_special_instructions(pdf_bytes):
     """
     Extracts special handling instructions from the first page of a PDF.
 
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_bytes (bytes | PdfDocument): Raw PDF bytes or an already loaded document.
 
     Returns:
         list of dicts: Each dict has 'item_id' and 'instruction'.
     """
-    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
-        first_page_text = pdf.pages[0].extract_text()
-    return extract_special_instructions(first_page_text)
+    return extract_special_instructions(load_pdf_document(pdf_bytes).first_page)
 
 def parse_pdf(pdf_bytes):
-  domain = extract_domain_from_pdf(pdf_bytes)
-  date_ordered = extract_date_ordered_from_pdf(pdf_bytes)
-  units_per_pallet = extract_units_per_pallet_from_pdf(pdf_bytes)
-  special_instructions = parse_pdf_for_special_instructions(pdf_bytes)
+  # Open the PDF once; every extractor reads the same page text
+  document = load_pdf_document(pdf_bytes)
+  domain = extract_domain_from_pdf(document)
+  date_ordered = extract_date_ordered_from_pdf(document)
+  units_per_pallet = extract_units_per_pallet_from_pdf(document)
+  special_instructions = parse_pdf_for_special_instructions(document)
 
   return domain, date_ordered, units_per_pallet, special_instructions
 
-def finalize_df(df, special_instructions, units_per_pallet) -> pd.DataFrame:
+def finalize_df(df, special_instructions, units_per_pallet, report_missing: bool = True) -> pd.DataFrame:
     """
     Add relevant information to the DataFrame.
 
@@ -171,31 +215,26 @@ def finalize_df(df, special_instructions, units_per_pallet) -> pd.DataFrame:
         df (DataFrame): DataFrame containing order details.
         special_instructions (list): List of special instructions.
         units_per_pallet (list): List of units per pallet.
+        report_missing (bool): Print entries whose item is not in the DataFrame.
     Returns:
         DataFrame: Updated DataFrame.
     """
-    for instr in special_instructions:
-        item_id = instr["item_id"]
-        instruction = instr["instruction"]
-
-        # Now both sides are strings
-        if item_id in df['Item'].values:
-            print(f"Item {item_id} found in DataFrame.")
-            df.loc[df['Item'] == item_id, 'Special_Instructions'] = instruction
-        else:
-            print(f"Item {item_id} NOT found in DataFrame.")
+    # Compare on one string-typed key column and map each lookup table over it,
+    # instead of scanning the whole frame once per instruction / pallet entry.
+    items = df['Item'].astype(str)
 
-    # Add units per pallet
-    for entry in units_per_pallet:
-        item_id = entry["item_id"]
-        units = entry["units_per_pallet"]
+    # Later entries for the same item win, as with row-by-row assignment
+    instructions = {instr["item_id"]: instr["instruction"] for instr in special_instructions}
+    units = {entry["item_id"]: entry["units_per_pallet"] for entry in units_per_pallet}
 
-        if item_id in df['Item'].astype(str).values:
-            print(f"Item {item_id} found in DataFrame for units per pallet.")
-            df.loc[df['Item'].astype(str) == item_id, 'Units_Per_Pallet'] = units
-        else:
-            print(f"Item {item_id} NOT found in DataFrame for units per pallet.")
+    for column, lookup in (('Special_Instructions', instructions), ('Units_Per_Pallet', units)):
+        mask = items.isin(list(lookup))
+        if mask.any():
+            df.loc[mask, column] = items[mask].map(lookup)
 
+        missing = set(lookup) - set(items[mask]) if report_missing else set()
+        if missing:
+            print(f"{len(missing)} item(s) for {column} NOT found in DataFrame: {sorted(map(str, missing))}")
 
     return df
 
@@ -203,20 +242,21 @@ def get_upcoming_shipments(email_body: str) -> List[str]:
     """
     Extract upcoming shipment times from the email body.
 
+    Common formats ("7am", "7:30 pm", "7-9am") are read with regexes; the LLM is
+    only called when the rule-based extractor is not confident.
+
     Args:
         email_body (str): Body of the email.
 
     Returns:
         list: List of upcoming shipment times.
     """
-    # Split the email body into lines
-    load_dotenv()
-
-    api_key = os.getenv("OPENAI_API_KEY")
-
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found. Make sure it's set in the .env file.")
+    times, confident = extract_shipment_times(email_body)
+    if confident:
+        record_shipment_time_path("regex")
+        return times
 
+    record_shipment_time_path("llm")
     prompt = """
     You are given the text of an email body.
 
@@ -242,103 +282,122 @@ def get_upcoming_shipments(email_body: str) -> List[str]:
     Here is the email body text:
     """ + email_body
 
-    client = OpenAI(api_key=api_key)
-
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0
-    )
-
-    upcoming_shipments = json.loads(response.choices[0].message.content)
+    upcoming_shipments = cached_completion(SHIPMENT_TIMES_PROMPT_VERSION, prompt, email_body, parse=json.loads)
 
     return upcoming_shipments
 
 def add_new_items_from_df(df) -> list:
     """
     Inserts new items into the database from a DataFrame.
+
+    Existing item numbers are fetched with a single `$in` query and the missing
+    items are written in one unordered bulk upsert. Upserting on the unique
+    item_number index means concurrent ingests of the same new item cannot
+    create duplicates.
+
+    Dimensions are read from the item description when it contains them and
+    marked as "inferred"; the SKU master sheet fills in whatever the order is
+    missing (description, dimensions, units per pallet). Items without readable
+    dimensions are saved as 0x0x0 and still need a manual update.
+
+    Returns:
+        list: ids of the items that were inserted.
     """
-    added_item_ids = []
+    rows = df.dropna(subset=["Item"]).drop_duplicates(subset="Item")
+    item_numbers = rows["Item"].tolist()
+    if not item_numbers:
+        return []
+
+    existing = set(Item.objects(item_number__in=item_numbers).scalar("item_number")) # type: ignore
 
-    for _, row in df.iterrows():
+    operations = []
+    for row in rows.to_dict("records"):
         item_number = row["Item"]
 
         # Skip if item already exists
-        if Item.objects(item_number=item_number).first(): # type: ignore
+        if item_number in existing:
             continue
 
-        # Create and save new item
+        master = master_index.get(item_number)
+
+        description = row.get("Description")
+        description = description if isinstance(description, str) else None
+        dims = infer_dimensions(item_number, description) if description else None
+        if master:
+            description = description or master.description
+            dims = dims or master.dimensions
+        length, width, height = dims or (0.0, 0.0, 0.0)
+
+        units_per_pallet = row.get("Units_Per_Pallet")
+        if (units_per_pallet is None or pd.isna(units_per_pallet)) and master:
+            units_per_pallet = master.units_per_pallet
+
         item = Item(
             item_number=item_number,
-            height=0.0,
-            width=0.0,
-            length=0.0,
+            height=height,
+            width=width,
+            length=length,
             special_instructions=row.get("SpecialInstructions", ""),
-            units_per_pallet=row.get("Units_Per_Pallet")
+            description=description,
+            units_per_pallet=units_per_pallet,
+            dimensions_confidence="inferred" if dims else None
         )
-        item.save()
-
-def create_customer_receipt(email_data: dict):
-    """
-        Create a customer order receipt from email data.
+        item.validate()
+        operations.append(UpdateOne(
+            {"item_number": item_number},
+            {"$setOnInsert": item.to_mongo().to_dict()},
+            upsert=True
+        ))
 
-        Args:
-            email_data (dict): Dictionary containing email data with keys:
-                - csv_file_path: Path to the CSV file.
-                - pdf_file_path: Path to the PDF file.
-                - email_body: Body of the email.
-
-        Returns:
-            CustomerOrderReceipt: An object containing complete customer order details.
-        """
+    if not operations:
+        return []
 
-    # Step 1: Parse CSV and PDF
-    df = parse_csv(email_data["csv_file"])
-    domain, date_ordered, units_per_pallet, special_instructions = parse_pdf(email_data["pdf_file"])
-
-    # Step 2: Combine instructions into DataFrame
-    final_df = finalize_df(df, special_instructions, units_per_pallet)
-
-    # Step 3: Insert new Item objects into DB
-    add_new_items_from_df(final_df)
+    try:
+        result = Item._get_collection().bulk_write(operations, ordered=False)
+        upserted = result.upserted_ids.values()
+    except BulkWriteError as e:
+        # Another ingest inserted some of these items first; that's fine
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        upserted = [u["_id"] for u in e.details.get("upserted", [])]
 
-    # Step 4: Extract upcoming shipment times
-    shipment_times = get_upcoming_shipments(email_data["email_body"])
+    return [str(item_id) for item_id in upserted]
 
-    # Step 5: Lookup or create Customer
-    # Find account that is linked to the company code
-    account = Account.objects(company_code=email_data["subject"]).first() # type: ignore
+def create_order_batches(final_df) -> List[OrderBatch]:
+    """
+    Convert DataFrame rows to saved OrderBatch documents.
 
-    customer = Customer.objects(account=account, email_domain=domain).first() # type: ignore
-    if not customer:
-        customer = Customer(account=account, email_domain=domain)
-        customer.save()
+    Every item reference is resolved from one prefetched item_number -> id map
+    and all batches are written with a single insert_many, so the number of DB
+    round-trips does not depend on the number of order lines.
+    """
+    item_numbers = final_df["Item"].dropna().unique().tolist()
+    item_ids = dict(Item.objects(item_number__in=item_numbers).scalar("item_number", "id")) # type: ignore
 
-    # Step 6: Convert DataFrame rows to OrderBatch
     order_items = []
-    for _, row in final_df.iterrows():
-        
+    for row in final_df.to_dict("records"):
+        item_id = item_ids.get(row["Item"])
+        if not item_id:
+            continue  # Skip if item not found
+
         # Get quantity and units_per_pallet from the row
         order_quantity = int(row.get("Qty_Ord", 0))
         units_per_pallet = int(row.get("Units_Per_Pallet", 1))
 
-        item = Item.objects(item_number=row["Item"]).first() # type: ignore
-        if not item:
-            continue  # Skip if item not found
-
         # Create OrderItem and calculate pallets
-        order_item = OrderBatch(item_id=item.id, number_pallets=0)
+        order_item = OrderBatch(item_id=item_id, number_pallets=0)
         order_item.set_pallets(order_quantity, units_per_pallet)
-        order_item.save()
-
         order_items.append(order_item)
 
+    if order_items:
+        OrderBatch.objects.insert(order_items, load_bulk=False) # type: ignore
+    return order_items
 
-    # Step 7: Create and save the Order
+def save_order(customer, order_items, date_ordered, shipment_times, order_number=None, customer_po=None) -> Order:
     order = Order(
         customer=customer,
+        order_number=order_number,
+        customer_po=customer_po,
         order_item_ids=order_items,
         order_date=pd.to_datetime(date_ordered),
         shipment_times=shipment_times,
@@ -346,10 +405,181 @@ def create_customer_receipt(email_data: dict):
         loading_instructions=None
     )
     order.save()
+    return order
+
+def create_order_from_df(final_df, customer, date_ordered, shipment_times, **identity) -> Order:
+    """
+    Create the OrderBatch documents for a finalized DataFrame and the Order linking them.
+    """
+    return save_order(customer, create_order_batches(final_df), date_ordered, shipment_times, **identity)
+
+def split_orders(df) -> List[Tuple[str, dict, pd.DataFrame]]:
+    """
+    Split an order DataFrame into one group per order number.
+
+    Groups on Order__, falling back to Customer_PO, keeping first-seen order.
+    Returns (key, identity, rows) tuples where identity holds the
+    order_number / customer_po to store on the Order. A CSV with neither
+    column is a single group.
+    """
+    column = next((c for c in ORDER_GROUP_COLUMNS if c in df.columns), None)
+    if column is None:
+        return [("", {}, df)]
+
+    groups = []
+    for key, rows in df.groupby(df[column].fillna(""), sort=False):
+        identity = {}
+        for field, source in (("order_number", "Order__"), ("customer_po", "Customer_PO")):
+            if source in rows.columns and rows[source].notna().any():
+                identity[field] = str(rows[source].dropna().iloc[0])
+        groups.append((key, identity, rows))
+    return groups
+
+def create_orders_from_df(final_df, customer, date_ordered, shipment_times) -> List[Order]:
+    """
+    Create one Order per order number in the DataFrame, in parallel, so each
+    order gets its own batches, plan and status.
+    """
+    groups = split_orders(final_df)
+
+    def create(group):
+        _, identity, rows = group
+        return create_order_from_df(rows, customer, date_ordered, shipment_times, **identity)
+
+    if len(groups) == 1:
+        return [create(groups[0])]
+
+    with ThreadPoolExecutor(max_workers=min(ORDER_SPLIT_WORKERS, len(groups))) as pool:
+        return list(pool.map(create, groups))
+
+def stream_order_from_csv(
+    csv_bytes,
+    special_instructions,
+    units_per_pallet,
+    customer,
+    date_ordered,
+    shipment_times,
+    chunksize: int = CSV_CHUNK_ROWS,
+) -> List[Order]:
+    """
+    Streaming counterpart of parse_csv + finalize_df + add_new_items_from_df +
+    create_orders_from_df for very large consolidated orders.
+
+    Each chunk of the CSV is finalized and its items and batches are written
+    before the next chunk is parsed, so memory stays flat and the first items
+    land in the DB before the file is fully read. Only the batch ids (per order
+    number) are kept until the Orders are saved at the end.
+    """
+    orders = {}  # group key -> (identity, batch ids), in first-seen order
+    lines = 0
+    for chunk in iter_csv_chunks(csv_bytes, chunksize):
+        # Instructions and pallet counts cover the whole order, so most miss any given chunk
+        chunk = finalize_df(chunk, special_instructions, units_per_pallet, report_missing=False)
+        add_new_items_from_df(chunk)
+        for key, identity, rows in split_orders(chunk):
+            _, batch_ids = orders.setdefault(key, (identity, []))
+            batch_ids.extend(batch.pk for batch in create_order_batches(rows))
+        lines += len(chunk)
+        print(f"Streamed {lines} lines into {len(orders)} order(s)")
+
+    return [
+        save_order(customer, batch_ids, date_ordered, shipment_times, **identity)
+        for identity, batch_ids in orders.values()
+    ]
+
+def find_or_create_customer(account, domain) -> Customer:
+    """
+    The account's customer for `domain`, created if it does not exist yet.
+
+    A single upsert backed by the unique (account, email_domain) index, so two
+    emails from a new domain processed at the same time share one Customer.
+    """
+    if account is None:
+        raise ValueError("No account matches the email's company code")
+
+    customers = Customer.objects(account=account, email_domain=domain) # type: ignore
+    try:
+        return customers.modify(upsert=True, new=True, set_on_insert__date_created=datetime.datetime.utcnow())
+    except NotUniqueError:
+        # Lost the race to a concurrent upsert of the same domain
+        return customers.get()
+
+def create_customer_receipt(email_data: dict):
+    """
+        Create a customer order receipt from email data.
+
+        Independent stages (CSV parsing, each PDF pass and both OpenAI calls) run
+        concurrently; see build_receipt_stages for the dependency graph.
+
+        Args:
+            email_data (dict): Dictionary containing email data with keys:
+                - csv_file: Raw bytes of the CSV attachment.
+                - pdf_file: Raw bytes of the PDF attachment.
+                - subject: Company code of the receiving account.
+                - email_body: Body of the email.
+
+        Returns:
+            dict: customer_email_domain, order_ids of every Order created (one per
+            order number in the CSV) and order_id of the first one.
+        """
+    run = run_stages(build_receipt_stages(email_data))
+    print("Receipt stage timings:", {name: round(t, 3) for name, t in run.durations.items()})
+
+    customer = run.results["customer"]
+    order_ids = [str(order.pk) for order in run.results["orders"]]
 
     return {
         "customer_email_domain": customer.email_domain,
-        "order_id": str(order.pk),
+        "order_id": order_ids[0] if order_ids else None,
+        "order_ids": order_ids,
     }
-  
 
+def build_receipt_stages(email_data: dict, streaming: Optional[bool] = None) -> List[Stage]:
+    """
+    Stage graph for create_customer_receipt. Large CSVs (or `streaming=True`)
+    are ingested chunk by chunk via stream_order_from_csv.
+    """
+    pdf_bytes = email_data["pdf_file"]
+
+    def find_account():
+        # Find account that is linked to the company code
+        return Account.objects(company_code=email_data["subject"]).first() # type: ignore
+
+    def create_orders(final_df, _new_items, customer, date_ordered, shipment_times):
+        return create_orders_from_df(final_df, customer, date_ordered, shipment_times)
+
+    def stream_orders(special_instructions, units_per_pallet, customer, date_ordered, shipment_times):
+        return stream_order_from_csv(
+            email_data["csv_file"], special_instructions, units_per_pallet, customer, date_ordered, shipment_times
+        )
+
+    stages = [
+        # Parse PDF
+        Stage("pdf", lambda: load_pdf_document(pdf_bytes)),
+        Stage("domain", extract_domain_from_pdf, ("pdf",), timeout=PDF_STAGE_TIMEOUT),
+        Stage("date_ordered", extract_date_ordered_from_pdf, ("pdf",), timeout=PDF_STAGE_TIMEOUT),
+        Stage("units_per_pallet", extract_units_per_pallet_from_pdf, ("pdf",), timeout=PDF_STAGE_TIMEOUT),
+        # Reads the first page, which may still need extracting, then calls the LLM
+        Stage("special_instructions", parse_pdf_for_special_instructions, ("pdf",),
+              timeout=PDF_STAGE_TIMEOUT + LLM_STAGE_TIMEOUT),
+        # Extract upcoming shipment times
+        Stage("shipment_times", lambda: get_upcoming_shipments(email_data["email_body"]), timeout=LLM_STAGE_TIMEOUT),
+        Stage("account", find_account),
+        Stage("customer", find_or_create_customer, ("account", "domain")),
+    ]
+
+    if streaming is None:
+        streaming = len(email_data["csv_file"] or b"") >= INGEST_STREAMING_THRESHOLD_BYTES
+
+    if streaming:
+        return stages + [
+            Stage("orders", stream_orders, ("special_instructions", "units_per_pallet", "customer", "date_ordered", "shipment_times")),
+        ]
+
+    return stages + [
+        # Parse CSV, combine instructions into DataFrame and insert new Item objects into DB
+        Stage("df", lambda: parse_csv(email_data["csv_file"])),
+        Stage("final_df", finalize_df, ("df", "special_instructions", "units_per_pallet")),
+        Stage("new_items", add_new_items_from_df, ("final_df",)),
+        Stage("orders", create_orders, ("final_df", "new_items", "customer", "date_ordered", "shipment_times")),
+    ]
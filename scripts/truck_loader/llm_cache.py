@@ -0,0 +1,166 @@
+import datetime
+import hashlib
+import os
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable, List, Optional
+from dotenv import load_dotenv
+from openai import OpenAI
+from models.types import LLMCacheEntry
+
+LLM_MODEL = "gpt-3.5-turbo"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+
+# ===== Clients =====
+class StubLLMClient:
+    """
+    Offline stand-in for the OpenAI client.
+
+    Exposes the same `client.chat.completions.create(...)` shape and answers with
+    `responder(prompt)`. Every prompt it receives is recorded in `calls`.
+    """
+
+    def __init__(self, responder: Callable[[str], str]):
+        self.responder = responder
+        self.calls: List[str] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: list, **kwargs):
+        prompt = messages[-1]["content"]
+        self.calls.append(prompt)
+        content = self.responder(prompt)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def set_llm_client(client):
+    """Swap the client used for completions (e.g. a StubLLMClient in tests). Pass None to reset."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_llm_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            load_dotenv()
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found. Set it in your .env file.")
+            _client = OpenAI(api_key=api_key)
+        return _client
+
+
+# ===== Cache =====
+def cache_key(template_version: str, model: str, input_text: str) -> str:
+    input_sha256 = hashlib.sha256(input_text.encode("utf-8")).hexdigest()
+    return f"{template_version}:{model}:{input_sha256}"
+
+
+class LLMCache:
+    """
+    Persistent cache of completions, keyed by (prompt template version, model,
+    SHA-256 of the input text).
+
+    Entries live in the `llm_cache` collection. Mongo expires them through a TTL
+    index on `created_at` (LLM_CACHE_TTL_SECONDS) and the least recently used
+    entries are evicted once the collection grows past `max_entries`. Cache
+    errors are logged and treated as misses so they never fail an ingest.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "errors": 0, "evictions": 0}
+
+    def _bump(self, stat: str, n: int = 1):
+        with self._lock:
+            self.stats[stat] += n
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            entry = LLMCacheEntry.objects(key=key).modify(  # type: ignore
+                new=True,
+                set__last_used_at=datetime.datetime.utcnow(),
+                inc__hits=1,
+            )
+        except Exception as e:
+            print(f"LLM cache lookup failed: {e}")
+            self._bump("errors")
+            entry = None
+
+        self._bump("hits" if entry else "misses")
+        return entry.response if entry else None
+
+    def put(self, key: str, template_version: str, model: str, input_text: str, response: str):
+        try:
+            LLMCacheEntry.objects(key=key).update_one(  # type: ignore
+                upsert=True,
+                set__template_version=template_version,
+                set__model=model,
+                set__input_sha256=hashlib.sha256(input_text.encode("utf-8")).hexdigest(),
+                set__response=response,
+                set__created_at=datetime.datetime.utcnow(),
+                set__last_used_at=datetime.datetime.utcnow(),
+            )
+            self._evict()
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+            self._bump("errors")
+
+    def _evict(self):
+        overflow = LLMCacheEntry.objects.count() - self.max_entries  # type: ignore
+        if overflow <= 0:
+            return
+        stale_ids = list(LLMCacheEntry.objects.order_by("last_used_at").limit(overflow).scalar("id"))  # type: ignore
+        LLMCacheEntry.objects(id__in=stale_ids).delete()  # type: ignore
+        self._bump("evictions", len(stale_ids))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+llm_cache = LLMCache()
+
+
+def cached_completion(
+    template_version: str,
+    prompt: str,
+    input_text: str,
+    parse: Callable[[str], Any] = lambda text: text,
+    model: str = LLM_MODEL,
+) -> Any:
+    """
+    Run `prompt` through the LLM at temperature 0, reusing a cached response when
+    the same input has already been seen under this template version and model.
+
+    `parse` is applied to the raw response; responses that fail to parse are not
+    cached, so a bad answer is retried on the next call.
+    """
+    key = cache_key(template_version, model, input_text)
+    if LLM_CACHE_ENABLED:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return parse(cached)
+
+    response = get_llm_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0
+    )
+    response_text = response.choices[0].message.content
+    result = parse(response_text)
+
+    if LLM_CACHE_ENABLED:
+        llm_cache.put(key, template_version, model, input_text, response_text)
+    return result
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import pickle
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import pandas as pd
+from scripts.truck_loader.dimensions import parse_dimensions
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+MASTER_SHEET_PATH = os.getenv("MASTER_SHEET_PATH", os.path.join(DATA_DIR, "ShorrMasterSheet.xlsx"))
+MASTER_SHEET_NAME = "Master"
+MASTER_CACHE_DIR = os.getenv("MASTER_CACHE_DIR", os.path.join(DATA_DIR, ".cache"))
+
+# Bump whenever MasterItem or the parsing below changes so stale artifacts are rebuilt
+MASTER_ARTIFACT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class MasterItem:
+    item_number: str
+    description: Optional[str]
+    units_per_pallet: Optional[int]
+    overhang: Optional[str]
+    overhang_both_sides: Optional[str]
+    dimensions: Optional[Tuple[float, float, float]]
+
+
+def _text(value) -> Optional[str]:
+    if pd.isna(value):
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_master_sheet(path: str) -> Dict[str, MasterItem]:
+    """
+    Read the Master sheet of the SKU spreadsheet into item_number -> MasterItem.
+
+    Dimensions come from the description (see parse_dimensions); rows without an
+    item number are skipped and later rows win over earlier duplicates.
+    """
+    df = pd.read_excel(path, sheet_name=MASTER_SHEET_NAME, dtype=str)
+    df.columns = [" ".join(str(c).split()) for c in df.columns]
+    units = pd.to_numeric(df.get("Per Pallet"), errors="coerce")
+
+    items = {}
+    for row, per_pallet in zip(df.to_dict("records"), units):
+        item_number = _text(row.get("Item"))
+        if not item_number:
+            continue
+        description = _text(row.get("Description"))
+        items[item_number] = MasterItem(
+            item_number=item_number,
+            description=description,
+            units_per_pallet=int(per_pallet) if pd.notna(per_pallet) and per_pallet > 0 else None,
+            overhang=_text(row.get("Oversize/Overhang")),
+            overhang_both_sides=_text(row.get("Overhang Both Sides")),
+            dimensions=parse_dimensions(description) if description else None,
+        )
+    return items
+
+
+class MasterIndex:
+    """
+    In-memory item_number -> MasterItem index over the SKU master spreadsheet.
+
+    The spreadsheet is parsed once per content hash and the result is pickled to
+    MASTER_CACHE_DIR, so restarts load the compact artifact instead of the xlsx.
+    Lookups stat the file and only rehash / reload when its size or mtime changes.
+    A missing or unreadable spreadsheet yields an empty index.
+    """
+
+    def __init__(self, path: str = MASTER_SHEET_PATH, cache_dir: str = MASTER_CACHE_DIR):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.digest = None
+        self._items: Dict[str, MasterItem] = {}
+        self._stat = None
+        self._lock = threading.Lock()
+
+    def _artifact_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"master-v{MASTER_ARTIFACT_VERSION}-{digest}.pkl")
+
+    def _load(self, digest: str) -> Dict[str, MasterItem]:
+        artifact = self._artifact_path(digest)
+        try:
+            with open(artifact, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+
+        items = parse_master_sheet(self.path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{artifact}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, artifact)
+        except OSError as e:
+            print(f"Could not write master data artifact {artifact}: {e}")
+        return items
+
+    def refresh(self) -> Dict[str, MasterItem]:
+        """Reload the index if the spreadsheet changed since the last lookup."""
+        try:
+            st = os.stat(self.path)
+            stat = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stat = None
+
+        with self._lock:
+            if stat == self._stat:
+                return self._items
+
+            items, digest = {}, None
+            if stat is not None:
+                try:
+                    with open(self.path, "rb") as f:
+                        digest = hashlib.sha256(f.read()).hexdigest()
+                    items = self._items if digest == self.digest else self._load(digest)
+                except Exception as e:
+                    print(f"Failed to load master data from {self.path}: {e}")
+                    items, digest = {}, None
+
+            self._items, self.digest, self._stat = items, digest, stat
+            return self._items
+
+    def get(self, item_number: str) -> Optional[MasterItem]:
+        return self.refresh().get(str(item_number))
+
+    def __len__(self) -> int:
+        return len(self.refresh())
+
+
+master_index = MasterIndex()
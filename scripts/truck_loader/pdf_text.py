@@ -0,0 +1,254 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeout, wait
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple, Union
+import pdfplumber
+
+PDF_CACHE_SIZE = int(os.getenv("PDF_CACHE_SIZE", "32"))
+
+# pdfplumber is CPU-bound pure Python, so extraction runs in worker processes
+# to keep it from holding the API process's GIL. Set PDF_PROCESS_POOL=0 to
+# extract in-process instead.
+PDF_PROCESS_POOL = os.getenv("PDF_PROCESS_POOL", "1") != "0"
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "200"))
+PDF_EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT_SECONDS", "30"))
+
+
+# ===== Worker pool =====
+def _extract_pages(pdf_bytes: bytes, start: int, stop: int) -> Tuple[List[str], int]:
+    """Text of pages [start, stop) and the total page count. Runs in a worker process."""
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        texts = []
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or "")
+            page.close()
+        return texts, len(pdf.pages)
+
+
+def _ready() -> bool:
+    return True
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Futures not yet finished, per pool, so a pool being recycled can let them finish first
+_in_flight = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the API process is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _submit(pool: ProcessPoolExecutor, fn, *args) -> Future:
+    """Submit `fn` to `pool`, tracking it until done along with the time its caller stops waiting."""
+    future = pool.submit(fn, *args)
+    future.deadline = time.monotonic() + PDF_EXTRACT_TIMEOUT
+    with _pool_lock:
+        _in_flight.setdefault(pool, set()).add(future)
+
+    def forget(done):
+        with _pool_lock:
+            _in_flight.get(pool, set()).discard(done)
+
+    future.add_done_callback(forget)
+    return future
+
+
+def _retire_pool(pool: ProcessPoolExecutor, stuck: Future):
+    """
+    Stop handing work to `pool` because `stuck` ran past its timeout, and kill
+    its workers once the other extractions already running on it have finished
+    or timed out themselves. Killing them straight away would fail those with
+    BrokenProcessPool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            # Already retired or discarded
+            return
+        _pool = None
+        others = [future for future in _in_flight.get(pool, ()) if future is not stuck]
+
+    def discard_when_drained():
+        if others:
+            wait(others, timeout=max(0.0, max(future.deadline for future in others) - time.monotonic()))
+        _discard_pool(pool)
+
+    threading.Thread(target=discard_when_drained, name="pdf-pool-retire", daemon=True).start()
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Drop `pool` and kill its workers now, e.g. when it is shut down or already broken."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+        _in_flight.pop(pool, None)
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def warm_pdf_pool():
+    """Start the PDF worker processes now rather than on the first email."""
+    if not PDF_PROCESS_POOL:
+        return
+    pool = _get_pool()
+    for future in [_submit(pool, _ready) for _ in range(PDF_WORKERS)]:
+        future.result(timeout=PDF_EXTRACT_TIMEOUT)
+
+
+def shutdown_pdf_pool():
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        _discard_pool(pool)
+
+
+def extract_page_text(pdf_bytes: bytes, start: int = 0, stop: int = PDF_MAX_PAGES) -> Tuple[List[str], int]:
+    """
+    Extract the text of pages [start, stop) of a PDF.
+
+    Only the PDF bytes go to the worker and only the page text comes back. A job
+    that runs past PDF_EXTRACT_TIMEOUT raises TimeoutError and its worker pool is
+    replaced so a stuck parse cannot hold a worker forever; the old pool's
+    workers are killed once its other in-flight extractions are done.
+
+    Returns:
+        tuple: (page texts, total page count of the PDF)
+    """
+    if not PDF_PROCESS_POOL:
+        return _extract_pages(pdf_bytes, start, stop)
+
+    pool = _get_pool()
+    try:
+        future = _submit(pool, _extract_pages, pdf_bytes, start, stop)
+        return future.result(timeout=PDF_EXTRACT_TIMEOUT)
+    except FuturesTimeout:
+        _retire_pool(pool, future)
+        raise TimeoutError(f"PDF extraction timed out after {PDF_EXTRACT_TIMEOUT}s")
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+# ===== Documents =====
+
+class PdfDocument:
+    """
+    Text of the pages of a PDF, extracted at most once.
+
+    The ingestion extractors (domain, ack date, units per pallet, special
+    instructions) all read from the same PdfDocument instead of reopening the
+    PDF bytes with pdfplumber each time. Documents built from bytes extract
+    pages lazily, in order, as they are iterated: the first page on its own,
+    then the rest (up to PDF_MAX_PAGES) in one worker round trip. A reader that
+    only needs the first page (or stops at its first match) never pays for the
+    rest.
+    """
+
+    def __init__(self, pages: List[str], digest: str = "", source: Optional[bytes] = None):
+        self._pages = list(pages)
+        self.digest = digest
+        self._source = source
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_bytes(cls, pdf_bytes: bytes, digest: str = "") -> "PdfDocument":
+        return cls([], digest, source=pdf_bytes)
+
+    def _extract_more(self) -> bool:
+        # Caller holds self._lock
+        if self._source is None:
+            return False
+
+        start = len(self._pages)
+        texts, page_count = extract_page_text(self._source, start, 1 if start == 0 else PDF_MAX_PAGES)
+        self._pages.extend(texts)
+
+        if not texts or len(self._pages) >= min(page_count, PDF_MAX_PAGES):
+            if page_count > PDF_MAX_PAGES:
+                print(f"PDF has {page_count} pages; only the first {PDF_MAX_PAGES} were read")
+            self._source = None
+        return bool(texts)
+
+    def iter_pages(self) -> Iterator[str]:
+        """Yield page text in order, extracting each page on first access."""
+        index = 0
+        while True:
+            with self._lock:
+                if index >= len(self._pages) and not self._extract_more():
+                    return
+                text = self._pages[index]
+            yield text
+            index += 1
+
+    @property
+    def pages(self) -> List[str]:
+        for _ in self.iter_pages():
+            pass
+        return self._pages
+
+    @property
+    def first_page(self) -> str:
+        return next(self.iter_pages(), "")
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_inflight = {}
+
+
+def load_pdf_document(pdf: Union[bytes, PdfDocument]) -> PdfDocument:
+    """
+    Return the PdfDocument for `pdf`, memoized by the SHA-256 of its bytes.
+
+    Concurrent callers with the same bytes share one document (and so one
+    extraction of each page) rather than each parsing the PDF. Already-loaded
+    documents are passed through.
+    """
+    if isinstance(pdf, PdfDocument):
+        return pdf
+
+    digest = hashlib.sha256(pdf).hexdigest()
+
+    with _cache_lock:
+        if digest in _cache:
+            _cache.move_to_end(digest)
+            return _cache[digest]
+        key_lock = _inflight.setdefault(digest, threading.Lock())
+
+    with key_lock:
+        with _cache_lock:
+            if digest in _cache:
+                return _cache[digest]
+
+        try:
+            doc = PdfDocument.from_bytes(pdf, digest)
+            with _cache_lock:
+                _cache[digest] = doc
+                while len(_cache) > PDF_CACHE_SIZE:
+                    _cache.popitem(last=False)
+        finally:
+            with _cache_lock:
+                _inflight.pop(digest, None)
+
+    return doc
+
+
+def clear_pdf_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -1,23 +1,35 @@
 from typing import List
 from bson import ObjectId
 from models.types import Order
+from scripts.truck_loader.master_data import master_index
+
+def _has_dimensions(item) -> bool:
+    return all([item.height > 0, item.width > 0, item.length > 0])
 
 def find_items_without_dimensions_from_order(order_id) -> List[str]:
     """
     Returns a list of item_numbers that are a part of the Order but
     do not have completed dimensions.
+
+    Items whose dimensions are known from the SKU master sheet are filled
+    in (as "inferred") instead of being reported as missing.
     """
     order = Order.objects(id=ObjectId(order_id)).first()
 
     if not order:
         raise ValueError(f"No order found with id {order_id}")
-    
+
     missing_items = []
 
     for order_batch in order.order_item_ids:
         item = order_batch.item_id
-        if not item or not all([item.height > 0, item.width > 0, item.length > 0]):
+        if item and not _has_dimensions(item):
+            master = master_index.get(item.item_number)
+            if master and master.dimensions:
+                item.length, item.width, item.height = master.dimensions
+                item.dimensions_confidence = "inferred"
+                item.save()
+        if not item or not _has_dimensions(item):
             missing_items.append(item.item_number if item else "Unknown Item")
 
     return missing_items
-
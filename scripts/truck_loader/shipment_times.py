@@ -0,0 +1,100 @@
+import re
+import threading
+from typing import List, Tuple
+
+# A clock time with an explicit meridiem: "7am", "7 AM", "7:30pm", "11 a.m."
+_HOUR = r"(1[0-2]|0?[1-9])"
+_MINUTE = r"(?::([0-5]\d))?"
+_MERIDIEM = r"([ap])\.?\s?m\.?"
+_START = r"(?<![\w:/.\-])"
+_END = r"(?![\w])"
+
+TIME_PATTERN = re.compile(_START + _HOUR + _MINUTE + r"\s*" + _MERIDIEM + _END, re.IGNORECASE)
+
+# A window such as "7-9am", "7am - 9am", "7:30 to 9:00 am"; the start may borrow the end's meridiem
+RANGE_PATTERN = re.compile(
+    _START + _HOUR + _MINUTE + r"\s*(?:" + _MERIDIEM + r")?\s*(?:-|–|to)\s*" + _HOUR + _MINUTE + r"\s*" + _MERIDIEM + _END,
+    re.IGNORECASE,
+)
+
+# Anything that looks like a time we cannot read confidently; the LLM handles these
+AMBIGUOUS_PATTERN = re.compile(
+    r"\b(?:noon|midnight|morning|afternoon|evening|tonight|o'?clock|asap|eod)\b"
+    r"|(?<![\w:/.\-])(?:[01]?\d|2[0-3]):[0-5]\d(?![\w:])"
+    r"|(?:\bat|@)\s*\d{1,2}\b"
+    r"|^\s*\d{1,2}\s*$",
+    re.IGNORECASE,
+)
+
+# A bare hour left beside real times, as in "7, 9, 11am" where only the last carries the meridiem
+BARE_HOUR_PATTERN = re.compile(r"(?<![\w:/.\-])\d{1,2}(?![\w:])")
+
+# Quoted reply headers ("Sent: Monday, November 18, 2024 10:11 AM") are never loading times
+QUOTED_HEADER_PATTERN = re.compile(r"^\s*(?:>|(?:sent|date)\s*:|on .+ wrote:\s*$)", re.IGNORECASE)
+
+
+def _format_time(hour: str, minute: str, meridiem: str) -> str:
+    return f"{int(hour)}{':' + minute if minute else ''}{meridiem.lower()}m"
+
+
+def extract_shipment_times(text: str) -> Tuple[List[str], bool]:
+    """
+    Pull loading times out of an email body without calling the LLM.
+
+    Times are returned in the order they appear, normalized to "7am" / "7:30am";
+    duplicates are kept because each one is a separate truck. A window like
+    "7-9am" is returned as a single "7am-9am" entry.
+
+    Returns:
+        tuple: (times, confident). `confident` is False when nothing was found or
+        the text contains time-like phrases the patterns cannot read, in which
+        case the caller should fall back to the LLM.
+    """
+    times = []
+    confident = True
+
+    for line in text.splitlines():
+        if QUOTED_HEADER_PATTERN.match(line):
+            continue
+
+        found = []
+        taken = []
+        for m in RANGE_PATTERN.finditer(line):
+            h1, m1, ap1, h2, m2, ap2 = m.groups()
+            start = _format_time(h1, m1, ap1 or ap2)
+            found.append((m.start(), f"{start}-{_format_time(h2, m2, ap2)}"))
+            taken.append(m.span())
+
+        for m in TIME_PATTERN.finditer(line):
+            if any(start <= m.start() < end for start, end in taken):
+                continue
+            found.append((m.start(), _format_time(*m.groups())))
+            taken.append(m.span())
+
+        remainder = line
+        for start, end in sorted(taken, reverse=True):
+            remainder = remainder[:start] + " " + remainder[end:]
+        if AMBIGUOUS_PATTERN.search(remainder) or (found and BARE_HOUR_PATTERN.search(remainder)):
+            confident = False
+
+        times.extend(t for _, t in sorted(found))
+
+    return times, confident and bool(times)
+
+
+# ===== Path metrics =====
+_path_lock = threading.Lock()
+shipment_time_paths = {"regex": 0, "llm": 0}
+
+
+def record_shipment_time_path(path: str):
+    with _path_lock:
+        shipment_time_paths[path] += 1
+
+
+def shipment_time_path_metrics() -> dict:
+    with _path_lock:
+        counts = dict(shipment_time_paths)
+    total = counts["regex"] + counts["llm"]
+    counts["regex_rate"] = counts["regex"] / total if total else 0.0
+    return counts
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class StageError(Exception):
+    """Raised when a stage fails; the original exception is chained as __cause__."""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(f"Stage '{stage}' {message}")
+        self.stage = stage
+
+
+class StageTimeout(StageError):
+    pass
+
+
+@dataclass
+class Stage:
+    """
+    One step of a pipeline.
+
+    `fn` is called with the results of `depends_on`, in that order, once all of
+    them have finished. `timeout` is measured from the moment the stage starts.
+    """
+    name: str
+    fn: Callable[..., Any]
+    depends_on: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+
+
+@dataclass
+class StageRun:
+    results: Dict[str, Any] = field(default_factory=dict)
+    durations: Dict[str, float] = field(default_factory=dict)
+
+
+def run_stages(stages: List[Stage], max_workers: Optional[int] = None) -> StageRun:
+    """
+    Run a dependency graph of stages on a thread pool.
+
+    Each stage is submitted as soon as its dependencies are done, so independent
+    stages overlap and the wall time is bounded by the slowest dependency chain
+    instead of the sum of all stages.
+
+    If a stage raises or overruns its timeout, every stage that has not started is
+    cancelled and a StageError/StageTimeout is raised. Python threads cannot be
+    interrupted, so a stage that is already running is abandoned rather than killed;
+    its result is discarded.
+    """
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Stage names must be unique")
+    for stage in stages:
+        unknown = [d for d in stage.depends_on if d not in names]
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}")
+
+    run = StageRun()
+    pending = {s.name: s for s in stages}
+    running = {}  # future -> (stage, started_at)
+    pool = ThreadPoolExecutor(max_workers=max_workers or len(stages))
+
+    try:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(d in run.results for d in stage.depends_on):
+                    args = [run.results[d] for d in stage.depends_on]
+                    running[pool.submit(stage.fn, *args)] = (stage, time.monotonic())
+                    del pending[name]
+
+            if not running:
+                raise ValueError(f"Dependency cycle between stages {sorted(pending)}")
+
+            deadlines = [
+                started + stage.timeout
+                for stage, started in running.values()
+                if stage.timeout is not None
+            ]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, started = running.pop(future)
+                try:
+                    run.results[stage.name] = future.result()
+                except Exception as e:
+                    raise StageError(stage.name, f"failed: {e}") from e
+                run.durations[stage.name] = time.monotonic() - started
+
+            now = time.monotonic()
+            for stage, started in running.values():
+                if stage.timeout is not None and now - started >= stage.timeout:
+                    raise StageTimeout(stage.name, f"timed out after {stage.timeout}s")
+    finally:
+        for future in running:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return run
@@ -1,5 +1,3 @@
-from threading import Event
+from pipeline.job_queue import JobQueue
 
-pipeline_trigger_event = Event()
-order_id_holder = {"id": None}
-email_data = None
+job_queue = JobQueue()
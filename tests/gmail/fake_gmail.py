@@ -0,0 +1,135 @@
+import base64
+import threading
+import time
+from collections import Counter
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode()
+
+
+class _Request:
+    def __init__(self, fn, kwargs):
+        self.fn = fn
+        self.kwargs = kwargs
+
+    def execute(self):
+        return self.fn(**self.kwargs)
+
+
+class _Resource:
+    # API methods return a request to execute(); sub-resources are returned as is
+    def __init__(self, children=None, **methods):
+        for name, fn in methods.items():
+            setattr(self, name, lambda fn=fn, **kwargs: _Request(fn, kwargs))
+        for name, child in (children or {}).items():
+            setattr(self, name, lambda child=child: child)
+
+
+class FakeGmailService:
+    """
+    In-memory stand-in for the Gmail API client returned by build('gmail', 'v1').
+
+    Supports the calls the listener makes: users().getProfile,
+    users().history().list (paged), users().messages().list/get and
+    users().messages().attachments().get. Every call is counted in `calls`.
+    `errors` maps a message id to the HTTP status messages().get fails with.
+    """
+
+    def __init__(self, history_id=1000, page_size=2, attachment_delay=0.0):
+        self.history_id = history_id
+        self.attachment_delay = attachment_delay
+        self.oldest_history_id = history_id
+        self.page_size = page_size
+        self.history = []
+        self.messages = {}
+        self.errors = {}
+        self.attachments = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    # ----- Mailbox setup -----
+    def add_message(self, msg_id, subject="Order", body="7am", attachments=None, headers=None):
+        """Deliver a message to the inbox; `attachments` maps filename -> (mime_type, bytes)."""
+        parts = [{"mimeType": "text/plain", "filename": "", "body": {"data": b64(body.encode())}}]
+        for index, (filename, (mime_type, data)) in enumerate((attachments or {}).items()):
+            attachment_id = f"{msg_id}-att{index}"
+            self.attachments[(msg_id, attachment_id)] = data
+            parts.append({
+                "mimeType": mime_type,
+                "filename": filename,
+                "body": {"attachmentId": attachment_id, "size": len(data)},
+            })
+
+        all_headers = {"Subject": subject, "From": "orders@shorr.com", "To": "loads@movomint.com",
+                       "Date": "Mon, 18 Nov 2024 10:11:00 -0500", **(headers or {})}
+        self.add_raw_message(msg_id, {
+            "mimeType": "multipart/mixed",
+            "headers": [{"name": k, "value": v} for k, v in all_headers.items()],
+            "parts": parts,
+        })
+
+    def add_raw_message(self, msg_id, payload):
+        with self._lock:
+            self.history_id += 1
+            self.messages[msg_id] = {"id": msg_id, "historyId": str(self.history_id), "payload": payload}
+            self.history.append({
+                "id": str(self.history_id),
+                "messagesAdded": [{"message": {"id": msg_id, "labelIds": ["INBOX"]}}],
+            })
+
+    def expire_history(self):
+        """Drop all history, as Gmail does after about a week."""
+        with self._lock:
+            self.history = []
+            self.oldest_history_id = self.history_id
+
+    # ----- API surface -----
+    def users(self):
+        attachments = _Resource(get=self._attachments_get)
+        messages = _Resource({"attachments": attachments}, list=self._messages_list, get=self._messages_get)
+        history = _Resource(list=self._history_list)
+        return _Resource({"history": history, "messages": messages}, getProfile=self._get_profile)
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def _get_profile(self, userId):
+        self._count("getProfile")
+        return {"emailAddress": "loads@movomint.com", "historyId": str(self.history_id)}
+
+    def _history_list(self, userId, startHistoryId, historyTypes=None, labelId=None, pageToken=None):
+        self._count("history.list")
+        start = int(startHistoryId)
+        if start < self.oldest_history_id:
+            raise HttpError(httplib2.Response({"status": 404}), b"Requested entity was not found.")
+
+        records = [r for r in self.history if int(r["id"]) > start]
+        offset = int(pageToken or 0)
+        page = records[offset:offset + self.page_size]
+        response = {"history": page, "historyId": str(self.history_id)}
+        if offset + self.page_size < len(records):
+            response["nextPageToken"] = str(offset + self.page_size)
+        return response
+
+    def _messages_list(self, userId, labelIds=None, maxResults=100, q=None):
+        self._count("messages.list")
+        newest_first = list(reversed(list(self.messages)))[:maxResults]
+        return {"messages": [{"id": msg_id} for msg_id in newest_first]}
+
+    def _messages_get(self, userId, id, format="full"):
+        self._count("messages.get")
+        if id in self.errors:
+            raise HttpError(httplib2.Response({"status": self.errors[id]}), b"Backend Error")
+        if id not in self.messages:
+            raise HttpError(httplib2.Response({"status": 404}), b"Not Found")
+        return self.messages[id]
+
+    def _attachments_get(self, userId, messageId, id):
+        self._count("attachments.get")
+        time.sleep(self.attachment_delay)
+        data = self.attachments[(messageId, id)]
+        return {"size": len(data), "data": b64(data)}
@@ -0,0 +1,97 @@
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts import listen_gmail
+from scripts.listen_gmail import get_attachments, process_message
+from fake_gmail import FakeGmailService, b64
+
+def test_only_csv_and_pdf_are_downloaded():
+    service = FakeGmailService()
+    service.add_message("m1", attachments={
+        "order.csv": ("text/csv", b"Item\n1\n"),
+        "photo.png": ("image/png", b"\x89PNG" * 100000),
+        "order.pdf": ("application/pdf", b"%PDF-1.4"),
+        "logo.jpg": ("image/jpeg", b"\xff\xd8"),
+    })
+
+    attachments = get_attachments(service, "me", service.messages["m1"])
+
+    assert [(a["filename"], a["kind"], a["data"]) for a in attachments] == [
+        ("order.csv", "csv", b"Item\n1\n"),
+        ("order.pdf", "pdf", b"%PDF-1.4"),
+    ]
+    assert service.calls["attachments.get"] == 2
+
+def test_downloads_run_concurrently():
+    service = FakeGmailService(attachment_delay=0.2)
+    service.add_message("m1", attachments={
+        f"part{n}.{'csv' if n % 2 else 'pdf'}": ("application/octet-stream", b"x") for n in range(4)
+    })
+
+    start = time.monotonic()
+    attachments = get_attachments(service, "me", service.messages["m1"])
+
+    assert len(attachments) == 4
+    assert time.monotonic() - start < 0.6
+
+def test_download_threads_are_reused_across_messages():
+    service = FakeGmailService(attachment_delay=0.05)
+    threads = set()
+    fetch = service._attachments_get
+
+    def recording_fetch(**kwargs):
+        threads.add(threading.current_thread().name)
+        return fetch(**kwargs)
+
+    service._attachments_get = recording_fetch
+    for msg_id in ("m1", "m2", "m3"):
+        service.add_message(msg_id, attachments={
+            "order.csv": ("text/csv", b"Item\n1\n"), "order.pdf": ("application/pdf", b"%PDF-1.4"),
+        })
+        assert len(get_attachments(service, "me", service.messages[msg_id])) == 2
+
+    # Each thread keeps its own Gmail connection, so new threads per message would never reuse one
+    assert len(threads) <= listen_gmail.GMAIL_ATTACHMENT_WORKERS
+    assert all(name.startswith("gmail-attachment") for name in threads)
+
+def test_nested_unnamed_and_inline_parts():
+    service = FakeGmailService()
+    service.attachments[("m1", "a1")] = b"%PDF-1.7"
+    service.add_raw_message("m1", {
+        "mimeType": "multipart/mixed",
+        "headers": [{"name": "Subject", "value": "Nested"}],
+        "parts": [
+            {"mimeType": "multipart/alternative", "parts": [
+                {"mimeType": "text/plain", "body": {"data": b64(b"7am")}},
+                {"mimeType": "text/html", "body": {"data": b64(b"<p>7am</p>")}},
+            ]},
+            {"mimeType": "multipart/related", "parts": [
+                {"mimeType": "application/pdf", "filename": "", "body": {"attachmentId": "a1", "size": 8}},
+            ]},
+            {"mimeType": "text/csv", "filename": "lines", "body": {"data": b64(b"Item\n2\n"), "size": 7}},
+        ],
+    })
+
+    email_data = process_message(service, "m1")
+
+    assert email_data["pdf_file"] == b"%PDF-1.7"
+    assert email_data["csv_file"] == b"Item\n2\n"
+    assert email_data["subject"] == "Nested"
+    assert service.calls["attachments.get"] == 1
+
+def test_single_part_attachment():
+    service = FakeGmailService()
+    service.attachments[("m1", "a1")] = b"Item\n3\n"
+    service.add_raw_message("m1", {
+        "mimeType": "text/csv",
+        "filename": "order.csv",
+        "headers": [],
+        "body": {"attachmentId": "a1", "size": 7},
+    })
+
+    attachments = get_attachments(service, "me", service.messages["m1"])
+    assert [a["data"] for a in attachments] == [b"Item\n3\n"]
@@ -0,0 +1,98 @@
+import sys
+import os
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts import listen_gmail
+from scripts.listen_gmail import GmailClient
+
+class FakeCredentials:
+    def __init__(self, expires_in):
+        self.token = "access-token"
+        self.refresh_token = "refresh-token"
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)
+        self.refreshes = 0
+
+    @property
+    def valid(self):
+        return self.expiry > datetime.datetime.utcnow()
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    def before_request(self, request, method, url, headers):
+        headers["authorization"] = f"Bearer {self.token}"
+
+@pytest.fixture
+def builds(monkeypatch):
+    calls = []
+    real_build = listen_gmail.build
+
+    def counting_build(*args, **kwargs):
+        calls.append(kwargs)
+        return real_build(*args, **kwargs)
+
+    monkeypatch.setattr(listen_gmail, "build", counting_build)
+    return calls
+
+def make_client(creds, saved=None):
+    loads = []
+    saved = [] if saved is None else saved
+
+    def load():
+        loads.append(1)
+        return creds
+
+    client = GmailClient(load_credentials=load, save_credentials=saved.append, refresh_margin_seconds=300)
+    return client, loads
+
+def test_service_is_built_once(builds):
+    client, loads = make_client(FakeCredentials(3600))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        services = list(pool.map(lambda _: client.service(), range(32)))
+
+    assert all(service is services[0] for service in services)
+    assert len(builds) == 1
+    assert builds[0]["static_discovery"] is True
+    assert len(loads) == 1
+
+def test_token_is_refreshed_before_expiry(builds):
+    saved = []
+    creds = FakeCredentials(60)
+    client, _ = make_client(creds, saved)
+
+    client.service()
+    assert creds.refreshes == 1
+    assert saved == [creds]
+
+    client.service()
+    assert creds.refreshes == 1
+
+def test_each_thread_gets_its_own_connection(builds):
+    client, _ = make_client(FakeCredentials(3600))
+    request = client.service().users().messages().list(userId="me")
+    assert request.http is client.http()
+    assert client.http() is client.http()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(client.http()))
+    thread.start()
+    thread.join()
+    assert other[0] is not client.http()
+
+def test_reconnect_replaces_connections(builds):
+    client, _ = make_client(FakeCredentials(3600))
+    service = client.service()
+    before = client.http()
+
+    client.reconnect()
+
+    assert client.http() is not before
+    assert client.service() is service
+    assert len(builds) == 1
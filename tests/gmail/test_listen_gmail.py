@@ -0,0 +1,178 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import DeadLetter, GmailCheckpoint, PipelineJob, ProcessedMessage
+from scripts import listen_gmail
+from scripts.listen_gmail import process_gmail_event, load_history_checkpoint
+from fake_gmail import FakeGmailService
+
+TEST_DB = "gmail_test_db"
+
+@pytest.fixture(scope="module", autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host="mongodb://localhost:27017/" + TEST_DB, uuidRepresentation="standard")
+    yield
+    GmailCheckpoint.drop_collection()
+    PipelineJob.drop_collection()
+    ProcessedMessage.drop_collection()
+    DeadLetter.drop_collection()
+    disconnect()
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    GmailCheckpoint.drop_collection()
+    PipelineJob.drop_collection()
+    ProcessedMessage.drop_collection()
+    DeadLetter.drop_collection()
+    listen_gmail.message_dedupe.clear_memory()
+    yield
+
+def order_attachments(n):
+    return {
+        f"order{n}.csv": ("text/csv", f"Item,Qty_Ord\n{n},1\n".encode()),
+        f"order{n}.pdf": ("application/pdf", b"%PDF-1.4 " + str(n).encode()),
+    }
+
+def queued_subjects():
+    return [job.payload["subject"] for job in PipelineJob.objects.order_by("created_at")] # type: ignore
+
+def test_first_event_only_sets_the_checkpoint():
+    service = FakeGmailService()
+    service.add_message("m0", subject="before start", attachments=order_attachments(0))
+
+    assert process_gmail_event(service, service.history_id)["queued"] == 0
+    assert load_history_checkpoint() == service.history_id
+    assert PipelineJob.objects.count() == 0 # type: ignore
+
+def test_burst_is_processed_as_one_batch():
+    service = FakeGmailService(page_size=2)
+    process_gmail_event(service, service.history_id)
+
+    for n in range(5):
+        service.add_message(f"m{n}", subject=f"order {n}", attachments=order_attachments(n))
+
+    # One notification for the whole burst
+    assert process_gmail_event(service, service.history_id)["queued"] == 5
+
+    assert queued_subjects() == [f"order {n}" for n in range(5)]
+    assert service.calls["history.list"] == 3
+    assert load_history_checkpoint() == service.history_id
+
+    job = PipelineJob.objects.first() # type: ignore
+    assert job.to_email_data()["csv_file"] == b"Item,Qty_Ord\n0,1\n"
+
+def test_restart_resumes_from_checkpoint():
+    service = FakeGmailService()
+    process_gmail_event(service, service.history_id)
+    service.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    process_gmail_event(service, service.history_id)
+
+    # New process: in-memory state is gone, the checkpoint is not
+    listen_gmail.message_dedupe.clear_memory()
+    service.add_message("m2", subject="order 2", attachments=order_attachments(2))
+    service.add_message("m3", subject="order 3", attachments=order_attachments(3))
+
+    assert process_gmail_event(service, service.history_id)["queued"] == 2
+    assert queued_subjects() == ["order 1", "order 2", "order 3"]
+
+def test_failed_message_is_retried_on_next_event():
+    service = FakeGmailService()
+    process_gmail_event(service, service.history_id)
+    service.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    service.add_message("m2", subject="order 2", attachments=order_attachments(2))
+    service.add_message("m3", subject="order 3", attachments=order_attachments(3))
+    service.errors["m2"] = 503
+
+    assert process_gmail_event(service, service.history_id) == {"queued": 2, "failed": 1}
+    assert load_history_checkpoint() == int(service.messages["m2"]["historyId"]) - 1
+
+    del service.errors["m2"]
+    assert process_gmail_event(service, service.history_id)["queued"] == 1
+    assert sorted(queued_subjects()) == ["order 1", "order 2", "order 3"]
+    assert load_history_checkpoint() == service.history_id
+    assert DeadLetter.objects.count() == 0 # type: ignore
+
+def test_message_deleted_before_fetch_does_not_hold_the_checkpoint():
+    service = FakeGmailService()
+    process_gmail_event(service, service.history_id)
+    service.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    service.add_message("m2", subject="order 2", attachments=order_attachments(2))
+    # The messagesAdded record stays in the history; messages().get now returns 404
+    del service.messages["m1"]
+
+    assert process_gmail_event(service, service.history_id) == {"queued": 1, "failed": 0}
+    assert queued_subjects() == ["order 2"]
+    assert load_history_checkpoint() == service.history_id
+    assert listen_gmail.message_dedupe.seen("gmail:m1")
+
+    # A replayed history does not fetch it again
+    GmailCheckpoint.objects.update(set__history_id=service.history_id - 2) # type: ignore
+    fetches = service.calls["messages.get"]
+    assert process_gmail_event(service, service.history_id) == {"queued": 0, "failed": 0}
+    assert service.calls["messages.get"] == fetches
+
+def test_message_failing_every_attempt_is_dead_lettered(monkeypatch):
+    monkeypatch.setattr(listen_gmail.message_dead_letters, "max_attempts", 3)
+    service = FakeGmailService()
+    process_gmail_event(service, service.history_id)
+    service.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    service.add_message("m2", subject="order 2", attachments=order_attachments(2))
+    service.errors["m1"] = 500
+
+    for _ in range(2):
+        assert process_gmail_event(service, service.history_id)["failed"] == 1
+        assert load_history_checkpoint() == int(service.messages["m1"]["historyId"]) - 1
+
+    assert process_gmail_event(service, service.history_id) == {"queued": 0, "failed": 0}
+    assert load_history_checkpoint() == service.history_id
+    assert queued_subjects() == ["order 2"]
+
+    dead = DeadLetter.objects.get(key="gmail:m1") # type: ignore
+    assert (dead.status, dead.attempts) == ("dead", 3)
+    assert "HttpError" in dead.last_error
+
+    service.add_message("m3", subject="order 3", attachments=order_attachments(3))
+    assert process_gmail_event(service, service.history_id) == {"queued": 1, "failed": 0}
+
+def test_expired_history_resyncs_recent_inbox():
+    service = FakeGmailService()
+    process_gmail_event(service, service.history_id)
+    service.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    process_gmail_event(service, service.history_id)
+
+    service.add_message("m2", subject="order 2", attachments=order_attachments(2))
+    service.expire_history()
+    GmailCheckpoint.objects.update(set__history_id=service.history_id - 5) # type: ignore
+
+    assert process_gmail_event(service, service.history_id)["queued"] == 1
+    assert service.calls["messages.list"] == 1
+    assert queued_subjects() == ["order 1", "order 2"]
+    assert load_history_checkpoint() == service.history_id
+
+def test_messages_without_attachments_are_skipped():
+    service = FakeGmailService()
+    process_gmail_event(service, service.history_id)
+    service.add_message("m1", subject="hello")
+
+    assert process_gmail_event(service, service.history_id)["queued"] == 0
+    assert PipelineJob.objects.count() == 0 # type: ignore
+    assert load_history_checkpoint() == service.history_id
+
+def test_redelivered_messages_are_not_queued_twice():
+    service = FakeGmailService()
+    process_gmail_event(service, service.history_id)
+    service.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    process_gmail_event(service, service.history_id)
+
+    # Restarted process, checkpoint lost: the persisted dedupe keys still apply
+    listen_gmail.message_dedupe.clear_memory()
+    GmailCheckpoint.objects.update(set__history_id=service.history_id - 1) # type: ignore
+
+    assert process_gmail_event(service, service.history_id)["queued"] == 0
+    assert queued_subjects() == ["order 1"]
+    assert ProcessedMessage.objects.get(key="gmail:m1").job_id == str(PipelineJob.objects.first().id) # type: ignore
@@ -0,0 +1,191 @@
+import sys
+import os
+import json
+import threading
+import pytest
+from functools import partial
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import DeadLetter, GmailCheckpoint, PipelineJob, ProcessedMessage
+from scripts import listen_gmail
+from scripts.listen_gmail import handle_pubsub_message, subscribe_with_flow_control, process_gmail_event
+from fake_gmail import FakeGmailService
+
+TEST_DB = "gmail_pubsub_test_db"
+
+@pytest.fixture(scope="module", autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host="mongodb://localhost:27017/" + TEST_DB, uuidRepresentation="standard")
+    yield
+    GmailCheckpoint.drop_collection()
+    PipelineJob.drop_collection()
+    ProcessedMessage.drop_collection()
+    DeadLetter.drop_collection()
+    disconnect()
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    GmailCheckpoint.drop_collection()
+    PipelineJob.drop_collection()
+    ProcessedMessage.drop_collection()
+    DeadLetter.drop_collection()
+    listen_gmail.message_dedupe.clear_memory()
+    yield
+
+
+class StandInMessage:
+    def __init__(self, subscriber, data, message_id):
+        self.subscriber = subscriber
+        self.data = data
+        self.message_id = message_id
+
+    def ack(self):
+        self.subscriber.settle(self, "ack")
+
+    def nack(self):
+        self.subscriber.settle(self, "nack")
+
+
+class StandInSubscriber:
+    """
+    Stands in for pubsub_v1.SubscriberClient: deliver() blocks while
+    flow_control.max_messages are outstanding, as the streaming pull leaser
+    does, and runs the callback on the scheduler it was given.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.max_outstanding = 0
+        self.results = {}
+        self.settled = threading.Condition(self.lock)
+
+    def subscribe(self, subscription_path, callback, flow_control, scheduler):
+        self.callback = callback
+        self.flow_control = flow_control
+        self.scheduler = scheduler
+        self.slots = threading.BoundedSemaphore(flow_control.max_messages)
+        return self
+
+    def deliver(self, history_id, message_id):
+        self.slots.acquire()
+        with self.lock:
+            self.outstanding += 1
+            self.max_outstanding = max(self.max_outstanding, self.outstanding)
+        data = json.dumps({"emailAddress": "loads@movomint.com", "historyId": history_id}).encode()
+        self.scheduler.schedule(self.callback, StandInMessage(self, data, message_id))
+
+    def settle(self, message, result):
+        with self.lock:
+            self.outstanding -= 1
+            self.results.setdefault(message.message_id, []).append(result)
+            self.settled.notify_all()
+        self.slots.release()
+
+    def wait(self, count, timeout=30):
+        with self.lock:
+            assert self.settled.wait_for(lambda: sum(map(len, self.results.values())) >= count, timeout)
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+
+
+def order_attachments(n):
+    return {f"order{n}.csv": ("text/csv", f"Item,Qty_Ord\n{n},1\n".encode())}
+
+@pytest.fixture
+def gmail():
+    service = FakeGmailService(page_size=25, attachment_delay=0.002)
+    process_gmail_event(service, service.history_id)
+    return service
+
+@pytest.fixture
+def subscriber(gmail, monkeypatch):
+    monkeypatch.setattr(listen_gmail, "PUBSUB_MAX_MESSAGES", 5)
+    monkeypatch.setattr(listen_gmail, "PUBSUB_CALLBACK_WORKERS", 8)
+    subscriber = StandInSubscriber()
+    subscribe_with_flow_control(subscriber, "projects/p/subscriptions/s",
+                                callback=partial(handle_pubsub_message, get_service=lambda: gmail))
+    yield subscriber
+    subscriber.shutdown()
+
+def test_burst_respects_flow_control(gmail, subscriber):
+    # One notification per email, delivered as fast as the flow control allows
+    for n in range(120):
+        gmail.add_message(f"m{n}", subject=f"order {n}", attachments=order_attachments(n))
+        subscriber.deliver(gmail.history_id, f"pubsub-{n}")
+    subscriber.wait(120)
+
+    assert subscriber.flow_control.max_messages == 5
+    assert subscriber.max_outstanding <= 5
+    assert all(results == ["ack"] for results in subscriber.results.values())
+    assert PipelineJob.objects.count() == 120 # type: ignore
+    assert sorted(job.payload["subject"] for job in PipelineJob.objects) == sorted(f"order {n}" for n in range(120)) # type: ignore
+    assert gmail.calls["messages.get"] == 120
+
+def test_failed_message_nacks_the_notification(gmail, subscriber):
+    gmail.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    gmail.add_message("m2", subject="order 2", attachments=order_attachments(2))
+    gmail.errors["m2"] = 503
+
+    subscriber.deliver(gmail.history_id, "pubsub-1")
+    subscriber.wait(1)
+    assert subscriber.results["pubsub-1"] == ["nack"]
+
+    # Pub/Sub redelivers; Gmail has recovered and nothing is queued twice
+    del gmail.errors["m2"]
+    subscriber.deliver(gmail.history_id, "pubsub-1")
+    subscriber.wait(2)
+    assert subscriber.results["pubsub-1"] == ["nack", "ack"]
+    assert sorted(job.payload["subject"] for job in PipelineJob.objects) == ["order 1", "order 2"] # type: ignore
+
+def test_deleted_message_does_not_block_the_notification(gmail, subscriber):
+    gmail.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    gmail.add_message("m2", subject="order 2", attachments=order_attachments(2))
+    del gmail.messages["m1"]
+
+    subscriber.deliver(gmail.history_id, "pubsub-1")
+    subscriber.wait(1)
+
+    assert subscriber.results["pubsub-1"] == ["ack"]
+    assert [job.payload["subject"] for job in PipelineJob.objects] == ["order 2"] # type: ignore
+
+def test_redelivered_notification_is_acked_without_gmail_calls(gmail, subscriber):
+    gmail.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    subscriber.deliver(gmail.history_id, "pubsub-1")
+    subscriber.wait(1)
+    calls = sum(gmail.calls.values())
+
+    subscriber.deliver(gmail.history_id, "pubsub-1")
+    subscriber.wait(2)
+
+    assert subscriber.results["pubsub-1"] == ["ack", "ack"]
+    assert sum(gmail.calls.values()) == calls
+    assert PipelineJob.objects.count() == 1 # type: ignore
+
+def test_listing_error_nacks_the_notification(gmail, subscriber, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ConnectionError("connection reset")
+    monkeypatch.setattr(listen_gmail, "list_new_messages", broken)
+    reconnects = []
+    monkeypatch.setattr(listen_gmail.gmail_client, "reconnect", lambda: reconnects.append(1))
+
+    gmail.add_message("m1", subject="order 1", attachments=order_attachments(1))
+    subscriber.deliver(gmail.history_id, "pubsub-1")
+    subscriber.wait(1)
+
+    assert subscriber.results["pubsub-1"] == ["nack"]
+    assert reconnects == [1]
+    assert not ProcessedMessage.objects(key="pubsub:pubsub-1") # type: ignore
+
+def test_malformed_notification_is_acked(subscriber):
+    subscriber.slots.acquire()
+    with subscriber.lock:
+        subscriber.outstanding += 1
+    subscriber.scheduler.schedule(subscriber.callback, StandInMessage(subscriber, b"not json", "bad"))
+    subscriber.wait(1)
+
+    assert subscriber.results["bad"] == ["ack"]
@@ -0,0 +1,64 @@
+import sys
+import os
+import base64
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts import listen_gmail
+from scripts.listen_gmail import walk_message, process_message
+from fake_gmail import FakeGmailService, b64
+
+def text_part(mime_type, text):
+    return {"mimeType": mime_type, "filename": "", "body": {"data": b64(text.encode())}}
+
+def test_headers_body_and_attachments_in_one_pass():
+    payload = {
+        "mimeType": "multipart/mixed",
+        "headers": [
+            {"name": "Subject", "value": "Order 42"},
+            {"name": "FROM", "value": "orders@shorr.com"},
+            {"name": "To", "value": "loads@movomint.com"},
+            {"name": "Date", "value": "Mon, 18 Nov 2024 10:11:00 -0500"},
+            {"name": "X-Mailer", "value": "ignored"},
+        ],
+        "parts": [
+            {"mimeType": "multipart/alternative", "parts": [
+                text_part("text/plain", "Pickup at "),
+                text_part("text/html", "<p>Pickup at 7am</p>"),
+            ]},
+            text_part("text/plain", "7am\n"),
+            {"mimeType": "message/rfc822", "parts": [text_part("text/plain", "forwarded text")]},
+            {"mimeType": "application/pdf", "filename": "", "body": {"attachmentId": "a1", "size": 10}},
+            {"mimeType": "text/csv", "filename": "order.csv", "body": {"data": b64(b"Item\n1\n"), "size": 7}},
+        ],
+    }
+
+    message = walk_message(payload)
+
+    assert (message["subject"], message["from"], message["to"]) == ("Order 42", "orders@shorr.com", "loads@movomint.com")
+    assert message["date"] == "Mon, 18 Nov 2024 10:11:00 -0500"
+    assert message["body"] == "Pickup at 7am"
+    assert [(a["filename"], a["kind"], a["attachment_id"]) for a in message["attachments"]] == [
+        ("attachment_1.pdf", "pdf", "a1"),
+        ("order.csv", "csv", None),
+    ]
+
+def test_single_part_message():
+    message = walk_message({**text_part("text/plain", "  just text  "), "headers": []})
+
+    assert message["body"] == "just text"
+    assert message["subject"] == ""
+    assert message["attachments"] == []
+
+def test_process_message_decodes_each_part_once(monkeypatch):
+    service = FakeGmailService()
+    service.add_message("m1", body="7am", attachments={"order.csv": ("text/csv", b"Item\n1\n")})
+    decoded = []
+    decode = base64.urlsafe_b64decode
+    monkeypatch.setattr(listen_gmail.base64, "urlsafe_b64decode", lambda data: decoded.append(data) or decode(data))
+
+    email_data = process_message(service, "m1")
+
+    assert email_data["email_body"] == "7am"
+    assert email_data["csv_file"] == b"Item\n1\n"
+    assert len(decoded) == 2
@@ -0,0 +1,78 @@
+import sys
+import os
+import datetime
+import pytest
+from bson import ObjectId
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from mongoengine.connection import get_db
+from models.types import Customer, Item, OrderBatch
+from config.db import ensure_indexes
+from scripts.dedupe_records import dedupe_customers, dedupe_items
+
+TEST_DB = "test_dedupe_records_db"
+
+@pytest.fixture(autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host=f"mongodb://localhost:27017/{TEST_DB}", alias="default", uuidRepresentation="standard")
+    get_db().client.drop_database(TEST_DB)
+    yield
+    get_db().client.drop_database(TEST_DB)
+    disconnect()
+
+def raw_item(item_number, dims=(0.0, 0.0, 0.0), confidence=None):
+    length, width, height = dims
+    # Written around mongoengine, as the old check-then-save race could leave them
+    return get_db()["item"].insert_one({
+        "item_number": item_number, "length": length, "width": width, "height": height,
+        "special_instructions": "", "units_per_pallet": 10, "dimensions_confidence": confidence,
+    }).inserted_id
+
+def raw_batch(item_id):
+    return get_db()["order_batch"].insert_one({"item_id": item_id, "number_pallets": 1}).inserted_id
+
+def test_duplicates_block_the_unique_index_loudly():
+    raw_item("10020345")
+    raw_item("10020345")
+
+    with pytest.raises(RuntimeError, match="dedupe_records"):
+        ensure_indexes()
+
+def test_dedupe_items_merges_order_batches_onto_one_item():
+    blank = raw_item("10020345")
+    inferred = raw_item("10020345", (12.0, 10.0, 8.0), "inferred")
+    confirmed = raw_item("10020345", (12.0, 10.0, 9.0), "confirmed")
+    other = raw_item("10020346")
+    batches = [raw_batch(blank), raw_batch(inferred), raw_batch(confirmed), raw_batch(other)]
+
+    assert dedupe_items() == 2
+    assert dedupe_items() == 0
+
+    ensure_indexes()
+    assert sorted(Item.objects.scalar("id")) == sorted([confirmed, other])
+    assert [OrderBatch.objects.get(id=batch_id).item_id.id for batch_id in batches] == [confirmed] * 3 + [other]
+
+def test_dedupe_customers_merges_orders_onto_the_oldest():
+    # The non-unique index earlier releases declared under the same name
+    get_db()["customer"].create_index([("account", 1), ("email_domain", 1)])
+    account = ObjectId()
+    customers = get_db()["customer"].insert_many([
+        {"account": account, "email_domain": "shorr.com", "date_created": datetime.datetime(2024, 1, 1)},
+        {"account": account, "email_domain": "shorr.com", "name": "Shorr", "date_created": datetime.datetime(2024, 1, 2)},
+        {"account": account, "email_domain": "", "name": "Blank A", "date_created": datetime.datetime(2024, 1, 3)},
+        {"account": account, "email_domain": "", "name": "Blank B", "date_created": datetime.datetime(2024, 1, 4)},
+        {"account": ObjectId(), "email_domain": "shorr.com", "date_created": datetime.datetime(2024, 1, 5)},
+    ]).inserted_ids
+    orders = get_db()["order"].insert_many([{"customer": customer_id} for customer_id in customers[:2]]).inserted_ids
+
+    assert dedupe_customers() == 1
+    assert dedupe_customers() == 0
+
+    ensure_indexes()
+    assert get_db()["customer"].index_information()["account_1_email_domain_1"]["unique"]
+    assert sorted(Customer.objects.scalar("id")) == sorted([customers[0]] + customers[2:])
+    assert Customer.objects.get(id=customers[0]).name == "Shorr"
+    assert [get_db()["order"].find_one({"_id": order_id})["customer"] for order_id in orders] == [customers[0]] * 2
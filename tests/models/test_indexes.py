@@ -0,0 +1,118 @@
+import sys
+import os
+import datetime
+import pytest
+from bson import ObjectId
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import Account, Member, Invitation, Customer, Item, Order, OrderBatch, Notification
+from config.db import ensure_indexes
+
+TEST_DB = "test_indexes_db"
+DOCUMENTS = (Account, Member, Invitation, Customer, Item, Order, OrderBatch, Notification)
+
+@pytest.fixture(scope="module", autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host=f"mongodb://localhost:27017/{TEST_DB}", alias="default", uuidRepresentation="standard")
+    for document in DOCUMENTS:
+        document.drop_collection()
+    ensure_indexes()
+    seed()
+    yield
+    for document in DOCUMENTS:
+        document.drop_collection()
+    disconnect()
+
+def seed():
+    # Enough documents that a collection scan is never the cheapest plan by accident
+    for a in range(3):
+        account = Account(email=f"a{a}@test.com", name=f"A{a}", company_code=f"IDX{a}").save()
+        members = [Member(account=account, name=f"M{m}", email=f"m{a}-{m}@test.com", hashed_password="x").save()
+                   for m in range(5)]
+        for c in range(5):
+            customer = Customer(account=account, name=f"C{c}", email_domain=f"c{c}.com").save()
+            item = Item(item_number=f"{a}{c}", height=1.0, width=1.0, length=1.0, special_instructions="",
+                        units_per_pallet=1).save()
+            Order(customer=customer, order_item_ids=[OrderBatch(item_id=item, number_pallets=1).save()],
+                  order_date=datetime.date(2024, 11, 1), shipment_times=["7am"], status="processing").save()
+        for i in range(5):
+            Invitation(account=account, email=f"i{a}-{i}@test.com", invited_by=members[0]).save()
+            Notification(account=account, member=members[0], title="t", description="d", type="order").save()
+
+def plan_stages(explain):
+    """Every `stage` named anywhere in an explain() result, whatever the server version's layout."""
+    stages = []
+    if isinstance(explain, dict):
+        if "stage" in explain:
+            stages.append(explain["stage"])
+        for key, value in explain.items():
+            if key not in ("rejectedPlans", "allPlansExecution"):
+                stages.extend(plan_stages(value))
+    elif isinstance(explain, list):
+        for value in explain:
+            stages.extend(plan_stages(value))
+    return stages
+
+def hot_queries():
+    account = Account.objects.first()
+    member = Member.objects(account=account).first()
+    customer = Customer.objects(account=account).first()
+    invitation = Invitation.objects(account=account).first()
+    now = datetime.datetime.utcnow()
+
+    return {
+        # auth
+        "account by email": Account.objects(email="a0@test.com"),
+        "account by company code": Account.objects(company_code="IDX0"),
+        "member login": Member.objects(email=member.email),
+        "member in account": Member.objects(email=member.email, account=account.pk),
+        "member list page": Member.objects(account=account.id).order_by("id").limit(101),
+        # customers and orders
+        "customer list page": Customer.objects(account=account).order_by("id").limit(101),
+        "customer by id": Customer.objects(id=customer.id, account=account),
+        "customer by email domain": Customer.objects(account=account, email_domain="c1.com"),
+        "order list page": Order.objects(customer=customer).order_by("id").limit(101),
+        "orders by id": Order.objects(id=ObjectId()),
+        "items by number": Item.objects(item_number__in=["00", "01"]),
+        # invitations
+        "pending invitation for email": Invitation.objects(email=invitation.email, account=account, status="pending"),
+        "pending invitation page": Invitation.objects(account=account, status="pending", expires_at__gte=now)
+                                             .order_by("id").limit(101),
+        "invitation by token": Invitation.objects(invitation_token=invitation.invitation_token, status="pending"),
+        # notifications
+        "notification page": Notification.objects(account=account, member=member.id)
+                                         .order_by("-created_at", "-id").limit(51),
+        "unread notifications": Notification.objects(account=account, member=member.id, is_read=False),
+    }
+
+HOT_QUERIES = [
+    "account by email", "account by company code", "member login", "member in account", "member list page",
+    "customer list page", "customer by id", "customer by email domain", "order list page", "orders by id",
+    "items by number", "pending invitation for email", "pending invitation page", "invitation by token",
+    "notification page", "unread notifications",
+]
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_an_index(name):
+    stages = plan_stages(hot_queries()[name].explain())
+
+    assert "COLLSCAN" not in stages, f"{name}: {stages}"
+    # Pages must come off the index in order, not from an in-memory sort
+    assert "SORT" not in stages, f"{name}: {stages}"
+
+def test_every_hot_query_is_checked():
+    assert sorted(hot_queries()) == sorted(HOT_QUERIES)
+
+def test_unique_items_aggregation_uses_an_index():
+    customer = Customer.objects.first()
+    explain = Order._get_collection().database.command(
+        "aggregate", Order._get_collection_name(),
+        pipeline=[{"$match": {"customer": customer.id}}, {"$unwind": "$order_item_ids"}],
+        explain=True,
+    )
+
+    stages = plan_stages(explain)
+    assert "COLLSCAN" not in stages, stages
@@ -0,0 +1,64 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import ProcessedMessage
+from pipeline.dedupe import DedupeStore
+
+TEST_DB = "dedupe_test_db"
+
+@pytest.fixture(scope="module", autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host="mongodb://localhost:27017/" + TEST_DB, uuidRepresentation="standard")
+    yield
+    ProcessedMessage.drop_collection()
+    disconnect()
+
+@pytest.fixture(autouse=True)
+def clean():
+    ProcessedMessage.drop_collection()
+    yield
+
+def test_marked_keys_are_seen():
+    store = DedupeStore()
+    assert not store.seen("gmail:a")
+
+    store.mark("gmail:a", job_id="job-1")
+    assert store.seen("gmail:a")
+    assert store.metrics()["memory_hits"] == 1
+    assert ProcessedMessage.objects.get(key="gmail:a").job_id == "job-1" # type: ignore
+
+def test_keys_survive_a_restart():
+    DedupeStore().mark("gmail:a")
+
+    restarted = DedupeStore()
+    assert restarted.seen("gmail:a")
+    assert restarted.seen("gmail:a")
+    assert restarted.metrics()["store_hits"] == 1
+    assert restarted.metrics()["memory_hits"] == 1
+
+def test_memory_is_bounded():
+    store = DedupeStore(max_entries=3)
+    for n in range(10):
+        store.mark(f"gmail:{n}")
+
+    assert store.metrics()["in_memory"] == 3
+    assert store.seen("gmail:0")
+    assert store.metrics()["store_hits"] == 1
+
+def test_marking_twice_is_harmless():
+    store = DedupeStore()
+    store.mark("pubsub:1")
+    store.mark("pubsub:1")
+
+    assert ProcessedMessage.objects(key="pubsub:1").count() == 1 # type: ignore
+    assert store.metrics()["errors"] == 0
+
+def test_ttl_index_is_declared():
+    indexes = ProcessedMessage._get_collection().index_information()
+    ttl = [spec for spec in indexes.values() if "expireAfterSeconds" in spec]
+    assert ttl and ttl[0]["key"] == [("processed_at", 1)]
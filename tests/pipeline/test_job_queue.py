@@ -0,0 +1,197 @@
+import sys
+import os
+import time
+import datetime
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import PipelineJob
+from pipeline.job_queue import JobQueue
+
+TEST_DB = "test_pipeline_jobs"
+
+@pytest.fixture(scope="function", autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host=f"mongodb://localhost:27017/{TEST_DB}", uuidRepresentation="standard")
+    drop_collections()
+    yield
+    drop_collections()
+    disconnect()
+
+def drop_collections():
+    database = PipelineJob._get_db()
+    for name in ("pipeline_jobs", "pipeline_attachments.files", "pipeline_attachments.chunks"):
+        database.drop_collection(name)
+
+def make_email(subject):
+    return {"csv_file": b"Item,Qty_Ord\n1,2\n", "pdf_file": None, "subject": subject, "email_body": "7am"}
+
+def test_back_to_back_emails_are_both_queued():
+    job_queue = JobQueue(poll_seconds=0.1)
+    first = job_queue.enqueue_email(make_email("A"))
+    second = job_queue.enqueue_email(make_email("B"))
+
+    job_a = job_queue.claim("w1")
+    job_b = job_queue.claim("w2")
+
+    assert {str(job_a.id), str(job_b.id)} == {first, second}
+    assert {job_a.payload["subject"], job_b.payload["subject"]} == {"A", "B"}
+    email_data = job_a.to_email_data()
+    assert email_data["csv_file"] == b"Item,Qty_Ord\n1,2\n"
+    assert email_data["pdf_file"] is None
+    assert job_queue.claim("w3", timeout=0.05) is None
+
+def test_attachments_larger_than_a_document_are_stored_in_gridfs():
+    # Over MongoDB's 16 MB document limit
+    csv_bytes = b"Item,Qty_Ord\n" + b"10020345,12\n" * (17 * 1024 * 1024 // 12)
+    job_id = JobQueue(poll_seconds=0.1).enqueue_email({**make_email("big"), "csv_file": csv_bytes, "pdf_file": b"%PDF-1.4"})
+
+    stored = PipelineJob._get_collection().find_one()
+    assert "csv_file" not in stored and "pdf_file" not in stored
+    assert not isinstance(stored["csv_attachment"], bytes)
+
+    email_data = PipelineJob.objects.get(id=job_id).to_email_data()
+    assert email_data["csv_file"] == csv_bytes
+    assert email_data["pdf_file"] == b"%PDF-1.4"
+    assert email_data["subject"] == "big"
+
+def attachment_files():
+    return PipelineJob._get_db()["pipeline_attachments.files"].count_documents({})
+
+def test_finished_jobs_release_their_attachments():
+    job_queue = JobQueue(max_attempts=1, poll_seconds=0.1)
+    job_queue.enqueue_email({**make_email("done"), "pdf_file": b"%PDF-1.4"})
+    job_queue.enqueue_email(make_email("failed"))
+    assert attachment_files() == 3
+
+    job = job_queue.claim("w1")
+    job_queue.complete(job, ["order-1"])
+    assert attachment_files() == 1
+    stored = PipelineJob._get_collection().find_one({"_id": job.id})
+    assert "csv_attachment" not in stored and stored["finished_at"]
+
+    job = job_queue.claim("w1")
+    job_queue.fail(job, RuntimeError("boom"))
+    assert attachment_files() == 0
+    stored = PipelineJob.objects.get(id=job.id)
+    assert (stored.status, stored.last_error) == ("failed", "boom")
+    assert stored.finished_at is not None
+
+def test_stale_worker_does_not_release_attachments():
+    job_queue = JobQueue(lease_seconds=60, poll_seconds=0.1)
+    job_queue.enqueue_email(make_email("A"))
+    job = job_queue.claim("w1")
+    PipelineJob.objects(id=job.id).update_one(set__lease_owner="w2")
+
+    job_queue.complete(job, ["stale"])
+    assert attachment_files() == 1
+    assert PipelineJob.objects.get(id=job.id).to_email_data()["csv_file"] == b"Item,Qty_Ord\n1,2\n"
+
+def test_jobs_queued_with_inline_attachments_still_load():
+    job = PipelineJob(kind="email", payload={"subject": "old"}, csv_file=b"Item\n1\n").save()
+
+    email_data = PipelineJob.objects.get(id=job.id).to_email_data()
+    assert email_data["csv_file"] == b"Item\n1\n"
+    assert email_data["pdf_file"] is None
+
+def test_jobs_survive_losing_the_in_memory_queue():
+    job_id = JobQueue(poll_seconds=0.1).enqueue_state("order-1")
+
+    # A fresh queue (e.g. after a restart) has nothing in memory and must poll Mongo
+    job = JobQueue(poll_seconds=0.1).claim("w1", timeout=0.05)
+    assert str(job.id) == job_id
+    assert job.kind == "state"
+    assert job.payload["order_id"] == "order-1"
+
+def test_expired_lease_is_redelivered():
+    job_queue = JobQueue(lease_seconds=60, poll_seconds=0.1)
+    job_queue.enqueue_state("order-1")
+    job = job_queue.claim("w1")
+    assert job.attempts == 1
+
+    assert job_queue.claim("w2", timeout=0.05) is None
+
+    PipelineJob.objects(id=job.id).update_one(
+        set__lease_expires_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    )
+    retaken = job_queue.claim("w2", timeout=0.05)
+    assert retaken.id == job.id
+    assert retaken.lease_owner == "w2"
+    assert retaken.attempts == 2
+
+    # The original worker lost its lease and can no longer complete the job
+    job_queue.complete(job, ["stale"])
+    assert PipelineJob.objects.get(id=job.id).status == "leased"
+
+def test_failed_job_is_retried_then_parked():
+    job_queue = JobQueue(max_attempts=2, poll_seconds=0.1)
+    job_queue.enqueue_state("order-1")
+
+    job = job_queue.claim("w1")
+    job_queue.fail(job, RuntimeError("boom"))
+    assert PipelineJob.objects.get(id=job.id).status == "queued"
+
+    job = job_queue.claim("w1")
+    job_queue.fail(job, RuntimeError("boom again"))
+    stored = PipelineJob.objects.get(id=job.id)
+    assert stored.status == "failed"
+    assert stored.last_error == "boom again"
+
+    metrics = job_queue.metrics()
+    assert metrics["failed"] == 1
+    assert metrics["failed_total"] == 1
+    assert metrics["retried_total"] == 1
+    assert metrics["depth"] == 0
+
+    # A restarted process has no counters but still reports the parked job
+    metrics = JobQueue().metrics()
+    assert metrics["failed"] == 1
+    assert metrics["failed_total"] == 0
+
+def test_heartbeat_keeps_a_long_job_leased():
+    job_queue = JobQueue(lease_seconds=0.3, poll_seconds=0.05)
+    job_id = job_queue.enqueue_state("order-1")
+    running = []
+
+    def slow(job):
+        running.append(job.id)
+        time.sleep(1)
+        return ["order-1"]
+
+    job_queue.start_workers(slow, count=1)
+    try:
+        deadline = time.time() + 0.5
+        while not running and time.time() < deadline:
+            time.sleep(0.01)
+        # Well past the original lease, the job is still not claimable
+        time.sleep(0.6)
+        assert job_queue.claim("w2", timeout=0.01) is None
+    finally:
+        job_queue.stop(timeout=2)
+
+    job = PipelineJob.objects.get(id=job_id)
+    assert (job.status, job.attempts) == ("done", 1)
+    assert running == [job.id]
+
+def test_worker_pool_drains_queue():
+    job_queue = JobQueue(poll_seconds=0.1)
+    for i in range(5):
+        job_queue.enqueue_state(f"order-{i}")
+
+    assert job_queue.metrics()["depth"] == 5
+
+    job_queue.start_workers(lambda job: [job.payload["order_id"]], count=3)
+    try:
+        deadline = time.time() + 10
+        while job_queue.metrics()["done"] < 5 and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        job_queue.stop(timeout=1)
+
+    metrics = job_queue.metrics()
+    assert metrics["done"] == 5
+    assert metrics["depth"] == 0
+    assert sorted(j.order_ids[0] for j in PipelineJob.objects) == [f"order-{i}" for i in range(5)]
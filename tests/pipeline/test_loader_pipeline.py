@@ -0,0 +1,56 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import PipelineJob
+from pipeline import loader_pipeline
+from pipeline.job_queue import JobQueue
+
+TEST_DB = "test_loader_pipeline"
+
+@pytest.fixture(autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host=f"mongodb://localhost:27017/{TEST_DB}", uuidRepresentation="standard")
+    PipelineJob.drop_collection()
+    yield
+    PipelineJob.drop_collection()
+    disconnect()
+
+@pytest.fixture
+def job_queue(monkeypatch):
+    job_queue = JobQueue(poll_seconds=0.1)
+    monkeypatch.setattr(loader_pipeline.shared_state, "job_queue", job_queue)
+    return job_queue
+
+def test_redelivered_email_job_plans_its_orders_without_recreating_them(job_queue, monkeypatch):
+    receipts = []
+    planned = []
+
+    def create_customer_receipt(email_data):
+        receipts.append(email_data["subject"])
+        return {"customer_email_domain": "shorr.com", "order_id": "o1", "order_ids": ["o1", "o2"]}
+
+    def run_pipeline_on_state(order_id):
+        if not planned:
+            planned.append("crash")
+            raise RuntimeError("planner unavailable")
+        planned.append(order_id)
+        return order_id
+
+    monkeypatch.setattr(loader_pipeline, "create_customer_receipt", create_customer_receipt)
+    monkeypatch.setattr(loader_pipeline, "run_pipeline_on_state", run_pipeline_on_state)
+    job_queue.enqueue_email({"csv_file": b"Item\n1\n", "pdf_file": None, "subject": "CODE01", "email_body": ""})
+
+    job = job_queue.claim("w1")
+    with pytest.raises(RuntimeError):
+        loader_pipeline.run_job(job)
+    job_queue.fail(job, RuntimeError("planner unavailable"))
+
+    job = job_queue.claim("w1")
+    assert list(job.order_ids) == ["o1", "o2"]
+    assert loader_pipeline.run_job(job) == ["o1", "o2"]
+    assert receipts == ["CODE01"]
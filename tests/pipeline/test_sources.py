@@ -0,0 +1,190 @@
+import sys
+import os
+import mailbox
+import threading
+import pytest
+from email.message import EmailMessage
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import DeadLetter, ProcessedMessage
+from pipeline.dedupe import DedupeStore
+from pipeline.dead_letter import DeadLetterStore
+from pipeline.sources import EmailSource, MaildirSource, ReplaySource, ingest, parse_rfc822, watch_source
+
+TEST_DB = "sources_test_db"
+
+@pytest.fixture(scope="module", autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host="mongodb://localhost:27017/" + TEST_DB, uuidRepresentation="standard")
+    yield
+    ProcessedMessage.drop_collection()
+    DeadLetter.drop_collection()
+    disconnect()
+
+@pytest.fixture(autouse=True)
+def clean():
+    ProcessedMessage.drop_collection()
+    DeadLetter.drop_collection()
+    yield
+
+def order_email(n, csv=True, pdf=True):
+    message = EmailMessage()
+    message["Subject"] = f"order {n}"
+    message["From"] = "orders@shorr.com"
+    message["To"] = "loads@movomint.com"
+    message["Date"] = "Mon, 18 Nov 2024 10:11:00 -0500"
+    message.set_content(f"Pickup at 7am for order {n}")
+    if csv:
+        message.add_attachment(f"Item,Qty_Ord\n{n},1\n".encode(), maintype="text", subtype="csv", filename=f"order{n}.csv")
+    if pdf:
+        message.add_attachment(b"%PDF-1.4 " + str(n).encode(), maintype="application", subtype="pdf", filename=f"order{n}.pdf")
+    return message.as_bytes()
+
+class Sink:
+    def __init__(self):
+        self.emails = []
+        self.lock = threading.Lock()
+
+    def __call__(self, email_data):
+        with self.lock:
+            self.emails.append(email_data)
+            return f"job-{len(self.emails)}"
+
+def test_parse_rfc822():
+    email_data = parse_rfc822(order_email(1))
+
+    assert email_data["subject"] == "order 1"
+    assert email_data["from"] == "orders@shorr.com"
+    assert email_data["email_body"] == "Pickup at 7am for order 1"
+    assert email_data["csv_file"] == b"Item,Qty_Ord\n1,1\n"
+    assert email_data["pdf_file"] == b"%PDF-1.4 1"
+
+def test_parse_rfc822_decodes_encoded_headers_and_charsets():
+    message = EmailMessage()
+    message["Subject"] = "Commande n° 42"
+    message.set_content("Livraison à 7h", charset="iso-8859-1")
+
+    email_data = parse_rfc822(message.as_bytes())
+
+    assert email_data["subject"] == "Commande n° 42"
+    assert email_data["email_body"] == "Livraison à 7h"
+    assert email_data["csv_file"] is None
+
+def test_source_without_fetch_cannot_be_created():
+    class Incomplete(EmailSource):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_replay_preserves_order():
+    source = ReplaySource([order_email(n) for n in range(20)] + [{"subject": "ready", "from": "", "to": "", "date": "",
+                                                                  "email_body": "", "csv_file": b"x", "pdf_file": None}])
+    sink = Sink()
+
+    results = ingest(source, source.poll(), enqueue=sink, workers=4)
+
+    assert [ref for ref, _, _ in results] == list(range(21))
+    assert [email["subject"] for email in sink.emails] == [f"order {n}" for n in range(20)] + ["ready"]
+    assert source.poll() == []
+
+def test_replay_from_directory(tmp_path):
+    for n in range(3):
+        (tmp_path / f"{n:03}.eml").write_bytes(order_email(n))
+    (tmp_path / "notes.txt").write_text("not an email")
+
+    source = ReplaySource.from_directory(str(tmp_path))
+
+    assert [source.fetch(ref)["subject"] for ref in source.poll()] == ["order 0", "order 1", "order 2"]
+
+def test_emails_without_attachments_are_not_queued():
+    source = ReplaySource([order_email(1, csv=False, pdf=False)])
+    sink = Sink()
+
+    assert ingest(source, source.poll(), enqueue=sink) == [(0, None, None)]
+    assert sink.emails == []
+
+def test_maildir_moves_handled_messages_to_cur(tmp_path):
+    path = str(tmp_path / "inbox")
+    inbox = mailbox.Maildir(path, create=True)
+    keys = [inbox.add(mailbox.MaildirMessage(order_email(n))) for n in range(3)]
+    source = MaildirSource(path)
+    sink = Sink()
+
+    assert [name.split(":")[0] for name in source.poll()] == sorted(keys)
+    results = ingest(source, source.poll(), enqueue=sink)
+
+    assert all(error is None for _, _, error in results)
+    assert sorted(email["subject"] for email in sink.emails) == ["order 0", "order 1", "order 2"]
+    assert source.poll() == []
+    assert len(os.listdir(os.path.join(path, "cur"))) == 3
+
+def test_maildir_failures_stay_in_new(tmp_path):
+    path = str(tmp_path / "inbox")
+    inbox = mailbox.Maildir(path, create=True)
+    inbox.add(mailbox.MaildirMessage(order_email(1)))
+    source = MaildirSource(path)
+
+    def broken(email_data):
+        raise ConnectionError("queue unavailable")
+
+    [(ref, job_id, error)] = ingest(source, source.poll(), enqueue=broken)
+
+    assert isinstance(error, ConnectionError)
+    assert source.poll() == [ref]
+
+def test_message_failing_every_attempt_is_retired_as_a_dead_letter(tmp_path):
+    path = str(tmp_path / "inbox")
+    inbox = mailbox.Maildir(path, create=True)
+    inbox.add(mailbox.MaildirMessage(order_email(1)))
+    source = MaildirSource(path)
+    dead_letters = DeadLetterStore(max_attempts=2)
+
+    def broken(email_data):
+        raise ValueError("unparseable order")
+
+    [(ref, _, error)] = ingest(source, source.poll(), dedupe=DedupeStore(), enqueue=broken, dead_letters=dead_letters)
+    assert isinstance(error, ValueError)
+    assert source.poll() == [ref]
+
+    assert ingest(source, source.poll(), dedupe=DedupeStore(), enqueue=broken, dead_letters=dead_letters) == [(ref, None, None)]
+    assert source.poll() == []
+    assert DeadLetter.objects.get(key=source.key(ref)).status == "dead" # type: ignore
+
+def test_dedupe_skips_and_retires_seen_messages(tmp_path):
+    path = str(tmp_path / "inbox")
+    inbox = mailbox.Maildir(path, create=True)
+    key = inbox.add(mailbox.MaildirMessage(order_email(1)))
+    DedupeStore().mark(f"maildir:{key}", "job-0")
+    assert not os.listdir(os.path.join(path, "cur"))
+    source = MaildirSource(path)
+    sink = Sink()
+
+    assert ingest(source, source.poll(), dedupe=DedupeStore(), enqueue=sink) == []
+    assert sink.emails == []
+    assert source.poll() == []
+
+def test_watch_source_ingests_new_mail(tmp_path, monkeypatch):
+    path = str(tmp_path / "inbox")
+    inbox = mailbox.Maildir(path, create=True)
+    source = MaildirSource(path)
+    sink = Sink()
+    monkeypatch.setattr("pipeline.sources.handle_parsed_email", lambda email_data, enqueue=None: sink(email_data))
+    stop = threading.Event()
+    thread = threading.Thread(target=watch_source, args=(source, stop), kwargs={"interval": 0.01})
+    thread.start()
+
+    inbox.add(mailbox.MaildirMessage(order_email(1)))
+    try:
+        for _ in range(500):
+            if sink.emails:
+                break
+            stop.wait(0.01)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert [email["subject"] for email in sink.emails] == ["order 1"]
@@ -13,6 +13,7 @@ from mongoengine import connect, disconnect
 from models.types import Account, Member, Customer, Order, OrderBatch, Item
 from main import app
 from utils.dependencies import get_current_user
+from utils.query_counter import QueryCounter
 
 TEST_DB = "test_customer_routes_db"
 client = TestClient(app)
@@ -27,8 +28,17 @@ def db():
     Customer.drop_collection()
     Order.drop_collection()
     Item.drop_collection()
+    OrderBatch.drop_collection()
     disconnect()
 
+@pytest.fixture
+def query_counter():
+    # Reconnect with command monitoring; seed data after this fixture runs
+    counter = QueryCounter()
+    disconnect()
+    connect(TEST_DB, host=f"mongodb://localhost:27017/{TEST_DB}", alias="default", event_listeners=[counter])
+    return counter
+
 @pytest.fixture
 def account_and_customers():
     unique_email = f"test_{uuid.uuid4().hex}@example.com"
@@ -144,6 +154,35 @@ def test_get_customer_orders(account_customer_order):
     app.dependency_overrides = {}
 
 
+def test_get_customer_orders_query_count(query_counter):
+    account = Account(email=f"test_{uuid.uuid4().hex}@example.com", name="Corp Account", company_code="QCOUNT").save()
+    customer = Customer(name="Busy", email_domain="busy.com", account=account).save()
+    items = [
+        Item(item_number=f"{9000 + n}", height=1.0, width=2.0, length=3.0, special_instructions="",
+             description=f"Item {n}", units_per_pallet=10).save()
+        for n in range(10)
+    ]
+    for o in range(20):
+        batches = [OrderBatch(item_id=items[(o + b) % 10], number_pallets=b + 1).save() for b in range(5)]
+        Order(customer=customer, order_item_ids=batches, order_date=datetime(2024, 11, o + 1).date(),
+              shipment_times=["7am"], status="processing").save()
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(account=account)
+
+    query_counter.reset()
+    response = client.get(f"/customer/{customer.id}/orders")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 20
+    assert [b["number_pallets"] for b in data[0]["order_batches"]] == [1, 2, 3, 4, 5]
+    assert data[0]["order_batches"][0]["item"]["item_number"] == "9000"
+    assert data[0]["order_date"] == "2024-11-01"
+    # Customer, orders, batches, items: independent of the number of orders and lines
+    assert query_counter.by_command == {"find": 4}
+
+    app.dependency_overrides = {}
+
+
 def test_get_orders_invalid_customer(account_customer_order):
     account, _, _ = account_customer_order
     app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(account=account)
@@ -173,6 +212,36 @@ def test_get_unique_items_for_customer(account_customer_order):
 
     app.dependency_overrides = {}
 
+def test_unique_items_are_distinct_across_orders(query_counter):
+    account = Account(email=f"test_{uuid.uuid4().hex}@example.com", name="Corp Account", company_code="UNIQUE").save()
+    customer = Customer(name="Repeat", email_domain="repeat.com", account=account).save()
+    other = Customer(name="Other", email_domain="other.com", account=account).save()
+    items = [
+        Item(item_number=f"{8000 + n}", height=1.0, width=1.0, length=1.0, special_instructions="",
+             description=f"Item {n}", units_per_pallet=n + 1).save()
+        for n in range(4)
+    ]
+    for o in range(10):
+        batches = [OrderBatch(item_id=items[(o + b) % 3], number_pallets=1).save() for b in range(3)]
+        Order(customer=customer, order_item_ids=batches, order_date=datetime(2024, 11, 1).date(),
+              shipment_times=["7am"], status="processing").save()
+    Order(customer=other, order_item_ids=[OrderBatch(item_id=items[3], number_pallets=1).save()],
+          order_date=datetime(2024, 11, 1).date(), shipment_times=["7am"], status="processing").save()
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(account=account)
+
+    query_counter.reset()
+    response = client.get(f"/customer/{customer.id}/unique-items")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"item_id": str(items[n].id), "item_number": f"{8000 + n}", "description": f"Item {n}", "units_per_pallet": n + 1}
+        for n in range(3)
+    ]
+    # Customer lookup, then a single aggregation whatever the order history
+    assert query_counter.by_command == {"find": 1, "aggregate": 1}
+
+    app.dependency_overrides = {}
+
 def test_create_customer(account_and_customers):
     account, _ = account_and_customers
     app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(account=account)
@@ -196,6 +265,16 @@ def test_create_customer(account_and_customers):
 
     app.dependency_overrides = {}
 
+def test_create_customer_duplicate_domain(account_customer_order):
+    account, _, _ = account_customer_order
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(account=account)
+
+    response = client.post("/customer", json={"name": "Again", "email_domain": "cust.com"})
+    assert response.status_code == 400
+    assert Customer.objects(account=account, email_domain="cust.com").count() == 1
+
+    app.dependency_overrides = {}
+
 def test_create_customer_missing_field(account_and_customers):
     account, _ = account_and_customers
     app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(account=account)
@@ -80,11 +80,13 @@ def test_update_item_dimensions_success():
     assert data["height"] == 10.5
     assert data["width"] == 5.0
     assert data["length"] == 3.2
+    assert data["dimensions_confidence"] == "confirmed"
 
     item.reload()
     assert item.height == 10.5
     assert item.width == 5.0
     assert item.length == 3.2
+    assert item.dimensions_confidence == "confirmed"
 
 
 def test_update_item_dimensions_invalid_item_id():
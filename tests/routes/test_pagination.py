@@ -0,0 +1,136 @@
+import sys
+import os
+import uuid
+import json
+import base64
+import datetime
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import Account, Member, Customer, Invitation, Notification, Order, OrderBatch, Item
+from main import app
+from utils.dependencies import get_current_user
+from fastapi import HTTPException
+from utils.pagination import NEXT_CURSOR_HEADER, paginate
+
+TEST_DB = "test_pagination_routes_db"
+client = TestClient(app)
+
+@pytest.fixture(scope="function", autouse=True)
+def db():
+    disconnect()
+    connect(TEST_DB, host=f"mongodb://localhost:27017/{TEST_DB}", alias="default")
+    yield
+    for doc in (Account, Member, Customer, Invitation, Notification, Order, OrderBatch, Item):
+        doc.drop_collection()
+    app.dependency_overrides = {}
+    disconnect()
+
+@pytest.fixture
+def member():
+    account = Account(name="Paged", email=f"account_{uuid.uuid4().hex}@test.com",
+                      company_code=f"CODE_{uuid.uuid4().hex[:6]}").save()
+    member = Member(account=account, name="Admin", email=f"admin_{uuid.uuid4().hex}@test.com",
+                    hashed_password="hashed", role="admin").save()
+    app.dependency_overrides[get_current_user] = lambda: member
+    return member
+
+def fetch_all(path, limit, **params):
+    """Follow X-Next-Cursor until the last page; returns the pages."""
+    pages = []
+    cursor = None
+    while True:
+        query = {"limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+        response = client.get(path, params=query)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+def test_customers_are_paged(member):
+    for n in range(7):
+        Customer(name=f"Customer {n}", email_domain=f"c{n}.com", account=member.account).save()
+    Customer(name="Elsewhere", email_domain="x.com",
+             account=Account(name="Other", email="o@test.com", company_code="OTHER1").save()).save()
+
+    pages = fetch_all("/customer", limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [c["name"] for page in pages for c in page] == [f"Customer {n}" for n in range(7)]
+
+def test_customer_orders_are_paged(member):
+    customer = Customer(name="Busy", email_domain="busy.com", account=member.account).save()
+    item = Item(item_number="4242", height=1.0, width=1.0, length=1.0, special_instructions="", units_per_pallet=1).save()
+    order_ids = []
+    for n in range(5):
+        batch = OrderBatch(item_id=item, number_pallets=n + 1).save()
+        order_ids.append(str(Order(customer=customer, order_item_ids=[batch], order_date=datetime.date(2024, 11, 1),
+                                   shipment_times=["7am"], status="processing").save().id))
+
+    pages = fetch_all(f"/customer/{customer.id}/orders", limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [o["id"] for page in pages for o in page] == order_ids
+    assert pages[2][0]["order_batches"][0]["number_pallets"] == 5
+
+def test_members_are_paged(member):
+    for n in range(4):
+        Member(account=member.account, name=f"Member {n}", email=f"m{n}_{uuid.uuid4().hex}@test.com",
+               hashed_password="hashed").save()
+
+    pages = fetch_all("/members", limit=2)
+
+    assert [m["name"] for page in pages for m in page] == ["Admin"] + [f"Member {n}" for n in range(4)]
+    assert "hashed_password" not in pages[0][0]
+
+def test_invitations_are_paged(member):
+    for n in range(3):
+        Invitation(account=member.account, email=f"invite{n}@test.com", invited_by=member).save()
+    Invitation(account=member.account, email="done@test.com", invited_by=member, status="accepted").save()
+
+    pages = fetch_all("/invitations", limit=2)
+
+    invitations = [i for page in pages for i in page]
+    assert [i["email"] for i in invitations] == [f"invite{n}@test.com" for n in range(3)]
+    assert {i["invited_by"] for i in invitations} == {"Admin"}
+
+def test_notifications_are_paged_newest_first(member):
+    start = datetime.datetime(2024, 11, 1)
+    for n in range(5):
+        Notification(account=member.account, member=member, title=f"n{n}", description="d", type="order",
+                     created_at=start + datetime.timedelta(minutes=n)).save()
+    # Same timestamp as n4: _id breaks the tie
+    Notification(account=member.account, member=member, title="n4b", description="d", type="order",
+                 created_at=start + datetime.timedelta(minutes=4)).save()
+
+    pages = fetch_all("/notifications", limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 2]
+    assert [n["title"] for page in pages for n in page] == ["n4b", "n4", "n3", "n2", "n1", "n0"]
+
+    # Offset paging still works for older clients
+    response = client.get("/notifications", params={"limit": 2, "offset": 4})
+    assert [n["title"] for n in response.json()] == ["n1", "n0"]
+
+def test_invalid_cursor_is_rejected(member):
+    assert client.get("/customer", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/notifications", params={"cursor": "WyJ4Il0"}).status_code == 400
+
+@pytest.mark.parametrize("path", ["/customer", "/notifications"])
+@pytest.mark.parametrize("values", [{"id": "0" * 24}, [None], [], "0" * 24, ["0" * 24] * 3])
+def test_cursor_of_the_wrong_shape_is_rejected(member, path, values):
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+    assert client.get(path, params={"cursor": cursor}).status_code == 400
+
+@pytest.mark.parametrize("path", ["/customer", "/members", "/invitations", "/notifications"])
+@pytest.mark.parametrize("limit", [0, -1])
+def test_non_positive_limit_is_rejected(member, path, limit):
+    assert client.get(path, params={"limit": limit}).status_code == 422
+
+def test_paginate_rejects_non_positive_limit(member):
+    with pytest.raises(HTTPException):
+        paginate(Customer.objects, limit=0)
@@ -0,0 +1,41 @@
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader.dimensions import parse_dimensions, infer_dimensions
+
+@pytest.mark.parametrize("description, expected", [
+    ("020 9x6-1/4x3-5/8 RSC 32B Kraft 1C/2P", (9.0, 6.25, 3.625)),
+    ("806 28x18x16 RSC 40C Kraft 1C/2P 20/bundle", (28.0, 18.0, 16.0)),
+    ("S5/040 11-3/16x6-15/16x5-1/8", (11.1875, 6.9375, 5.125)),
+    ("127/426 11x10x11-1/2 RSC 32B Kraft 1C/4P", (11.0, 10.0, 11.5)),
+    ("48-1/2x39-9/16x60 522698 HSC 44C Kraft Plain", (48.5, 39.5625, 60.0)),
+    ("24 x 18 x 12.5in Mailer", (24.0, 18.0, 12.5)),
+])
+def test_parse_dimensions(description, expected):
+    assert parse_dimensions(description) == expected
+
+@pytest.mark.parametrize("description", [
+    "383S 10x13in 1Mil Staple Pack LDPE Poly Bag Red",
+    "15inx950ft 50lb Kraft Easypack GeoTerra Paper",
+    "8x10x3000ft EP-Flex Elite Film 64/pallet",
+    "70mmx1000ft IPG Target Circle 360 White Venom",
+    "L820-11/16x13-15/16x10-5/8",
+    "10x10x10 and 12x12x12 Combo",
+    "",
+    None,
+])
+def test_unreadable_descriptions_are_rejected(description):
+    assert parse_dimensions(description) is None
+
+def test_infer_dimensions_is_cached_per_sku():
+    infer_dimensions.cache_clear()
+
+    assert infer_dimensions("10202660", "806 28x18x16 RSC") == (28.0, 18.0, 16.0)
+    assert infer_dimensions("10202660", "806 28x18x16 RSC") == (28.0, 18.0, 16.0)
+    assert infer_dimensions("10202660", "806 30x18x16 RSC") == (30.0, 18.0, 16.0)
+
+    info = infer_dimensions.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
@@ -171,9 +171,13 @@ def test_email_initiated_pipeline_missing_items():
         item = order_batch.item_id
         assert item is not None
         assert isinstance(item.item_number, str)
-        assert item.height == 0
-        assert item.width == 0
-        assert item.length == 0
+        # Cartons get dimensions from their description; the rest stay 0x0x0
+        if item.dimensions_confidence == "inferred":
+            assert item.height > 0 and item.width > 0 and item.length > 0
+        else:
+            assert item.height == 0
+            assert item.width == 0
+            assert item.length == 0
         assert item.units_per_pallet > 0
         assert isinstance(item.special_instructions, str)
 
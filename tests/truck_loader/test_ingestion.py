@@ -1,12 +1,17 @@
 import sys
 import os
 import tempfile
+import threading
 from bson import ObjectId
 import pandas as pd
 import pytest
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 from models.types import Customer, Order, Item, Account, OrderBatch
-from scripts.truck_loader.ingestion import create_customer_receipt, parse_csv, parse_pdf
+from scripts.truck_loader.ingestion import (
+    create_customer_receipt, parse_csv, parse_pdf, finalize_df, add_new_items_from_df,
+    iter_csv_chunks, stream_order_from_csv, split_orders, create_orders_from_df, find_or_create_customer,
+)
+from mongoengine.errors import NotUniqueError
 from mongoengine import connect, disconnect
 
 TEST_DB = "customer_orders_test_db"
@@ -46,6 +51,167 @@ def test_parse_csv_invalid_input_type():
     with pytest.raises(TypeError, match="Expected CSV data as bytes"):
         parse_csv(csv_content)
 
+def test_finalize_df_merges_instructions_and_units():
+    df = pd.DataFrame({"Item": ["111", "222", "333", "222"], "Qty_Ord": [1, 2, 3, 4]})
+    special_instructions = [
+        {"item_id": "222", "instruction": "Keep upright"},
+        {"item_id": "222", "instruction": "Do not double stack"},
+        {"item_id": "999", "instruction": "Not on this order"},
+    ]
+    units_per_pallet = [{"item_id": "111", "units_per_pallet": 2400}, {"item_id": "333", "units_per_pallet": 800}]
+
+    final_df = finalize_df(df, special_instructions, units_per_pallet)
+
+    assert final_df["Special_Instructions"].tolist()[1::2] == ["Do not double stack", "Do not double stack"]
+    assert final_df["Special_Instructions"].isna().tolist() == [True, False, True, False]
+    assert final_df.loc[final_df["Item"] == "111", "Units_Per_Pallet"].item() == 2400
+    assert final_df.loc[final_df["Item"] == "333", "Units_Per_Pallet"].item() == 800
+    assert final_df.loc[final_df["Item"] == "222", "Units_Per_Pallet"].isna().all()
+
+def test_finalize_df_without_matches_leaves_columns_untouched():
+    df = pd.DataFrame({"Item": ["111"]})
+    final_df = finalize_df(df, [], [{"item_id": "999", "units_per_pallet": 10}])
+    assert list(final_df.columns) == ["Item"]
+
+def test_add_new_items_from_df_bulk_inserts_only_missing_items():
+    Item(item_number="90000001", height=1.0, width=1.0, length=1.0,
+         special_instructions="", units_per_pallet=10).save()
+
+    df = pd.DataFrame({
+        "Item": ["90000001", "90000002", "90000003", "90000002"],
+        "Units_Per_Pallet": [10, 20.0, 30, 20.0],
+        "SpecialInstructions": ["", "Keep dry", "", "Keep dry"],
+        "Description": ["", "806 28x18x16 RSC 40C Kraft", "15inx950ft Kraft Paper", "806 28x18x16 RSC 40C Kraft"],
+    })
+    added_ids = add_new_items_from_df(df)
+
+    assert len(added_ids) == 2
+    assert Item.objects(item_number__in=["90000001", "90000002", "90000003"]).count() == 3
+    new_item = Item.objects.get(item_number="90000002")
+    assert str(new_item.id) in added_ids
+    assert new_item.units_per_pallet == 20
+    assert new_item.special_instructions == "Keep dry"
+    assert (new_item.length, new_item.width, new_item.height) == (28, 18, 16)
+    assert new_item.dimensions_confidence == "inferred"
+    paper = Item.objects.get(item_number="90000003")
+    assert paper.height == 0
+    assert paper.dimensions_confidence is None
+
+    # Re-running is a no-op and the unique index rejects duplicates
+    assert add_new_items_from_df(df) == []
+    with pytest.raises(NotUniqueError):
+        Item(item_number="90000003", height=0.0, width=0.0, length=0.0,
+             special_instructions="", units_per_pallet=1).save()
+
+def test_add_new_items_from_df_falls_back_to_master_sheet():
+    Item.objects(item_number="10202639").delete()
+    df = pd.DataFrame({"Item": ["10202639"], "Units_Per_Pallet": [float("nan")], "SpecialInstructions": [""]})
+
+    add_new_items_from_df(df)
+
+    item = Item.objects.get(item_number="10202639")
+    assert item.units_per_pallet == 1200
+    assert item.description.startswith("064 12-11/16x9x5-5/8")
+    assert (item.length, item.width, item.height) == (12.6875, 9.0, 5.625)
+    assert item.dimensions_confidence == "inferred"
+
+def test_iter_csv_chunks_reads_only_needed_columns():
+    with open("data/example_order.csv", "rb") as f:
+        csv_bytes = f.read()
+
+    chunks = list(iter_csv_chunks(csv_bytes, chunksize=10))
+
+    assert [len(c) for c in chunks] == [10, 10, 8]
+    assert set(chunks[0].columns) == {"Order__", "Customer_PO", "Item", "Description", "Qty_Ord"}
+    assert chunks[0].iloc[0]["Item"] == "10202638"
+
+def test_stream_order_from_csv_writes_items_and_batches_per_chunk():
+    with open("data/example_order.csv", "rb") as f:
+        csv_bytes = f.read()
+    item_numbers = parse_csv(csv_bytes)["Item"].tolist()
+
+    account = Account(email="stream@gmail.com", name="account", company_code="STREAM").save()
+    customer = Customer(account=account, email_domain="shorr.com").save()
+    units_per_pallet = [{"item_id": n, "units_per_pallet": 100} for n in item_numbers]
+
+    orders = stream_order_from_csv(csv_bytes, [], units_per_pallet, customer, "11/18/24", ["7am"], chunksize=10)
+
+    # Order 70617611-00 spans the first and second chunk but is still one Order
+    orders = [Order.objects.get(id=o.id) for o in orders]
+    assert [o.order_number for o in orders] == ["70617610-00", "70617611-00", "70617613-00"]
+    assert [len(o.order_item_ids) for o in orders] == [13, 13, 2]
+    assert [b.item_id.item_number for o in orders for b in o.order_item_ids] == item_numbers
+    assert orders[0].order_item_ids[0].number_pallets == 144
+    assert Item.objects(item_number__in=item_numbers).count() == len(set(item_numbers))
+
+def test_split_orders_groups_by_order_number():
+    df = pd.DataFrame({
+        "Order__": ["A-1", "A-1", "B-2", None],
+        "Customer_PO": ["PO1", "PO1", "PO2", "PO3"],
+        "Item": ["1", "2", "3", "4"],
+    })
+    groups = split_orders(df)
+
+    assert [key for key, _, _ in groups] == ["A-1", "B-2", ""]
+    assert groups[0][1] == {"order_number": "A-1", "customer_po": "PO1"}
+    assert groups[2][1] == {"customer_po": "PO3"}
+    assert groups[0][2]["Item"].tolist() == ["1", "2"]
+
+    assert [key for key, _, _ in split_orders(df.drop(columns=["Order__"]))] == ["PO1", "PO2", "PO3"]
+    assert len(split_orders(df[["Item"]])) == 1
+
+def test_numeric_customer_po_splits_the_same_as_streaming():
+    csv_bytes = b"Customer_PO,Item\n7007342108,10020345\n,10020346\n7007342109,10020347\n"
+    streamed = pd.concat(iter_csv_chunks(csv_bytes))
+
+    assert [key for key, _, _ in split_orders(parse_csv(csv_bytes))] == ["7007342108", "", "7007342109"]
+    assert [key for key, _, _ in split_orders(parse_csv(csv_bytes))] == [key for key, _, _ in split_orders(streamed)]
+
+def test_create_orders_from_df_creates_one_order_per_order_number():
+    account = Account(email="split@gmail.com", name="account", company_code="SPLIT").save()
+    customer = Customer(account=account, email_domain="split.com").save()
+    for n in ["80000001", "80000002", "80000003"]:
+        Item(item_number=n, height=1.0, width=1.0, length=1.0, special_instructions="", units_per_pallet=10).save()
+
+    df = pd.DataFrame({
+        "Order__": ["A-1", "B-2", "A-1"],
+        "Customer_PO": ["PO1", "PO2", "PO1"],
+        "Item": ["80000001", "80000002", "80000003"],
+        "Qty_Ord": [10.0, 20.0, 30.0],
+        "Units_Per_Pallet": [10.0, 10.0, 10.0],
+    })
+    orders = create_orders_from_df(df, customer, "11/18/24", ["7am"])
+
+    assert [o.order_number for o in orders] == ["A-1", "B-2"]
+    assert [o.customer_po for o in orders] == ["PO1", "PO2"]
+    first = Order.objects.get(id=orders[0].id)
+    assert [b.item_id.item_number for b in first.order_item_ids] == ["80000001", "80000003"]
+    assert [b.number_pallets for b in first.order_item_ids] == [1, 3]
+
+def test_find_or_create_customer_is_atomic_for_a_new_domain():
+    account = Account(email="race@test.com", name="Race", company_code="RACE01").save()
+    barrier = threading.Barrier(8)
+    customers = []
+
+    def ingest_email():
+        barrier.wait()
+        customers.append(find_or_create_customer(account, "newdomain.com"))
+
+    threads = [threading.Thread(target=ingest_email) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({customer.id for customer in customers}) == 1
+    assert Customer.objects(account=account, email_domain="newdomain.com").count() == 1
+    assert customers[0].date_created is not None
+    assert find_or_create_customer(account, "newdomain.com").id == customers[0].id
+
+def test_find_or_create_customer_requires_an_account():
+    with pytest.raises(ValueError):
+        find_or_create_customer(None, "newdomain.com")
+
 def test_parse_pdf():    
     # Load PDF as raw bytes
     with open("data/example_order.pdf", "rb") as f:
@@ -95,6 +261,7 @@ def test_create_order_reciept():
     # Validate returned order data
     assert order_data["customer_email_domain"] == "shorr.com"
     assert ObjectId.is_valid(order_data["order_id"]), "Invalid order_id"
+    assert len(order_data["order_ids"]) == 3, "Expected one order per Order__ in the CSV"
 
     # Fetch order from DB
     order = Order.objects(id=ObjectId(order_data["order_id"])).first()
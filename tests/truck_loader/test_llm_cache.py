@@ -0,0 +1,90 @@
+import sys
+import os
+import json
+import datetime
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from mongoengine import connect, disconnect
+from models.types import LLMCacheEntry
+from scripts.truck_loader import llm_cache
+from scripts.truck_loader.llm_cache import LLMCache, StubLLMClient, cache_key, cached_completion, set_llm_client
+from scripts.truck_loader.ingestion import extract_special_instructions
+
+TEST_DB = "test_llm_cache"
+
+@pytest.fixture(scope="function", autouse=True)
+def db(monkeypatch):
+    disconnect()
+    connect(TEST_DB, host=f"mongodb://localhost:27017/{TEST_DB}", uuidRepresentation="standard")
+    LLMCacheEntry.drop_collection()
+    monkeypatch.setattr(llm_cache, "llm_cache", LLMCache(max_entries=3))
+    yield
+    set_llm_client(None)
+    LLMCacheEntry.drop_collection()
+    disconnect()
+
+@pytest.fixture
+def stub():
+    client = StubLLMClient(lambda prompt: json.dumps(["7am"]))
+    set_llm_client(client)
+    return client
+
+def test_cache_key_depends_on_version_model_and_input():
+    key = cache_key("v1", "gpt-3.5-turbo", "body")
+    assert key == cache_key("v1", "gpt-3.5-turbo", "body")
+    assert key != cache_key("v2", "gpt-3.5-turbo", "body")
+    assert key != cache_key("v1", "gpt-4", "body")
+    assert key != cache_key("v1", "gpt-3.5-turbo", "body ")
+
+def test_repeat_completion_is_served_from_cache(stub):
+    first = cached_completion("v1", "prompt: body", "body", parse=json.loads)
+    second = cached_completion("v1", "prompt: body", "body", parse=json.loads)
+
+    assert first == second == ["7am"]
+    assert len(stub.calls) == 1
+
+    metrics = llm_cache.llm_cache.metrics()
+    assert metrics["hits"] == 1
+    assert metrics["misses"] == 1
+    assert LLMCacheEntry.objects.get().hits == 1
+
+def test_new_template_version_misses(stub):
+    cached_completion("v1", "prompt", "body")
+    cached_completion("v2", "prompt", "body")
+    assert len(stub.calls) == 2
+
+def test_unparseable_responses_are_not_cached():
+    client = StubLLMClient(lambda prompt: "not json")
+    set_llm_client(client)
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Failed to parse OpenAI response"):
+            extract_special_instructions("Gaylords - item #10126054 cannot be double stacked.")
+
+    assert len(client.calls) == 2
+    assert LLMCacheEntry.objects.count() == 0
+
+def test_least_recently_used_entries_are_evicted(stub):
+    for minutes_ago, text in [(3, "b"), (2, "a"), (1, "c")]:
+        cached_completion("v1", text, text)
+        LLMCacheEntry.objects(key=cache_key("v1", "gpt-3.5-turbo", text)).update_one(
+            set__last_used_at=datetime.datetime.utcnow() - datetime.timedelta(minutes=minutes_ago)
+        )
+    cached_completion("v1", "d", "d")
+
+    keys = set(LLMCacheEntry.objects.scalar("key"))
+    assert keys == {cache_key("v1", "gpt-3.5-turbo", t) for t in ["a", "c", "d"]}
+    assert llm_cache.llm_cache.metrics()["evictions"] == 1
+
+def test_special_instructions_offline():
+    answer = [{"item_id": "10126054", "instruction": "Cannot be double stacked."}]
+    client = StubLLMClient(lambda prompt: json.dumps(answer))
+    set_llm_client(client)
+
+    text = "Gaylords - item #10126054 cannot be double stacked."
+    assert extract_special_instructions(text) == answer
+    assert extract_special_instructions(text) == answer
+    assert len(client.calls) == 1
+    assert text in client.calls[0]
@@ -0,0 +1,66 @@
+import sys
+import os
+import shutil
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader import master_data
+from scripts.truck_loader.master_data import MasterIndex
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = tmp_path / "master.xlsx"
+    shutil.copy("data/ShorrMasterSheet.xlsx", path)
+    return str(path)
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    real_parse = master_data.parse_master_sheet
+
+    def counting_parse(path):
+        calls.append(path)
+        return real_parse(path)
+
+    monkeypatch.setattr(master_data, "parse_master_sheet", counting_parse)
+    return calls
+
+def test_lookup_by_item_number(sheet, tmp_path):
+    index = MasterIndex(sheet, str(tmp_path / "cache"))
+
+    item = index.get("10202638")
+    assert item.description.startswith("020 9x6-1/4x3-5/8 RSC")
+    assert item.units_per_pallet == 2400
+    assert item.dimensions == (9.0, 6.25, 3.625)
+    assert item.overhang == "YES"
+
+    assert index.get("10195771").dimensions is None
+    assert index.get("does-not-exist") is None
+    assert len(index) > 40
+
+def test_sheet_is_parsed_once_per_content_hash(sheet, tmp_path, parse_calls):
+    cache_dir = str(tmp_path / "cache")
+
+    index = MasterIndex(sheet, cache_dir)
+    index.get("10202638")
+    index.get("10202639")
+    assert len(parse_calls) == 1
+    assert os.listdir(cache_dir) == [f"master-v{master_data.MASTER_ARTIFACT_VERSION}-{index.digest}.pkl"]
+
+    # A fresh process loads the pickled artifact instead of the spreadsheet
+    restarted = MasterIndex(sheet, cache_dir)
+    assert restarted.get("10202638") == index.get("10202638")
+    assert len(parse_calls) == 1
+
+def test_reloads_when_the_file_changes(sheet, tmp_path, parse_calls):
+    index = MasterIndex(sheet, str(tmp_path / "cache"))
+    assert index.get("10202638") is not None
+
+    os.remove(sheet)
+    assert index.get("10202638") is None
+    assert len(index) == 0
+
+    shutil.copy("data/ShorrMasterSheet.xlsx", sheet)
+    assert index.get("10202638") is not None
+    assert len(parse_calls) == 1
@@ -0,0 +1,158 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import time
+import pdfplumber
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader import pdf_text
+from scripts.truck_loader.pdf_text import PdfDocument, load_pdf_document, clear_pdf_cache, extract_page_text
+from scripts.truck_loader import ingestion
+from scripts.truck_loader.stages import StageTimeout, run_stages
+from scripts.truck_loader.ingestion import (
+    build_receipt_stages,
+    extract_domain_from_pdf,
+    extract_date_ordered_from_pdf,
+    extract_units_per_pallet_from_pdf,
+)
+
+@pytest.fixture
+def pdf_bytes():
+    with open("data/example_order.pdf", "rb") as f:
+        return f.read()
+
+@pytest.fixture
+def extracted(monkeypatch):
+    # Extract in-process so page extractions can be counted
+    monkeypatch.setattr(pdf_text, "PDF_PROCESS_POOL", False)
+    clear_pdf_cache()
+    calls = []
+    real_extract = pdfplumber.page.Page.extract_text
+
+    def counting_extract(self, *args, **kwargs):
+        calls.append(self.page_number)
+        return real_extract(self, *args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber.page.Page, "extract_text", counting_extract)
+    yield calls
+    clear_pdf_cache()
+
+@pytest.fixture
+def pool():
+    pdf_text.shutdown_pdf_pool()
+    yield
+    pdf_text.shutdown_pdf_pool()
+
+def test_extractors_share_one_extraction(pdf_bytes, extracted):
+    assert extract_domain_from_pdf(pdf_bytes) == "shorr.com"
+    assert extract_date_ordered_from_pdf(pdf_bytes) == "11/18/24"
+    units = extract_units_per_pallet_from_pdf(pdf_bytes)
+    assert units[0] == {"item_id": "10202638", "units_per_pallet": 2400}
+
+    assert extracted == list(range(1, len(load_pdf_document(pdf_bytes).pages) + 1))
+
+def test_document_is_memoized_by_content(pdf_bytes, extracted):
+    first = load_pdf_document(pdf_bytes)
+    second = load_pdf_document(bytes(bytearray(pdf_bytes)))
+
+    assert first is second
+    assert len(first.pages) > 1
+    assert "Ack Date" in first.first_page
+    assert load_pdf_document(first) is first
+    assert len(extracted) == len(first.pages)
+
+def test_concurrent_loads_parse_once(pdf_bytes, extracted):
+    def read_pages(pdf):
+        doc = load_pdf_document(pdf)
+        return doc, list(doc.iter_pages())
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(read_pages, [pdf_bytes] * 4))
+
+    assert all(doc is results[0][0] for doc, _ in results)
+    assert all(pages == results[0][1] for _, pages in results)
+    assert len(extracted) == len(results[0][1])
+
+def test_extractors_accept_a_loaded_document():
+    doc = PdfDocument(["www.example.com\nAck Date Order #\nx\n01/02/25 123"])
+    assert extract_domain_from_pdf(doc) == "example.com"
+    assert extract_date_ordered_from_pdf(doc) == "01/02/25"
+
+def test_pages_are_extracted_lazily(pdf_bytes, extracted):
+    doc = PdfDocument.from_bytes(pdf_bytes)
+
+    assert extract_date_ordered_from_pdf(doc) == "11/18/24"
+    assert extracted == [1]
+
+    pages = doc.pages
+    assert extracted == list(range(1, len(pages) + 1))
+    assert doc.first_page == pages[0]
+    assert len(extracted) == len(pages)
+
+def test_units_per_pallet_scan_spans_pages():
+    doc = PdfDocument([
+        "1 10202638 11/18/24 Box\nnotes\n",
+        "25/bundle 2400/pallet\n2 10195770 11/18/24 Box\n1600 EA/Pallet 800/pallet\n",
+        "3 10195771 11/18/24 Box 99/pallet\nno quantity\n",
+    ])
+    assert extract_units_per_pallet_from_pdf(doc) == [
+        {"item_id": "10202638", "units_per_pallet": 2400},
+        {"item_id": "10195770", "units_per_pallet": 1600},
+    ]
+
+def test_max_pages_limit(pdf_bytes, extracted, monkeypatch):
+    monkeypatch.setattr(pdf_text, "PDF_MAX_PAGES", 2)
+    doc = PdfDocument.from_bytes(pdf_bytes)
+
+    assert len(doc.pages) == 2
+    assert extracted == [1, 2]
+
+def test_worker_pool_returns_page_text(pdf_bytes, pool):
+    pdf_text.warm_pdf_pool()
+    texts, page_count = extract_page_text(pdf_bytes)
+
+    assert page_count == len(texts) > 1
+    assert texts == pdf_text._extract_pages(pdf_bytes, 0, page_count)[0]
+    assert extract_date_ordered_from_pdf(PdfDocument.from_bytes(pdf_bytes)) == "11/18/24"
+
+def test_worker_timeout_replaces_the_pool(pdf_bytes, pool, monkeypatch):
+    monkeypatch.setattr(pdf_text, "PDF_EXTRACT_TIMEOUT", 0.001)
+    with pytest.raises(TimeoutError):
+        extract_page_text(pdf_bytes)
+    assert pdf_text._pool is None
+
+    monkeypatch.setattr(pdf_text, "PDF_EXTRACT_TIMEOUT", 30)
+    texts, _ = extract_page_text(pdf_bytes, 0, 1)
+    assert "Ack Date" in texts[0]
+
+def test_worker_timeout_lets_other_extractions_finish(pdf_bytes, pool, monkeypatch):
+    pdf_text.warm_pdf_pool()
+    old_pool = pdf_text._get_pool()
+    neighbour = pdf_text._submit(old_pool, time.sleep, 0.5)
+
+    monkeypatch.setattr(pdf_text, "PDF_EXTRACT_TIMEOUT", 0.001)
+    with pytest.raises(TimeoutError):
+        extract_page_text(pdf_bytes)
+    assert pdf_text._pool is None
+
+    # Not failed with BrokenProcessPool by the stuck job's recycle
+    assert neighbour.result(timeout=5) is None
+
+def test_receipt_stages_that_extract_pages_are_timed(pdf_bytes, monkeypatch):
+    # Loading the document only hashes it; the extractor stages do the page work
+    monkeypatch.setattr(pdf_text, "PDF_PROCESS_POOL", False)
+    monkeypatch.setattr(pdf_text, "_extract_pages", lambda *args: time.sleep(1) or ([], 0))
+    monkeypatch.setattr(ingestion, "PDF_STAGE_TIMEOUT", 0.05)
+    clear_pdf_cache()
+
+    stages = build_receipt_stages({"pdf_file": pdf_bytes, "csv_file": b""})
+    timed = {stage.name: stage.timeout for stage in stages}
+    assert all(timed[name] is not None for name in ("domain", "date_ordered", "units_per_pallet", "special_instructions"))
+
+    start = time.monotonic()
+    with pytest.raises(StageTimeout, match="domain"):
+        run_stages([stage for stage in stages if stage.name in ("pdf", "domain")])
+    assert time.monotonic() - start < 0.5
+    clear_pdf_cache()
@@ -81,3 +81,37 @@ def test_find_items_without_dimensions_from_order():
     assert "1003" in missing
     assert "1001" not in missing
 
+
+def test_missing_dimensions_are_filled_from_master_sheet():
+    customer = Customer.objects(email_domain="customer.com").first()
+
+    # 10202638 is "020 9x6-1/4x3-5/8 RSC ..." in data/ShorrMasterSheet.xlsx
+    master_item = Item(
+        item_number="10202638",
+        height=0, width=0, length=0,
+        special_instructions="",
+        units_per_pallet=2400
+    ).save()
+    unknown_item = Item(
+        item_number="1004",
+        height=0, width=0, length=0,
+        special_instructions="",
+        units_per_pallet=10
+    ).save()
+
+    order = Order(
+        customer=customer,
+        order_item_ids=[
+            OrderBatch(item_id=master_item, number_pallets=1).save(),
+            OrderBatch(item_id=unknown_item, number_pallets=1).save(),
+        ],
+        order_date=datetime.now().date(),
+        shipment_times=["9am"],
+        status="processing"
+    ).save()
+
+    assert find_items_without_dimensions_from_order(order.id) == ["1004"]
+
+    master_item.reload()
+    assert (master_item.length, master_item.width, master_item.height) == (9.0, 6.25, 3.625)
+    assert master_item.dimensions_confidence == "inferred"
@@ -0,0 +1,72 @@
+import sys
+import os
+import json
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader import llm_cache, shipment_times
+from scripts.truck_loader.llm_cache import StubLLMClient, set_llm_client
+from scripts.truck_loader.shipment_times import extract_shipment_times, shipment_time_path_metrics
+from scripts.truck_loader.ingestion import get_upcoming_shipments
+
+EMAIL_BODY = """Warehouse team- please have loaded for below times
+
+                        7am
+                        9am
+                        11am
+                        11am
+                        1pm
+
+
+                        Shaina Reed - Fleet Operations Manager
+                        825 Locust Point Road | York, PA 17406
+                        P: 717-790-6260  | C: 717-462-8550"""
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(shipment_times, "shipment_time_paths", {"regex": 0, "llm": 0})
+    client = StubLLMClient(lambda prompt: json.dumps(["12pm"]))
+    set_llm_client(client)
+    yield client
+    set_llm_client(None)
+
+def test_extracts_times_in_order_with_duplicates():
+    assert extract_shipment_times(EMAIL_BODY) == (["7am", "9am", "11am", "11am", "1pm"], True)
+
+@pytest.mark.parametrize("text, expected", [
+    ("Load at 7:30 A.M. and 1 p.m.", ["7:30am", "1pm"]),
+    ("Pickup 7 AM\nPickup 10 PM", ["7am", "10pm"]),
+    ("Window 7-9am, then 10am to 12pm", ["7am-9am", "10am-12pm"]),
+    ("Sent: Monday, November 18, 2024 10:11 AM\n7am\n9am", ["7am", "9am"]),
+])
+def test_common_formats(text, expected):
+    assert extract_shipment_times(text) == (expected, True)
+
+@pytest.mark.parametrize("text", [
+    "Please have it loaded by noon",
+    "Trucks at 7 and 9",
+    "Loading 13:00 and 15:30",
+    "7\n9\n11",
+    "No times in this email",
+    "Trucks 7, 9, 11am",
+    "7 & 9am",
+    "Pickups: 7am, 9, 11am",
+    "Load 7 9 11am",
+])
+def test_low_confidence(text):
+    _, confident = extract_shipment_times(text)
+    assert confident is False
+
+def test_regex_path_skips_llm(stub):
+    assert get_upcoming_shipments(EMAIL_BODY) == ["7am", "9am", "11am", "11am", "1pm"]
+    assert stub.calls == []
+    assert shipment_time_path_metrics()["regex"] == 1
+
+def test_llm_fallback_when_not_confident(stub):
+    assert get_upcoming_shipments("Load it by noon please") == ["12pm"]
+    assert len(stub.calls) == 1
+    metrics = shipment_time_path_metrics()
+    assert metrics["llm"] == 1
+    assert metrics["regex_rate"] == 0.0
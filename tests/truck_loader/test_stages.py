@@ -0,0 +1,80 @@
+import sys
+import os
+import time
+import threading
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from scripts.truck_loader.stages import Stage, StageError, StageTimeout, run_stages
+
+def sleeper(seconds, value):
+    def fn(*_):
+        time.sleep(seconds)
+        return value
+    return fn
+
+def test_independent_stages_run_concurrently():
+    stages = [
+        Stage("a", sleeper(0.3, 1)),
+        Stage("b", sleeper(0.3, 2)),
+        Stage("c", sleeper(0.3, 3)),
+        Stage("total", lambda a, b, c: a + b + c, ("a", "b", "c")),
+    ]
+
+    start = time.monotonic()
+    run = run_stages(stages)
+    elapsed = time.monotonic() - start
+
+    assert run.results["total"] == 6
+    assert elapsed < 0.8
+    assert set(run.durations) == {"a", "b", "c", "total"}
+
+def test_dependencies_are_passed_in_declared_order():
+    stages = [
+        Stage("joined", lambda x, y: f"{x}-{y}", ("second", "first")),
+        Stage("first", lambda: "first"),
+        Stage("second", lambda: "second"),
+    ]
+    assert run_stages(stages).results["joined"] == "second-first"
+
+def test_failure_cancels_dependents():
+    ran = threading.Event()
+
+    def boom():
+        raise RuntimeError("bad pdf")
+
+    stages = [
+        Stage("parse", boom),
+        Stage("save", lambda _: ran.set(), ("parse",)),
+    ]
+
+    with pytest.raises(StageError, match="parse") as excinfo:
+        run_stages(stages)
+
+    assert isinstance(excinfo.value.__cause__, RuntimeError)
+    assert not ran.is_set()
+
+def test_stage_timeout():
+    ran = threading.Event()
+    stages = [
+        Stage("llm", sleeper(2, None), timeout=0.2),
+        Stage("after", lambda _: ran.set(), ("llm",)),
+    ]
+
+    start = time.monotonic()
+    with pytest.raises(StageTimeout, match="llm"):
+        run_stages(stages)
+
+    assert time.monotonic() - start < 1
+    assert not ran.is_set()
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="unknown"):
+        run_stages([Stage("a", lambda _: None, ("missing",))])
+
+    with pytest.raises(ValueError, match="cycle"):
+        run_stages([
+            Stage("a", lambda _: None, ("b",)),
+            Stage("b", lambda _: None, ("a",)),
+        ])
@@ -0,0 +1,85 @@
+import os
+import json
+import base64
+import datetime
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+from mongoengine.queryset.visitor import Q
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+# Response header carrying the cursor of the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _value(doc, name):
+    # Documents, or raw dicts from as_pymongo()
+    if isinstance(doc, dict):
+        return doc["_id"] if name == "id" else doc.get(name)
+    return getattr(doc, name)
+
+
+def paginate(queryset, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+             field: Optional[str] = None, descending: bool = False):
+    """
+    Keyset pagination over `queryset`.
+
+    Pages are ordered by _id, or by the DateTimeField `field` with _id as the
+    tie-breaker. The next page starts after the last key of this one instead of
+    skipping rows, so a deep page costs the same as the first one.
+
+    Returns:
+        (documents, next_cursor): next_cursor is None on the last page.
+    """
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+
+    sign = "-" if descending else ""
+    op = "lt" if descending else "gt"
+    if cursor:
+        values = _decode(cursor)
+        # The keys _encode wrote: [field value,] id, all strings
+        if (not isinstance(values, list) or len(values) != (2 if field else 1)
+                or not all(isinstance(value, str) for value in values)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        try:
+            last_id = ObjectId(values[-1])
+            if field:
+                last_value = datetime.datetime.fromisoformat(values[0])
+                queryset = queryset.filter(
+                    Q(**{f"{field}__{op}": last_value}) | Q(**{field: last_value, f"id__{op}": last_id})
+                )
+            else:
+                queryset = queryset.filter(**{f"id__{op}": last_id})
+        except (InvalidId, TypeError, IndexError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    order = (f"{sign}{field}", f"{sign}id") if field else (f"{sign}id",)
+    documents = list(queryset.order_by(*order).limit(limit + 1))
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        keys = [_value(last, field).isoformat()] if field else []
+        next_cursor = _encode(keys + [str(_value(last, "id"))])
+    return documents, next_cursor
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,41 @@
+import threading
+from collections import Counter
+from pymongo import monitoring
+
+
+class QueryCounter(monitoring.CommandListener):
+    """
+    Counts the commands (DB round-trips) pymongo sends, by command name.
+
+    Register it when connecting, e.g.
+    `mongoengine.connect(..., event_listeners=[counter])`, then call `reset()`
+    before the code under measurement and read `total` / `by_command` after.
+    """
+
+    # Connection handshakes and health checks are not queries issued by our code
+    IGNORED = {"hello", "ismaster", "isMaster", "ping", "buildinfo", "buildInfo", "endSessions"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_command = Counter()
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        with self._lock:
+            self.by_command[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        with self._lock:
+            self.by_command = Counter()
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return sum(self.by_command.values())